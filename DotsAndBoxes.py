@@ -18,7 +18,6 @@ BOARDPIXELWIDTH = BOARDWIDTH * SPACESIZE
 BOARDPIXELHEIGHT = BOARDHEIGHT * SPACESIZE
 XMARGIN = int((WINDOWWIDTH - BOARDPIXELWIDTH) / 2)
 YMARGIN = XMARGIN
-BOARDRECT = pygame.Rect(XMARGIN, YMARGIN, BOARDPIXELWIDTH, BOARDPIXELHEIGHT)
 BOTTOMSPACEHEIGHT = WINDOWHEIGHT - (BOARDPIXELHEIGHT + YMARGIN * 2)
 
 LINEBGWIDTH = 1
@@ -34,12 +33,11 @@ HIGHLIGHTCOLOR = (50, 175, 70) # green
 PLAYERCOLOR = (180, 20, 20) # red
 COMPUTERCOLOR = (255, 150, 0) # yellow
 
-DOTIMAGE = pygame.image.load("dot.png")
 DOTIMAGEWIDTH = 15
 DOTIMAGEHEIGHT = 15
 
 def main():
-    global FPSCLOCK, DISPLAYSURF, FONT
+    global FPSCLOCK, DISPLAYSURF, FONT, DOTIMAGE, BOARDRECT
 
     pygame.init()
     FPSCLOCK = pygame.time.Clock()
@@ -47,6 +45,9 @@ def main():
     DISPLAYSURF = pygame.display.set_mode((WINDOWWIDTH, WINDOWHEIGHT))
     pygame.display.set_caption("Dots and Boxes")
 
+    DOTIMAGE = pygame.image.load("dot.png")
+    BOARDRECT = pygame.Rect(XMARGIN, YMARGIN, BOARDPIXELWIDTH, BOARDPIXELHEIGHT)
+
     FONT = pygame.font.Font("freesansbold.ttf", 36)
 
     while True:
@@ -105,7 +106,7 @@ def createBoard():
     board = {}
     for x in range(BOARDWIDTH):
         for y in range(BOARDHEIGHT):
-            spaceName = str(x) + str(y)
+            spaceName = (x, y)
             surroundingLines = getSurroundingLines(x, y)
             surroundingLines = dict(zip(surroundingLines, [False, False, False, False,
                                                            False, False, False, False]))
@@ -113,8 +114,12 @@ def createBoard():
     return board
     
 def getDotAtPixel(dotRects, mouseX, mouseY):
-    # Find the dot on the board that was clicked
-    for dotRect in dotRects:
+    # Find the dot on the board that was clicked. Only the dot nearest the mouse can
+    # have been hit, and dotRects is in the order getDotRects() made it.
+    x = (mouseX - XMARGIN + int(SPACESIZE / 2)) // SPACESIZE
+    y = (mouseY - YMARGIN + int(SPACESIZE / 2)) // SPACESIZE
+    if 0 <= x <= BOARDWIDTH and 0 <= y <= BOARDHEIGHT:
+        dotRect = dotRects[x * (BOARDHEIGHT + 1) + y]
         if dotRect.collidepoint(mouseX, mouseY):
             return dotRect
         
@@ -199,7 +204,7 @@ def drawDots(dotRects, firstDotClicked):
 def drawSpaces(board):
     # Fill in owned spaces on the board
     for space in board:
-        x, y = int(space[0]), int(space[1])
+        x, y = space
         rectX, rectY = getLeftTopCoordsOfBox(x, y)
         rectObj = pygame.Rect(rectX + INNERSPACEMARGIN, rectY + INNERSPACEMARGIN, INNERSPACESIZE, INNERSPACESIZE)
         if board[space][1] == "player":
@@ -1,39 +1,68 @@
 #Dots and Boxes
 #
 #Connect dots to get the most territories
-
-import pygame, sys, random
+#
+#Usage: python DotsAndBoxes2.py [--width 20] [--height 20] [--difficulty hard]
+#Scroll or press +/- to zoom, drag with the right mouse button or use the arrow
+#keys to move around the board, and press Home to see all of it again.
+#F3 shows how long each part of a frame takes; --profile-output saves those
+#timings when the game exits. --record appends every game to a game archive.
+
+import pygame, sys, random, argparse, atexit
+from collections import OrderedDict
 from pygame.locals import *
-
-FPS = 30
+from engine import (PLAYER, COMPUTER, BOARDWIDTH, BOARDHEIGHT, createBoard, dotsAdjacent,
+                    makeMove, isLineFilled, isGameOver, getWinner)
+from computerplayer import ComputerMoveThread, createComputerPlayer, DIFFICULTYLEVELS
+from frameprofiler import FrameProfiler, PHASES, PERCENTILES
+from gamerecord import GameRecordWriter
+from boardstate import FILLED
+
+FPS = 30 # most frames drawn per second on any screen
+WAITFOREVENTS = True # sleep until something happens instead of polling every frame
+THINKINGWAITMS = 100 # longest wait for events while the computer is thinking
+# getEvents() timeouts besides a number of milliseconds. WAITFOREVER is 0 because
+# that is what pygame.event.wait() takes to mean no timeout.
+WAITFOREVER = 0
+NOWAIT = None
+COMPUTERMOVED = USEREVENT # posted by the computer's thread when its move is ready
 WINDOWWIDTH = 600
 WINDOWHEIGHT = 620
 
-SPACESIZE = 70
+MAXBOARDSIZE = 100 # most boxes across or down
+
+SPACESIZE = 70 # pixels between dots at normal zoom; everything below scales with it
+MINSPACESIZE = 4
+MAXSPACESIZE = 140
+ZOOMSTEP = 1.25
+PANSTEP = 40 # pixels moved by an arrow key
+DOTSMINSPACESIZE = 10 # below this zoom the dots are left out and only the grid shows
 FILLINGSIZE = 50
-FILLINGMARGIN = int((SPACESIZE - FILLINGSIZE) / 2)
 
-BOARDWIDTH = 8
-BOARDHEIGHT = 7
-BOARDPIXELWIDTH = BOARDWIDTH * SPACESIZE
-BOARDPIXELHEIGHT = BOARDHEIGHT * SPACESIZE
-BOARDMARGIN = int((WINDOWWIDTH - BOARDPIXELWIDTH) / 2)
-BOARDRECT = pygame.Rect(BOARDMARGIN, BOARDMARGIN, BOARDPIXELWIDTH, BOARDPIXELHEIGHT)
+BOARDMARGIN = 20
+INFOHEIGHT = 90
 
 LINEWIDTH = 1
 FILLEDLINEWIDTH = 7
 
 TURNCIRCLERADIUS = 10
 
-PLAYER = "player"
-COMPUTER = "computer"
+TEXTCACHESIZE = 64 # rendered text surfaces kept around for reuse
+
+DIFFICULTY = "medium" # one of computerplayer.DIFFICULTYLEVELS
+
+RECORDER = None # a GameRecordWriter when games are being recorded
+
+PROFILER = None # a FrameProfiler while frame timings are being collected
+PROFILEOVERLAY = None # a ProfileOverlay while the timings are shown
+PROFILEKEY = K_F3
+PROFILEFONTSIZE = 14
+PROFILEREFRESHMS = 500
+PROFILEBGCOLOR = (0, 0, 0) # black
 
-DOTIMAGE = pygame.image.load("dot.png")
 DOTIMAGEWIDTH = 15
 DOTIMAGEHEIGHT = 15
 
-ICONIMAGE = pygame.image.load("icon.png")
-
 BGCOLOR = (10, 90, 75) # turquoise
 BOARDCOLOR = (255, 255, 255) # white
 LINECOLOR = (185, 185, 185) # light gray
@@ -46,174 +75,652 @@ PLAYERCOLOR = (180, 20, 20) # red
 COMPUTERCOLOR = (60, 5, 60) # purple
 
 def main():
-    global FPSCLOCK, DISPLAYSURF, FONT
+    global BOARDWIDTH, BOARDHEIGHT, DIFFICULTY, RECORDER, PROFILER, PROFILEOVERLAY
+
+    parser = argparse.ArgumentParser(description="Play Dots and Boxes against the computer.")
+    parser.add_argument("--width", type=int, default=BOARDWIDTH, help="boxes across")
+    parser.add_argument("--height", type=int, default=BOARDHEIGHT, help="boxes down")
+    parser.add_argument("--difficulty", choices=sorted(DIFFICULTYLEVELS), default=DIFFICULTY)
+    parser.add_argument("--profile", action="store_true",
+                        help="time every frame and show the timings (F3 toggles them)")
+    parser.add_argument("--profile-output", metavar="FILE",
+                        help="time every frame and write the timings to a .json or .csv "
+                        "file on exit")
+    parser.add_argument("--record", metavar="ARCHIVE",
+                        help="append every game to this game archive (see gamerecord.py)")
+    args = parser.parse_args()
+    for size in (args.width, args.height):
+        if not 1 <= size <= MAXBOARDSIZE:
+            parser.error("board sizes go from 1 to %d" % MAXBOARDSIZE)
+    BOARDWIDTH, BOARDHEIGHT, DIFFICULTY = args.width, args.height, args.difficulty
+
+    initDisplay()
+    if args.record:
+        RECORDER = GameRecordWriter(args.record)
+        atexit.register(RECORDER.close) # keeps a game that was quit part way through
+    if args.profile or args.profile_output:
+        PROFILER = FrameProfiler(FPS)
+    if args.profile:
+        PROFILEOVERLAY = ProfileOverlay(PROFILER)
+    if args.profile_output:
+        atexit.register(PROFILER.write, args.profile_output)
+
+    while True:
+        playAgain = runGame()
+        if not playAgain:
+            pygame.quit()
+            sys.exit()
+
+def initDisplay():
+    # Open the window and load everything drawing needs
+    global FPSCLOCK, DISPLAYSURF, FONT, DOTIMAGE, VIEWRECT, INFORECT
 
     pygame.init()
     FPSCLOCK = pygame.time.Clock()
 
     DISPLAYSURF = pygame.display.set_mode((WINDOWWIDTH, WINDOWHEIGHT))
     pygame.display.set_caption("Dots and Boxes")
-    pygame.display.set_icon(ICONIMAGE)
-    
-    FONT = pygame.font.Font("freesansbold.ttf", 36)
+    pygame.display.set_icon(pygame.image.load("icon.png"))
 
-    while True:
-        playAgain = runGame()
-        if not playAgain:
-            pygame.quit()
-            sys.exit()
+    DOTIMAGE = pygame.image.load("dot.png").convert_alpha()
+    VIEWRECT = pygame.Rect(0, 0, WINDOWWIDTH, WINDOWHEIGHT - INFOHEIGHT)
+    INFORECT = pygame.Rect(0, VIEWRECT.bottom, WINDOWWIDTH, INFOHEIGHT)
+
+    FONT = pygame.font.Font("freesansbold.ttf", 36)
 
 def runGame():
     # Run the game until there are no moves left to take
-    playerScore, computerScore = 0, 0
-    turn = PLAYER
-    
     mouseX, mouseY = 0, 0
     firstDotClicked, secondDotClicked = None, None
-    
-    board = createBoard()
+
+    board = createBoard(BOARDWIDTH, BOARDHEIGHT)
+    computerPlayer = createComputerPlayer(DIFFICULTY)
+    computerThread = None
+    viewport = Viewport(BOARDWIDTH, BOARDHEIGHT, VIEWRECT)
+    renderer = BoardRenderer(viewport)
+    if RECORDER is not None:
+        RECORDER.beginGame(BOARDWIDTH, BOARDHEIGHT, (PLAYER, COMPUTER + ":" + DIFFICULTY),
+                           board.turn)
 
     while True:
-        for event in pygame.event.get():
+        profiler = PROFILER
+        if profiler is not None:
+            profiler.beginFrame()
+
+        # Sleep until there is input, but don't wait to start the computer thinking
+        # and check on it now and then while it thinks
+        if computerThread is not None:
+            timeout = THINKINGWAITMS
+        elif board.turn == COMPUTER and not isGameOver(board):
+            timeout = NOWAIT
+        else:
+            timeout = WAITFOREVER
+        if PROFILEOVERLAY is not None:
+            timeout = PROFILEOVERLAY.limitWait(timeout)
+        events = getEvents(timeout)
+        if profiler is not None:
+            profiler.mark("wait")
+
+        for event in events:
             if event.type == QUIT:
+                computerPlayer.close()
                 pygame.quit()
                 sys.exit()
-                
+
+            elif event.type == VIDEOEXPOSE:
+                renderer.invalidate()
+
             elif event.type == MOUSEMOTION:
                 mouseX, mouseY = event.pos
-                
-            elif event.type == MOUSEBUTTONUP:
-                dotClicked = getDotAtPixel(mouseX, mouseY)
-                
+                if event.buttons[1] or event.buttons[2]:
+                    viewport.pan(event.rel[0], event.rel[1])
+
+            elif event.type == MOUSEWHEEL:
+                viewport.zoom(ZOOMSTEP ** event.y, mouseX, mouseY)
+
+            elif event.type == KEYDOWN and event.key == PROFILEKEY:
+                toggleProfileOverlay(renderer)
+
+            elif event.type == KEYDOWN:
+                handleViewKey(viewport, event.key)
+
+            elif event.type == MOUSEBUTTONUP and event.button == 1 and board.turn == PLAYER:
+                dotClicked = viewport.dotAtPixel(mouseX, mouseY)
+
                 if dotClicked and not firstDotClicked:
                     firstDotClicked = dotClicked
-                    
+
                 elif dotClicked and firstDotClicked and not secondDotClicked:
                     lineFilled = isLineFilled(board, firstDotClicked, dotClicked)
                     if dotsAdjacent(firstDotClicked, dotClicked) and not lineFilled:
                         secondDotClicked = dotClicked
                     else:
                         firstDotClicked, secondDotClicked = None, None
-                        
+
+                elif not firstDotClicked:
+                    # Clicking on a line between two dots fills it in directly
+                    linePoints = viewport.lineAtPixel(mouseX, mouseY)
+                    if linePoints and not isLineFilled(board, linePoints[0], linePoints[1]):
+                        firstDotClicked, secondDotClicked = linePoints
+
                 else:
                     firstDotClicked, secondDotClicked = None, None
+        if profiler is not None:
+            profiler.mark("events")
 
         if firstDotClicked and secondDotClicked:
-            fillLine(board, firstDotClicked, secondDotClicked)
-            boxesFilled = fillBoxes(board, turn)
+            makeMove(board, firstDotClicked, secondDotClicked)
             firstDotClicked, secondDotClicked = None, None
-
-            if boxesFilled == 0:
-                if turn == PLAYER:
-                    playerScore += boxesFilled
-                    turn = COMPUTER
-                else:
-                    computerScore += boxesFilled
-                    turn = PLAYER
-                
-        draw(board, firstDotClicked, playerScore, computerScore, turn)
-        pygame.display.update()
+            if RECORDER is not None:
+                RECORDER.recordMove(board.history[-1][0])
+
+        elif board.turn == COMPUTER and not isGameOver(board):
+            # Think in the background so the window keeps drawing
+            if computerThread is None:
+                computerThread = ComputerMoveThread(computerPlayer, board, postComputerMoved)
+                computerThread.start()
+            elif computerThread.move is not None:
+                # The move is set before COMPUTERMOVED is posted, while the thread
+                # may still be winding up, so don't wait for is_alive() to say so
+                computerThread.join()
+                board.makeMove(computerThread.move)
+                computerThread = None
+                if RECORDER is not None:
+                    RECORDER.recordMove(board.history[-1][0])
+        if profiler is not None:
+            profiler.mark("moves")
+
+        playerScore, computerScore = board.playerScore, board.computerScore
+        dirtyRects = renderer.draw(board, firstDotClicked, playerScore, computerScore, board.turn)
+        if PROFILEOVERLAY is not None:
+            dirtyRects.append(PROFILEOVERLAY.draw(renderer))
+        if profiler is not None:
+            profiler.mark("draw")
+        if dirtyRects:
+            pygame.display.update(dirtyRects)
+        if profiler is not None:
+            profiler.mark("update")
         FPSCLOCK.tick(FPS)
+        if profiler is not None:
+            profiler.mark("tick")
+            profiler.endFrame()
 
         if isGameOver(board):
-            if playerScore > computerScore:
-                winner = PLAYER
-            elif computerScore > playerScore:
-                winner = COMPUTER
+            computerPlayer.close()
+            if RECORDER is not None:
+                RECORDER.endGame()
+            return showGameOverScreen(getWinner(board))
+
+def handleViewKey(viewport, key):
+    # Pan or zoom the board for a key press
+    centerX, centerY = viewport.rect.center
+    if key == K_LEFT:
+        viewport.pan(PANSTEP, 0)
+    elif key == K_RIGHT:
+        viewport.pan(-PANSTEP, 0)
+    elif key == K_UP:
+        viewport.pan(0, PANSTEP)
+    elif key == K_DOWN:
+        viewport.pan(0, -PANSTEP)
+    elif key in (K_EQUALS, K_PLUS, K_KP_PLUS):
+        viewport.zoom(ZOOMSTEP, centerX, centerY)
+    elif key in (K_MINUS, K_KP_MINUS):
+        viewport.zoom(1 / ZOOMSTEP, centerX, centerY)
+    elif key == K_HOME:
+        viewport.fit()
+
+def toggleProfileOverlay(renderer):
+    # Show or hide the frame timings, starting to collect them the first time
+    global PROFILER, PROFILEOVERLAY
+    if PROFILEOVERLAY is not None:
+        PROFILEOVERLAY = None
+        renderer.invalidate()
+        return
+    if PROFILER is None:
+        PROFILER = FrameProfiler(FPS)
+    PROFILEOVERLAY = ProfileOverlay(PROFILER)
+
+class ProfileOverlay(object):
+    # The rolling frame timings drawn over the top right corner of the board. The
+    # text is only rendered again every PROFILEREFRESHMS, and the main loop wakes
+    # up for that even when nothing else is happening.
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.font = pygame.font.Font("freesansbold.ttf", PROFILEFONTSIZE)
+        self.surf = None
+        self.rect = None
+        self.nextRefresh = 0
+
+    def limitWait(self, timeout):
+        # Shorten a getEvents() timeout so the loop is back in time for the next refresh
+        untilRefresh = max(1, self.nextRefresh - pygame.time.get_ticks())
+        if timeout is NOWAIT:
+            return NOWAIT
+        if timeout == WAITFOREVER or timeout > untilRefresh:
+            return untilRefresh
+        return timeout
+
+    def draw(self, renderer):
+        # Draw the timings onto the display and return the rect that changed: the
+        # one they cover now and the one they covered last frame, which the board
+        # is drawn back over if the table got smaller
+        now = pygame.time.get_ticks()
+        if self.surf is None or now >= self.nextRefresh:
+            self.surf = self.render()
+            self.nextRefresh = now + PROFILEREFRESHMS
+        rect = self.surf.get_rect()
+        rect.topright = (VIEWRECT.right - 5, VIEWRECT.top + 5)
+        dirtyRect = rect
+        if self.rect is not None:
+            if not rect.contains(self.rect):
+                renderer.restore(self.rect)
+            dirtyRect = rect.union(self.rect)
+        DISPLAYSURF.blit(self.surf, rect)
+        self.rect = rect
+        return dirtyRect
+
+    def render(self):
+        # A table of the phase percentiles in milliseconds and the dropped frames
+        profiler = self.profiler
+        summary = profiler.summary()
+        rows = [["ms"] + ["p%d" % percent for percent in PERCENTILES]]
+        for phase in PHASES + ["busy"]:
+            rows.append([phase] + ["%.2f" % summary[phase]["p%d" % percent]
+                                   for percent in PERCENTILES])
+        footer = "dropped %d of %d frames at %d FPS" % (profiler.droppedFrames, profiler.frames,
+                                                         profiler.fps)
+
+        lineHeight = self.font.get_linesize()
+        columnWidth = self.font.size("00000.00")[0]
+        width = max(columnWidth * len(rows[0]), self.font.size(footer)[0]) + 10
+        surf = pygame.Surface((width, lineHeight * (len(rows) + 1) + 10)).convert()
+        surf.fill(PROFILEBGCOLOR)
+        for rowNumber, row in enumerate(rows):
+            for columnNumber, text in enumerate(row):
+                textSurf = self.font.render(text, True, FONTCOLOR)
+                textRect = textSurf.get_rect()
+                if columnNumber:
+                    textRect.topright = (5 + columnWidth * (columnNumber + 1),
+                                         5 + lineHeight * rowNumber)
+                else:
+                    textRect.topleft = (5, 5 + lineHeight * rowNumber)
+                surf.blit(textSurf, textRect)
+        surf.blit(self.font.render(footer, True, FONTCOLOR), (5, 5 + lineHeight * len(rows)))
+        return surf
+
+def getEvents(timeout):
+    # Return the waiting events. With WAITFOREVENTS, sleep until there is at least
+    # one: for at most timeout milliseconds, for as long as it takes if timeout is
+    # WAITFOREVER, or not at all if it is NOWAIT.
+    if not WAITFOREVENTS or timeout is NOWAIT:
+        return pygame.event.get()
+    event = pygame.event.wait(timeout)
+    if event.type == NOEVENT:
+        return []
+    return [event] + pygame.event.get()
+
+def postComputerMoved():
+    # Wake up the main loop once the computer's move is ready
+    pygame.event.post(pygame.event.Event(COMPUTERMOVED))
+
+class Viewport(object):
+    # The part of the board shown on screen and how big it is drawn.
+    #
+    # originX, originY is the pixel position of the top-left dot and spaceSize the
+    # distance between dots, so every conversion between pixels and the board is
+    # plain arithmetic that doesn't depend on the size of the board. version goes
+    # up whenever the view moves.
+    def __init__(self, boardWidth, boardHeight, rect):
+        self.boardWidth = boardWidth
+        self.boardHeight = boardHeight
+        self.rect = rect
+        self.version = 0
+        self.dotImage = None
+        self.fit()
+
+    def fit(self):
+        # Zoom so the whole board fits, up to the normal size
+        spaceSize = min(SPACESIZE,
+                        (self.rect.width - 2 * BOARDMARGIN) // self.boardWidth,
+                        (self.rect.height - 2 * BOARDMARGIN) // self.boardHeight)
+        self.setSpaceSize(spaceSize)
+        self.originX = self.rect.centerx - self.boardWidth * self.spaceSize // 2
+        self.originY = self.rect.top + BOARDMARGIN
+        self.clampOrigin()
+        self.version += 1
+
+    def setSpaceSize(self, spaceSize):
+        # Set the zoom and scale the sizes of everything drawn to match it
+        spaceSize = max(MINSPACESIZE, min(MAXSPACESIZE, spaceSize))
+        scale = spaceSize / float(SPACESIZE)
+        self.spaceSize = spaceSize
+        self.fillingSize = int(round(FILLINGSIZE * scale))
+        self.fillingMargin = int((spaceSize - self.fillingSize) / 2)
+        self.lineWidth = max(1, int(round(FILLEDLINEWIDTH * scale)))
+        self.dotSize = max(3, int(round(DOTIMAGEWIDTH * scale)))
+        self.showDots = spaceSize >= DOTSMINSPACESIZE
+        self.dotImage = None
+
+    def clampOrigin(self):
+        # Keep the board from being moved off the screen
+        for axis, boardSize in ((0, self.boardWidth), (1, self.boardHeight)):
+            low = (self.rect.left, self.rect.top)[axis] + BOARDMARGIN
+            high = (self.rect.right, self.rect.bottom)[axis] - BOARDMARGIN - boardSize * self.spaceSize
+            low, high = min(low, high), max(low, high)
+            if axis == 0:
+                self.originX = max(low, min(high, self.originX))
             else:
-                winner = None
-                
-            return showGameOverScreen(winner)
-
-def createBoard():
-    # Create a board dict w/ keys containing space coords and values containing whether the box is f
-    # illed or not, who owns the box, and a list containing the lines surrounding the box.
-    
-    board = {}
-    
-    for x in range(BOARDWIDTH):
-        for y in range(BOARDHEIGHT):
-                board[(x, y)] = [False, None,
-                                 [[((x,y), (x,y+1)), False],
-                                  [((x,y), (x+1,y)), False],
-                                  [((x+1,y), (x+1,y+1)), False],
-                                  [((x+1,y+1), (x,y+1)), False]]]
-
-    return board
-    
-def draw(board, dotToHighlight, playerScore, computerScore, turn):
-    # Draw the background, dots, filled lines, score information, and filled boxes
-    drawBackground()
-    drawFilledBoxes(board)
-    drawLines(board)
-    drawDots(dotToHighlight)
-    drawInfo(playerScore, computerScore, turn)
-
-def drawBackground():
-    # Fill the display and draw the board
-    DISPLAYSURF.fill(BGCOLOR)
-    pygame.draw.rect(DISPLAYSURF, BOARDCOLOR, BOARDRECT)
-    for x in range(BOARDWIDTH + 1):
-        for y in range(BOARDHEIGHT + 1):
-            left, top = getLeftTopCoordsOfBox(x, y)
-            pygame.draw.line(DISPLAYSURF,
-                             LINECOLOR,
-                             (BOARDMARGIN, top), (BOARDMARGIN + BOARDPIXELWIDTH, top),
-                             LINEWIDTH)
-            pygame.draw.line(DISPLAYSURF,
-                             LINECOLOR,
-                             (left, BOARDMARGIN), (left, BOARDMARGIN + BOARDPIXELHEIGHT),
-                             LINEWIDTH)
-
-def drawFilledBoxes(board):
-    # Draw boxes that have been filled on the board
-    for space in board:
-        if board[space][0]:
-            x, y = space[0], space[1]
-            spaceLeft, spaceTop = getLeftTopCoordsOfBox(x, y)
-            fillRect = pygame.Rect(spaceLeft + FILLINGMARGIN, spaceTop + FILLINGMARGIN,
-                                   FILLINGSIZE, FILLINGSIZE)
-            
-            if board[space][1] == PLAYER:
-                pygame.draw.rect(DISPLAYSURF, PLAYERCOLOR, fillRect)
+                self.originY = max(low, min(high, self.originY))
+
+    def pan(self, dx, dy):
+        # Move the board by a number of pixels
+        originX, originY = self.originX, self.originY
+        self.originX += dx
+        self.originY += dy
+        self.clampOrigin()
+        if (self.originX, self.originY) != (originX, originY):
+            self.version += 1
+
+    def zoom(self, factor, pixelX, pixelY):
+        # Zoom in or out keeping the point of the board under a pixel where it is
+        spaceSize = self.spaceSize
+        newSpaceSize = int(round(spaceSize * factor))
+        if newSpaceSize == spaceSize:
+            newSpaceSize += 1 if factor > 1 else -1
+        boardX = (pixelX - self.originX) / float(spaceSize)
+        boardY = (pixelY - self.originY) / float(spaceSize)
+        self.setSpaceSize(newSpaceSize)
+        if self.spaceSize == spaceSize:
+            return
+        self.originX = int(round(pixelX - boardX * self.spaceSize))
+        self.originY = int(round(pixelY - boardY * self.spaceSize))
+        self.clampOrigin()
+        self.version += 1
+
+    def getDotImage(self):
+        # The dot image scaled to the current zoom
+        if self.dotImage is None:
+            if self.dotSize == DOTIMAGEWIDTH:
+                self.dotImage = DOTIMAGE
             else:
-                pygame.draw.rect(DISPLAYSURF, COMPUTERCOLOR, fillRect)
-    
-def drawLines(board):
-    # Draw the filled lines on the board
-    for space in board:
-        for line in board[space][2]:
-            if line[1]:
-                lineX1, lineY1 = getLeftTopCoordsOfBox(line[0][0][0], line[0][0][1])
-                lineX2, lineY2 = getLeftTopCoordsOfBox(line[0][1][0], line[0][1][1])
-                pygame.draw.line(DISPLAYSURF, FILLEDLINECOLOR, (lineX1, lineY1),
-                                 (lineX2, lineY2),
-                                 FILLEDLINEWIDTH)
-                
-def drawDots(dotToHighlight):
-    # Draw the dots on the board
-    for x in range(BOARDWIDTH + 1):
-        for y in range(BOARDHEIGHT + 1):
-            dotLeft, dotTop = getLeftTopCoordsOfBox(x, y)
-            dotX, dotY = dotLeft - int(DOTIMAGEWIDTH/2), dotTop - int(DOTIMAGEHEIGHT/2)
-            DISPLAYSURF.blit(DOTIMAGE, (dotX, dotY))
-            
-            if dotToHighlight and dotToHighlight[0] == x and dotToHighlight[1] == y:
-                highlightDot(dotLeft, dotTop)
-                
-def highlightDot(x, y):
+                self.dotImage = pygame.transform.smoothscale(DOTIMAGE,
+                                                             (self.dotSize, self.dotSize))
+        return self.dotImage
+
+    def dotPixel(self, x, y):
+        # Pixel coordinates of the dot at board coordinates (x, y)
+        return self.originX + x * self.spaceSize, self.originY + y * self.spaceSize
+
+    def boardPixelRect(self):
+        # The rect the whole board covers on screen, visible or not
+        return pygame.Rect(self.originX, self.originY, self.boardWidth * self.spaceSize,
+                           self.boardHeight * self.spaceSize)
+
+    def dotRange(self, rect, reach=0):
+        # The columns and rows of dots within reach pixels of a rect, as ranges
+        spaceSize = self.spaceSize
+        rect = rect.clip(self.rect)
+        firstX = max(0, -(-(rect.left - self.originX - reach) // spaceSize))
+        lastX = min(self.boardWidth, (rect.right - 1 - self.originX + reach) // spaceSize)
+        firstY = max(0, -(-(rect.top - self.originY - reach) // spaceSize))
+        lastY = min(self.boardHeight, (rect.bottom - 1 - self.originY + reach) // spaceSize)
+        return range(firstX, lastX + 1), range(firstY, lastY + 1)
+
+    def dotAtPixel(self, pixelX, pixelY):
+        # Board coordinates of the dot drawn at a pixel, or None
+        if not self.showDots or not self.rect.collidepoint(pixelX, pixelY):
+            return None
+        spaceSize = self.spaceSize
+        halfSize = self.dotSize // 2
+        x = (pixelX - self.originX + halfSize) // spaceSize
+        y = (pixelY - self.originY + halfSize) // spaceSize
+        if not (0 <= x <= self.boardWidth and 0 <= y <= self.boardHeight):
+            return None
+        dotX, dotY = self.dotPixel(x, y)
+        if dotX - halfSize + self.dotSize <= pixelX or dotY - halfSize + self.dotSize <= pixelY:
+            return None
+        return (x, y)
+
+    def lineAtPixel(self, pixelX, pixelY):
+        # The two dots of the line nearest a pixel, if the pixel is close to one
+        if not self.rect.collidepoint(pixelX, pixelY):
+            return None
+        spaceSize = self.spaceSize
+        offsetX = pixelX - self.originX
+        offsetY = pixelY - self.originY
+        if not (0 <= offsetX <= self.boardWidth * spaceSize
+                and 0 <= offsetY <= self.boardHeight * spaceSize):
+            return None
+
+        # Distance to the nearest row and column of dots
+        row = (offsetY + spaceSize // 2) // spaceSize
+        column = (offsetX + spaceSize // 2) // spaceSize
+        rowDistance = abs(offsetY - row * spaceSize)
+        columnDistance = abs(offsetX - column * spaceSize)
+        if min(rowDistance, columnDistance) > max(self.lineWidth, spaceSize // 4):
+            return None
+        if rowDistance <= columnDistance:
+            x = min(offsetX // spaceSize, self.boardWidth - 1)
+            return ((x, row), (x + 1, row))
+        y = min(offsetY // spaceSize, self.boardHeight - 1)
+        return ((column, y), (column, y + 1))
+
+def createStaticSurface(viewport):
+    # Draw the background and the visible part of the empty grid
+    staticSurf = pygame.Surface((WINDOWWIDTH, WINDOWHEIGHT)).convert()
+    staticSurf.fill(BGCOLOR)
+    staticSurf.set_clip(viewport.rect)
+    boardRect = viewport.boardPixelRect()
+    pygame.draw.rect(staticSurf, BOARDCOLOR, boardRect)
+    columns, rows = viewport.dotRange(viewport.rect)
+    for y in rows:
+        left, top = viewport.dotPixel(0, y)
+        pygame.draw.line(staticSurf, LINECOLOR, (boardRect.left, top), (boardRect.right, top),
+                         LINEWIDTH)
+    for x in columns:
+        left, top = viewport.dotPixel(x, 0)
+        pygame.draw.line(staticSurf, LINECOLOR, (left, boardRect.top), (left, boardRect.bottom),
+                         LINEWIDTH)
+    staticSurf.set_clip(None)
+    return staticSurf
+
+class BoardRenderer(object):
+    # Keeps the board drawn on a layer of its own and only redraws what changed.
+    #
+    # New lines and boxes are drawn onto the layer once. Each frame the parts of the
+    # layer that changed, or that the dot highlight or score text moved off, are
+    # copied to the display with the dots on top, and only those rects are passed
+    # to display.update(). Panning or zooming redraws the visible part of the board.
+    def __init__(self, viewport):
+        self.viewport = viewport
+        self.viewVersion = None
+        self.layer = None
+        self.drawnLines = 0
+        self.drawnPlayerBoxes = 0
+        self.drawnComputerBoxes = 0
+        self.highlightRect = None
+        self.info = None
+        self.fullRedraw = True
+
+    def invalidate(self):
+        # Redraw the whole display next frame, e.g. after the window was uncovered
+        self.fullRedraw = True
+
+    def restore(self, rect):
+        # Draw the board back over part of the display something else drew on
+        DISPLAYSURF.blit(self.layer, rect, rect)
+        drawDotsInRect(self.viewport, rect)
+        if self.highlightRect and self.highlightRect.colliderect(rect):
+            DISPLAYSURF.set_clip(rect.clip(self.viewport.rect))
+            highlightDot(self.viewport, self.highlightRect.centerx, self.highlightRect.centery)
+            DISPLAYSURF.set_clip(None)
+
+    def drawView(self, board):
+        # Draw the lines and boxes that are on screen onto a fresh layer
+        viewport = self.viewport
+        geometry = board.geometry
+        self.layer = createStaticSurface(viewport)
+        self.layer.set_clip(viewport.rect)
+        # Look cells up in lineClass and sideCounts rather than shifting the
+        # bitmasks, which are thousands of bits long on big boards
+        lineClass = board.lineClass
+        sideCounts = board.sideCounts
+        columns, rows = viewport.dotRange(viewport.rect)
+        for y in rows:
+            for x in columns:
+                if x < board.width and y < board.height:
+                    box = geometry.boxAt(x, y)
+                    if sideCounts[box] != 4:
+                        continue
+                    if board.playerBoxes >> box & 1:
+                        drawFilledBox(self.layer, viewport, x, y, PLAYER)
+                    elif board.computerBoxes >> box & 1:
+                        drawFilledBox(self.layer, viewport, x, y, COMPUTER)
+        for y in rows:
+            for x in columns:
+                if x < board.width and lineClass[geometry.hLine(x, y)] == FILLED:
+                    drawFilledLine(self.layer, viewport, (x, y), (x + 1, y))
+                if y < board.height and lineClass[geometry.vLine(x, y)] == FILLED:
+                    drawFilledLine(self.layer, viewport, (x, y), (x, y + 1))
+        self.drawnLines = board.lines
+        self.drawnPlayerBoxes = board.playerBoxes
+        self.drawnComputerBoxes = board.computerBoxes
+        self.viewVersion = viewport.version
+        self.highlightRect = None
+        self.fullRedraw = True
+
+    def draw(self, board, dotToHighlight, playerScore, computerScore, turn):
+        # Bring the display up to date and return the rects that changed
+        viewport = self.viewport
+        if viewport.version != self.viewVersion:
+            self.drawView(board)
+
+        dirtyRects = []
+        geometry = board.geometry
+
+        for boxes, drawnBoxes, owner in ((board.playerBoxes, self.drawnPlayerBoxes, PLAYER),
+                                          (board.computerBoxes, self.drawnComputerBoxes, COMPUTER)):
+            newBoxes = boxes & ~drawnBoxes
+            while newBoxes:
+                lowBit = newBoxes & -newBoxes
+                newBoxes ^= lowBit
+                x, y = geometry.boxCoords(lowBit.bit_length() - 1)
+                dirtyRects.append(drawFilledBox(self.layer, viewport, x, y, owner))
+        self.drawnPlayerBoxes = board.playerBoxes
+        self.drawnComputerBoxes = board.computerBoxes
+
+        newLines = board.lines & ~self.drawnLines
+        while newLines:
+            lowBit = newLines & -newLines
+            newLines ^= lowBit
+            point1, point2 = geometry.linePoints[lowBit.bit_length() - 1]
+            dirtyRects.append(drawFilledLine(self.layer, viewport, point1, point2))
+        self.drawnLines = board.lines
+
+        highlightRect = None
+        if dotToHighlight:
+            highlightRect = getHighlightRect(viewport, dotToHighlight[0], dotToHighlight[1])
+        if highlightRect != self.highlightRect:
+            for rect in (self.highlightRect, highlightRect):
+                if rect:
+                    dirtyRects.append(rect)
+            self.highlightRect = highlightRect
+
+        info = (playerScore, computerScore, turn)
+        infoChanged = info != self.info
+        if infoChanged:
+            dirtyRects.append(INFORECT)
+            self.info = info
+
+        if self.fullRedraw:
+            dirtyRects = [DISPLAYSURF.get_rect()]
+            infoChanged = True
+            self.fullRedraw = False
+
+        dirtyRects = [rect for rect in dirtyRects if rect.width and rect.height]
+        if not dirtyRects:
+            return dirtyRects
+        for rect in dirtyRects:
+            DISPLAYSURF.blit(self.layer, rect, rect)
+            drawDotsInRect(viewport, rect)
+        if highlightRect:
+            DISPLAYSURF.set_clip(viewport.rect)
+            highlightDot(viewport, highlightRect.centerx, highlightRect.centery)
+            DISPLAYSURF.set_clip(None)
+        if infoChanged:
+            drawInfo(playerScore, computerScore, turn)
+        return dirtyRects
+
+def drawDotsInRect(viewport, rect):
+    # Draw the dots that overlap a rect on the display, clipped to the rect
+    if not viewport.showDots:
+        return
+    dotImage = viewport.getDotImage()
+    halfSize = viewport.dotSize // 2
+    columns, rows = viewport.dotRange(rect, halfSize)
+
+    DISPLAYSURF.set_clip(rect.clip(viewport.rect))
+    for x in columns:
+        for y in rows:
+            dotLeft, dotTop = viewport.dotPixel(x, y)
+            DISPLAYSURF.blit(dotImage, (dotLeft - halfSize, dotTop - halfSize))
+    DISPLAYSURF.set_clip(None)
+
+def drawFilledBox(surf, viewport, x, y, owner):
+    # Fill in a box in its owner's color and return the rect drawn
+    spaceLeft, spaceTop = viewport.dotPixel(x, y)
+    fillRect = pygame.Rect(spaceLeft + viewport.fillingMargin, spaceTop + viewport.fillingMargin,
+                           viewport.fillingSize, viewport.fillingSize)
+
+    if owner == PLAYER:
+        return pygame.draw.rect(surf, PLAYERCOLOR, fillRect)
+    else:
+        return pygame.draw.rect(surf, COMPUTERCOLOR, fillRect)
+
+def drawFilledLine(surf, viewport, point1, point2):
+    # Draw a filled line and return the rect drawn
+    lineX1, lineY1 = viewport.dotPixel(point1[0], point1[1])
+    lineX2, lineY2 = viewport.dotPixel(point2[0], point2[1])
+    return pygame.draw.line(surf, FILLEDLINECOLOR, (lineX1, lineY1), (lineX2, lineY2),
+                            viewport.lineWidth)
+
+def getHighlightRect(viewport, x, y):
+    # The area covered by a dot and the highlight that can go around it
+    dotLeft, dotTop = viewport.dotPixel(x, y)
+    size = viewport.dotSize + 6
+    return pygame.Rect(dotLeft - size // 2, dotTop - size // 2, size + 1, size + 1)
+
+def highlightDot(viewport, x, y):
     # Draw a highlight around a specified dot
-    pygame.draw.circle(DISPLAYSURF, HIGHLIGHTCOLOR, (x, y), int(DOTIMAGEWIDTH / 2) + 2, 2)
+    pygame.draw.circle(DISPLAYSURF, HIGHLIGHTCOLOR, (x, y), viewport.dotSize // 2 + 2, 2)
+
+textCache = OrderedDict()
+
+def renderText(text, color, background=None):
+    # Return text rendered in FONT and converted for the display. The most recently
+    # used TEXTCACHESIZE surfaces are kept, so text that doesn't change is only
+    # rendered once.
+    key = (text, color, background)
+    textSurf = textCache.pop(key, None)
+    if textSurf is None:
+        if background is None:
+            textSurf = FONT.render(text, True, color).convert_alpha()
+        else:
+            textSurf = FONT.render(text, True, color, background).convert()
+        if len(textCache) >= TEXTCACHESIZE:
+            textCache.popitem(last=False)
+    textCache[key] = textSurf
+    return textSurf
 
 def drawInfo(playerScore, computerScore, turn):
     # Draw the player's score and the computer's score
     playerText = "Player's score: " + str(playerScore)
-    playerTextSurf = FONT.render(playerText, True, FONTCOLOR)
+    playerTextSurf = renderText(playerText, FONTCOLOR)
     playerTextRect = playerTextSurf.get_rect()
-    playerTextRect.topleft = (BOARDMARGIN, BOARDPIXELHEIGHT + BOARDMARGIN + 20)
+    playerTextRect.topleft = (INFORECT.left + BOARDMARGIN, INFORECT.top)
 
     computerText = "Computer's score: " + str(computerScore)
-    computerTextSurf = FONT.render(computerText, True, FONTCOLOR)
+    computerTextSurf = renderText(computerText, FONTCOLOR)
     computerTextRect = computerTextSurf.get_rect()
     computerTextRect.topleft = (BOARDMARGIN, playerTextRect.bottom + 5)
 
@@ -237,25 +744,35 @@ def showGameOverScreen(winner):
     else:
         endMsg = "Game Over. The game was a tie!"
         
-    gameOverSurf = FONT.render(endMsg, True, FONTCOLOR, FONTRECTCOLOR)
+    gameOverSurf = renderText(endMsg, FONTCOLOR, FONTRECTCOLOR)
     gameOverRect = gameOverSurf.get_rect()
     gameOverRect.centerx, gameOverRect.centery = int(WINDOWWIDTH/2), int(WINDOWHEIGHT/2)
 
-    playAgainSurf = FONT.render("Play again", True, FONTCOLOR, FONTRECTCOLOR)
+    playAgainSurf = renderText("Play again", FONTCOLOR, FONTRECTCOLOR)
     playAgainRect = playAgainSurf.get_rect()
     playAgainRect.left, playAgainRect.top = gameOverRect.left + 20, gameOverRect.bottom + 20
 
-    quitSurf = FONT.render("Quit", True, FONTCOLOR, FONTRECTCOLOR)
+    quitSurf = renderText("Quit", FONTCOLOR, FONTRECTCOLOR)
     quitRect = quitSurf.get_rect()
     quitRect.right, quitRect.top = gameOverRect.right - 20, gameOverRect.bottom + 20
     
+    redraw = True
     while True:
+        if redraw:
+            DISPLAYSURF.blit(gameOverSurf, gameOverRect)
+            DISPLAYSURF.blit(playAgainSurf, playAgainRect)
+            DISPLAYSURF.blit(quitSurf, quitRect)
+            pygame.display.update()
+            redraw = False
+        FPSCLOCK.tick(FPS)
+
         mouseClicked = False
-        
-        for event in pygame.event.get():
+        for event in getEvents(WAITFOREVER):
             if event.type == QUIT:
                 pygame.quit()
                 sys.exit()
+            elif event.type == VIDEOEXPOSE:
+                redraw = True
             elif event.type == MOUSEMOTION:
                 mousex, mousey = event.pos
             elif event.type == MOUSEBUTTONUP:
@@ -267,87 +784,5 @@ def showGameOverScreen(winner):
         elif mouseClicked and quitRect.collidepoint(mousex, mousey):
             return False
 
-        DISPLAYSURF.blit(gameOverSurf, gameOverRect)
-        DISPLAYSURF.blit(playAgainSurf, playAgainRect)
-        DISPLAYSURF.blit(quitSurf, quitRect)
-        pygame.display.update()
-        FPSCLOCK.tick()
-
-def getDotAtPixel(mouseX, mouseY):
-    # Convert the pixel coordinates of the dot clicked to board coordinates
-    for x in range(BOARDWIDTH + 1):
-        for y in range(BOARDHEIGHT + 1):
-            pixelX, pixelY = getLeftTopCoordsOfBox(x, y)
-            pixelX -= int(DOTIMAGEWIDTH/2)
-            pixelY -= int(DOTIMAGEHEIGHT/2)
-            dotRect = pygame.Rect(pixelX, pixelY, DOTIMAGEWIDTH, DOTIMAGEHEIGHT)
-            if dotRect.collidepoint(mouseX, mouseY):
-                return (x, y)
-
-    return None
-
-def dotsAdjacent(dot1, dot2):
-    # Check if two dots are next to one another
-    dot1X, dot1Y = dot1[0], dot1[1]
-    dot2X, dot2Y = dot2[0], dot2[1]
-
-    if (dot1X == dot2X + 1 or dot1X == dot2X - 1) and dot1Y == dot2Y:
-        return True
-    elif (dot1Y == dot2Y + 1 or dot1Y == dot2Y - 1) and dot1X == dot2X:
-        return True
-    
-    return False
-
-def fillLine(board, point1, point2):
-    # After two points have been clicked on the board, fill in the line they make
-    for space in board:
-        for line in board[space][2]:
-            if set((point1, point2)) == set(line[0]):
-                lineIndex = board[space][2].index(line)
-                board[space][2][lineIndex][1] = True
-
-def fillBoxes(board, turn):
-    # Fill in boxes that are surrounded by filled lines
-    boxesFilled = 0
-    
-    for space in board:
-        if not board[space][0]:
-            boxFilled = True
-            
-            for line in board[space][2]:
-                if not line[1]:
-                    boxFilled = False
-                    
-            if boxFilled:
-                board[space][0] = True
-                board[space][1] = turn
-                boxesFilled += 1
-
-    return boxesFilled
-
-def isLineFilled(board, point1, point2):
-    # Check if the given line on the board is filled in
-    for space in board:
-        for line in board[space][2]:
-            if set(line[0]) == set((point1, point2)) and line[1]:
-                return True
-            
-    return False
-    
-def getLeftTopCoordsOfBox(x, y):
-    # Get the pixel coordinates of a box
-    left = x * SPACESIZE + BOARDMARGIN
-    top = y * SPACESIZE + BOARDMARGIN
-    return left, top
-
-def isGameOver(board):
-    # Check if all the boxes on the board have been filled in
-    gameOver = True
-    for space in board:
-        if not board[space][0]:
-            gameOver = False
-
-    return gameOver
-    
 if __name__ == "__main__":
     main()
@@ -0,0 +1,319 @@
+# Dots and Boxes game analysis
+#
+# Reviews recorded games move by move. For every position in every game the
+# computer's search finds the best move and its value, and the value of the
+# move that was actually played; the difference is the score the move lost.
+# Moves that lost at least a blunder's worth of boxes are flagged.
+#
+# Games are read one at a time from a game archive (see gamerecord.py) or from
+# a file of move lists, one JSON object per line:
+#
+#   {"width": 5, "height": 5, "first": "player", "moves": [[[0, 0], [1, 0]], ...]}
+#
+# where every move is the two dots of a line, as passed to fillLine(board,
+# point1, point2). Positions are searched in a pool of worker processes, with
+# a bounded number in flight so a big archive is never read all at once. Values
+# depend only on the filled lines, so positions are keyed by their canonical
+# symmetric image (see symmetry.py) and a bounded cache saves searching the
+# same position twice, such as the openings many games share.
+#
+# Every finished game is written to the output as one JSON line, in input
+# order, and a checkpoint beside the output records how many games and bytes
+# are done. Started again after a crash, the analysis cuts the output back to
+# the checkpoint and carries on from the next game.
+#
+# Usage: python analysis.py games.dbx --output analysis.jsonl --depth 3
+
+import argparse, json, multiprocessing, os, sys, time
+from collections import OrderedDict, deque
+
+from engine import createBoard, boardFromLines, PLAYER, COMPUTER
+from gamerecord import ARCHIVEMAGIC, readGames
+from computerplayer import ComputerPlayer, INFINITY
+from solutiondb import loadSolutionDatabase
+from symmetry import canonicalLines
+
+ANALYSISDEPTH = 3
+BLUNDERBOXES = 2 # a move that loses this many boxes or more is a blunder
+CACHEENTRIES = 200000 # positions whose results are kept for reuse
+INFLIGHTPERPROCESS = 16 # positions queued for each worker at a time
+TABLEBYTES = 4 * 1024 * 1024 # per worker; the table is cleared for every position
+CHECKPOINTSUFFIX = ".checkpoint"
+SIDES = {"player": PLAYER, "computer": COMPUTER}
+
+class AnalysisGame(object):
+    # A game read for analysis: its size, who moved first and its line indexes
+    __slots__ = ("width", "height", "firstTurn", "lines")
+
+    def __init__(self, width, height, firstTurn, lines):
+        self.width = width
+        self.height = height
+        self.firstTurn = firstTurn
+        self.lines = lines
+
+def readMoveLists(path):
+    # Yield every game in a file of JSON move lists
+    with open(path) as moveFile:
+        for lineNumber, text in enumerate(moveFile, 1):
+            if not text.strip():
+                continue
+            game = json.loads(text)
+            board = createBoard(game["width"], game["height"])
+            lines = []
+            seen = set()
+            for point1, point2 in game["moves"]:
+                line = board.geometry.lineBetween(point1, point2)
+                if line is None:
+                    raise ValueError("%s line %d: dots %r and %r are not adjacent"
+                                     % (path, lineNumber, point1, point2))
+                if line in seen:
+                    raise ValueError("%s line %d: the line between %r and %r is played twice"
+                                     % (path, lineNumber, point1, point2))
+                seen.add(line)
+                lines.append(line)
+            yield AnalysisGame(game["width"], game["height"],
+                               SIDES[game.get("first", "player")], lines)
+
+def readAnalysisGames(path):
+    # Yield the games in an archive or a move list file, whichever path is
+    with open(path, "rb") as gameFile:
+        isArchive = gameFile.read(len(ARCHIVEMAGIC)) == ARCHIVEMAGIC
+    if not isArchive:
+        for game in readMoveLists(path):
+            yield game
+        return
+    for record in readGames(path):
+        yield AnalysisGame(record.width, record.height, record.firstTurn, list(record.moves))
+
+_ANALYSER = None # this process's ComputerPlayer
+
+def startAnalyser(depth, useSolutions):
+    # Pool initializer, also called once when analysing in this process
+    global _ANALYSER
+    solutions = loadSolutionDatabase() if useSolutions else None
+    _ANALYSER = ComputerPlayer(depth, None, TABLEBYTES, solutions=solutions)
+
+def analysePosition(task):
+    # Search one position and return (best line, best value, value of the played line).
+    # Values are boxes from the rest of the game for the side to move, net.
+    width, height, lines, playedLine = task
+    board = boardFromLines(width, height, lines)
+    player = _ANALYSER
+    # Entries left by other positions can change a depth limited value, which
+    # would make the results depend on how positions were spread over processes
+    player.table.clear()
+    bestLine, bestValue = player.iterativeDeepening(board, None)
+    if playedLine == bestLine:
+        return bestLine, bestValue, bestValue
+    playedValue = player.searchMove(board, playedLine, player.completedDepth,
+                                    -INFINITY, INFINITY)
+    return bestLine, bestValue, playedValue
+
+class PositionCache(object):
+    # Results of analysePosition() for the most recently used positions, keyed
+    # by board size, canonical lines and the played line in the canonical image
+    def __init__(self, maxEntries=CACHEENTRIES):
+        self.maxEntries = maxEntries
+        self.entries = OrderedDict()
+        self.hits = 0
+
+    def get(self, key):
+        result = self.entries.get(key)
+        if result is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return result
+
+    def put(self, key, result):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxEntries:
+            self.entries.popitem(last=False)
+
+class ImmediateResult(object):
+    # Stands in for an AsyncResult when a position is analysed in this process
+    def __init__(self, value):
+        self.value = value
+
+    def ready(self):
+        return True
+
+    def get(self):
+        return self.value
+
+class PendingMove(object):
+    # One position waiting for its analysis
+    __slots__ = ("report", "moveIndex", "key", "symmetry", "result")
+
+    def __init__(self, report, moveIndex, key, symmetry, result):
+        self.report = report
+        self.moveIndex = moveIndex
+        self.key = key
+        self.symmetry = symmetry
+        self.result = result
+
+def readCheckpoint(outputPath):
+    # (games done, bytes of output written) from a checkpoint, or (0, 0)
+    try:
+        with open(outputPath + CHECKPOINTSUFFIX) as checkpointFile:
+            checkpoint = json.load(checkpointFile)
+    except (IOError, ValueError):
+        return 0, 0
+    return checkpoint["games"], checkpoint["bytes"]
+
+def writeCheckpoint(outputPath, games, outputBytes):
+    temporaryPath = outputPath + CHECKPOINTSUFFIX + ".tmp"
+    with open(temporaryPath, "w") as checkpointFile:
+        json.dump({"games": games, "bytes": outputBytes}, checkpointFile)
+    os.replace(temporaryPath, outputPath + CHECKPOINTSUFFIX)
+
+def movePoints(geometry, line):
+    # A line as the two dots fillLine() takes
+    return [list(point) for point in geometry.linePoints[line]]
+
+def analyseGames(inputPath, outputPath, depth=ANALYSISDEPTH, processes=None,
+                 blunderBoxes=BLUNDERBOXES, cacheEntries=CACHEENTRIES, resume=True,
+                 useSolutions=True, onProgress=None):
+    # Analyse every game in inputPath, appending a report per game to outputPath,
+    # and return a summary. onProgress is called with the summary so far after
+    # every game. With resume, games already in the output are skipped.
+    gamesDone, outputBytes = (0, 0)
+    if resume and os.path.exists(outputPath):
+        gamesDone, outputBytes = readCheckpoint(outputPath)
+    output = open(outputPath, "r+b" if gamesDone else "wb")
+    output.truncate(outputBytes)
+    output.seek(outputBytes)
+    if not gamesDone:
+        writeCheckpoint(outputPath, 0, 0)
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    pool = None
+    if processes > 1:
+        pool = multiprocessing.Pool(processes, startAnalyser, (depth, useSolutions))
+    else:
+        startAnalyser(depth, useSolutions)
+    maxInFlight = INFLIGHTPERPROCESS * processes
+
+    cache = PositionCache(cacheEntries)
+    inFlight = {} # key -> AsyncResult shared by every pending copy of a position
+    pending = deque()
+    stats = {"games": gamesDone, "positions": 0, "searched": 0, "blunders": 0}
+    startTime = time.time()
+
+    def summary():
+        seconds = time.time() - startTime
+        return dict(stats, cacheHits=cache.hits, seconds=seconds,
+                    positionsPerSecond=stats["positions"] / seconds if seconds else 0.0)
+
+    def finishMove():
+        # Fill in the oldest pending move, and write its game out if it was the last
+        move = pending.popleft()
+        bestLine, bestValue, playedValue = move.result.get()
+        if inFlight.get(move.key) is move.result:
+            del inFlight[move.key]
+            cache.put(move.key, (bestLine, bestValue, playedValue))
+        report = move.report
+        geometry = report["geometry"]
+        if move.symmetry:
+            bestLine = geometry.symmetryInverses[move.symmetry][bestLine]
+        loss = max(0, bestValue - playedValue)
+        entry = report["moves"][move.moveIndex]
+        entry.update(best=movePoints(geometry, bestLine), bestValue=bestValue,
+                     playedValue=playedValue, loss=loss)
+        if loss >= blunderBoxes:
+            report["blunders"].append(move.moveIndex)
+        report["left"] -= 1
+        stats["positions"] += 1
+        if report["left"] == 0 and report["read"]:
+            writeGame(report)
+
+    def writeGame(report):
+        del report["geometry"], report["left"], report["read"]
+        output.write((json.dumps(report) + "\n").encode("utf-8"))
+        output.flush()
+        stats["games"] += 1
+        stats["blunders"] += len(report["blunders"])
+        writeCheckpoint(outputPath, stats["games"], output.tell())
+        if onProgress is not None:
+            onProgress(summary())
+
+    try:
+        for gameIndex, game in enumerate(readAnalysisGames(inputPath)):
+            if gameIndex < gamesDone:
+                continue
+            geometry = createBoard(game.width, game.height).geometry
+            report = {"game": gameIndex, "width": game.width, "height": game.height,
+                      "moves": [], "blunders": [], "geometry": geometry,
+                      "left": len(game.lines), "read": False}
+            lines = 0
+            for moveIndex, line in enumerate(game.lines):
+                report["moves"].append({"move": movePoints(geometry, line)})
+                canonical, symmetry = canonicalLines(geometry, lines)
+                key = (game.width, game.height, canonical, geometry.symmetryLines[symmetry][line])
+                result = cache.get(key)
+                if result is not None:
+                    result = ImmediateResult(result)
+                else:
+                    result = inFlight.get(key)
+                    if result is not None:
+                        cache.hits += 1
+                    else:
+                        task = (game.width, game.height, canonical, key[3])
+                        if pool is None:
+                            result = ImmediateResult(analysePosition(task))
+                        else:
+                            result = pool.apply_async(analysePosition, (task,))
+                        inFlight[key] = result
+                        stats["searched"] += 1
+                pending.append(PendingMove(report, moveIndex, key, symmetry, result))
+                lines |= 1 << line
+
+                while pending and (len(pending) > maxInFlight or pending[0].result.ready()):
+                    finishMove()
+            report["read"] = True
+            if report["left"] == 0:
+                writeGame(report)
+
+        while pending:
+            finishMove()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        output.close()
+
+    return summary()
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the mistakes in recorded Dots and Boxes games.")
+    parser.add_argument("games", help="a game archive or a file of JSON move lists")
+    parser.add_argument("--output", required=True, help="file to write one JSON report per game to")
+    parser.add_argument("--depth", type=int, default=ANALYSISDEPTH, help="search depth per position")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="worker processes (default: one per core)")
+    parser.add_argument("--blunder", type=int, default=BLUNDERBOXES,
+                        help="boxes a move must lose to count as a blunder")
+    parser.add_argument("--cache", type=int, default=CACHEENTRIES,
+                        help="positions whose results are kept for reuse")
+    parser.add_argument("--restart", action="store_true",
+                        help="ignore the checkpoint and analyse every game again")
+    args = parser.parse_args()
+
+    lastReport = [0.0]
+    def onProgress(summary):
+        if summary["seconds"] - lastReport[0] >= 1.0:
+            lastReport[0] = summary["seconds"]
+            sys.stderr.write("%d games, %d positions, %.1f positions/second\r" % (
+                summary["games"], summary["positions"], summary["positionsPerSecond"]))
+
+    summary = analyseGames(args.games, args.output, args.depth, args.processes, args.blunder,
+                           args.cache, not args.restart, onProgress=onProgress)
+    sys.stderr.write("\n")
+    print("%d games, %d positions (%d searched, %d from the cache), %d blunders" % (
+        summary["games"], summary["positions"], summary["searched"], summary["cacheHits"],
+        summary["blunders"]))
+    print("%.1f positions/second" % summary["positionsPerSecond"])
+
+if __name__ == "__main__":
+    main()
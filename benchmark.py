@@ -0,0 +1,307 @@
+# Dots and Boxes benchmarks
+#
+# Times the engine, the computer player's search and the game window's drawing
+# on several board sizes and writes the numbers out as JSON. Given a saved
+# baseline it also reports every number that got worse by more than a
+# threshold, and exits with status 1 if any did, so it can gate CI.
+#
+# Drawing is timed with the SDL dummy video driver, so no display is needed.
+# Run it from the game's directory so the images can be found.
+#
+# Usage: python benchmark.py --output results.json
+#        python benchmark.py --baseline results.json --threshold 0.15
+
+import argparse, json, os, platform, random, sys, time
+
+from engine import createBoard, fillLine, fillBoxes
+from boardstate import FILLED
+from computerplayer import ComputerPlayer, greedyMove
+from mcts import MCTSPlayer
+from parallelsearch import ParallelComputerPlayer
+
+ENGINESIZES = [(3, 3), (5, 5), (8, 7), (20, 20)]
+SEARCHSIZES = [(3, 3, 8), (5, 5, 4), (8, 7, 3)] # width, height, deepest search timed
+MCTSSIZES = [(5, 5), (15, 15), (20, 20)]
+PARALLELSIZES = [(5, 5, 4)] # width, height, depth searched with one process per core
+BATCHSIZES = [(5, 5), (8, 7)]
+BATCHBOARDS = 1000 # boards played at once by the batch simulator
+EVALUATORSIZES = [(5, 5), (20, 20)]
+EVALUATORBATCH = 256 # boards scored per evaluateBatch() call
+MCTSSECONDS = 0.5 # length of each timed Monte Carlo search
+RENDERSIZES = [(8, 7), (30, 30), (100, 100)]
+GROUPS = ["engine", "search", "render"]
+
+REPEATS = 3 # each timing is the best of this many runs
+THRESHOLD = 0.10 # slowdown that counts as a regression
+
+HIGHER = "higher"
+LOWER = "lower"
+
+def bestTime(repeats, function):
+    # Run function repeats times and return the shortest time it took in seconds
+    best = None
+    for repeat in range(repeats):
+        startTime = time.perf_counter()
+        function()
+        seconds = time.perf_counter() - startTime
+        if best is None or seconds < best:
+            best = seconds
+    return best
+
+def randomGame(width, height, seed):
+    # The lines of a whole game played at random
+    rand = random.Random(seed)
+    lines = list(range(createBoard(width, height).geometry.numLines))
+    rand.shuffle(lines)
+    return lines
+
+def midgamePosition(width, height, seed, linesLeft):
+    # A board played greedily until linesLeft lines are left, a typical position
+    # for the search to be asked about
+    rand = random.Random(seed)
+    board = createBoard(width, height)
+    while board.linesLeft > linesLeft:
+        board.makeMove(greedyMove(board, rand))
+    return board
+
+def benchmarkEngine(results, repeats):
+    for width, height in ENGINESIZES:
+        size = "%dx%d" % (width, height)
+        lines = randomGame(width, height, 0)
+        linePoints = createBoard(width, height).geometry.linePoints
+        numMoves = len(lines)
+
+        def makeMoves():
+            board = createBoard(width, height)
+            for line in lines:
+                board.makeMove(line)
+            for line in lines:
+                board.unmakeMove()
+        seconds = bestTime(repeats, makeMoves)
+        addResult(results, "engine.makeMove." + size, 2 * numMoves / seconds, "moves/s", HIGHER)
+
+        def fillLines():
+            board = createBoard(width, height)
+            turn = board.turn
+            for line in lines:
+                point1, point2 = linePoints[line]
+                fillLine(board, point1, point2)
+                fillBoxes(board, turn)
+        seconds = bestTime(repeats, fillLines)
+        addResult(results, "engine.fillLine." + size, numMoves / seconds, "moves/s", HIGHER)
+
+        rand = random.Random(1)
+        playouts = max(1, 2000 // numMoves)
+        def playOut():
+            for playout in range(playouts):
+                board = createBoard(width, height)
+                openLines = list(range(board.geometry.numLines))
+                rand.shuffle(openLines)
+                for line in openLines:
+                    board.makeMove(line)
+        seconds = bestTime(repeats, playOut)
+        addResult(results, "engine.playout." + size, playouts / seconds, "playouts/s", HIGHER)
+
+    from batchsim import BatchSimulator # needs NumPy, which the rest doesn't
+    for width, height in BATCHSIZES:
+        size = "%dx%d" % (width, height)
+        numLines = createBoard(width, height).geometry.numLines
+        for policy in ("random", "greedy"):
+            simulator = BatchSimulator(BATCHBOARDS, width, height, seed=0)
+            def playOutBatch():
+                simulator.reset()
+                simulator.playOut(policy)
+            seconds = bestTime(repeats, playOutBatch)
+            addResult(results, "engine.batchPlayout.%s.%s" % (policy, size),
+                      BATCHBOARDS * numLines / seconds / 1000, "moves/ms", HIGHER)
+
+def benchmarkSearch(results, repeats):
+    for width, height, maxDepth in SEARCHSIZES:
+        size = "%dx%d" % (width, height)
+        numLines = createBoard(width, height).geometry.numLines
+        board = midgamePosition(width, height, 0, numLines // 2)
+
+        # Time every depth from a fresh player so the table starts empty each run
+        depthTimes = {}
+        nodes = []
+        def searchToDepth():
+            player = ComputerPlayer(maxDepth)
+            startTime = time.perf_counter()
+            for depth in range(1, maxDepth + 1):
+                player.searchRoot(board, depth)
+                seconds = time.perf_counter() - startTime
+                depthTimes[depth] = min(depthTimes.get(depth, seconds), seconds)
+            nodes.append(player.nodes)
+        seconds = bestTime(repeats, searchToDepth)
+
+        addResult(results, "search.nodesPerSecond." + size, nodes[-1] / seconds, "nodes/s", HIGHER)
+        for depth in sorted(depthTimes):
+            addResult(results, "search.timeToDepth%d.%s" % (depth, size),
+                      depthTimes[depth] * 1000, "ms", LOWER)
+
+    for width, height in MCTSSIZES:
+        size = "%dx%d" % (width, height)
+        numLines = createBoard(width, height).geometry.numLines
+        board = midgamePosition(width, height, 0, numLines * 3 // 4)
+        best = 0.0
+        for repeat in range(repeats):
+            player = MCTSPlayer(MCTSSECONDS, rand=random.Random(repeat))
+            player.search(board, MCTSSECONDS)
+            best = max(best, player.playoutsPerSecond)
+        addResult(results, "search.mctsPlayoutsPerSecond." + size, best, "playouts/s", HIGHER)
+
+    for width, height, depth in PARALLELSIZES:
+        size = "%dx%d" % (width, height)
+        numLines = createBoard(width, height).geometry.numLines
+        board = midgamePosition(width, height, 0, numLines // 2)
+        times = {}
+        for workers in (1, None):
+            for repeat in range(repeats):
+                # A fresh player each run so the table starts empty; starting
+                # the helper processes isn't timed
+                player = ParallelComputerPlayer(depth, workers=workers)
+                try:
+                    startTime = time.perf_counter()
+                    player.iterativeDeepening(board, None)
+                    seconds = time.perf_counter() - startTime
+                finally:
+                    player.close()
+                times[workers] = min(times.get(workers, seconds), seconds)
+        addResult(results, "search.parallelTimeToDepth%d.%s" % (depth, size),
+                  times[None] * 1000, "ms", LOWER)
+        addResult(results, "search.parallelSpeedup.%s" % size, times[1] / times[None],
+                  "x", HIGHER)
+
+    import numpy as np
+    from evaluator import MoveEvaluator # both need NumPy, which the rest doesn't
+    for width, height in EVALUATORSIZES:
+        size = "%dx%d" % (width, height)
+        numLines = createBoard(width, height).geometry.numLines
+        evaluator = MoveEvaluator(width, height)
+        board = midgamePosition(width, height, 0, numLines // 2)
+        evaluations = 200
+        def evaluate():
+            for evaluation in range(evaluations):
+                evaluator.evaluate(board)
+        seconds = bestTime(repeats, evaluate)
+        addResult(results, "search.evaluateAllMoves." + size, seconds / evaluations * 1e6,
+                  "us", LOWER)
+
+        boards = [midgamePosition(width, height, seed, numLines // 2)
+                  for seed in range(EVALUATORBATCH)]
+        filled = np.array([np.frombuffer(board.lineClass, dtype=np.uint8) == FILLED
+                           for board in boards])
+        seconds = bestTime(repeats, lambda: evaluator.evaluateBatch(filled))
+        addResult(results, "search.evaluateBatch." + size, seconds / EVALUATORBATCH * 1e6,
+                  "us/board", LOWER)
+
+def benchmarkRender(results, repeats):
+    # Needs pygame; the window is opened on the dummy driver so nothing is shown
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+    import pygame
+    import DotsAndBoxes2 as game
+    game.initDisplay()
+
+    for width, height in RENDERSIZES:
+        size = "%dx%d" % (width, height)
+        lines = randomGame(width, height, 0)[:2000]
+        frameTimes = []
+        idleTimes = []
+        fullTimes = []
+        for repeat in range(repeats):
+            board = createBoard(width, height)
+            viewport = game.Viewport(width, height, game.VIEWRECT)
+            renderer = game.BoardRenderer(viewport)
+            renderer.draw(board, None, 0, 0, board.turn)
+            for line in lines:
+                board.makeMove(line)
+                startTime = time.perf_counter()
+                renderer.draw(board, None, board.playerScore, board.computerScore, board.turn)
+                frameTimes.append(time.perf_counter() - startTime)
+
+                startTime = time.perf_counter()
+                renderer.draw(board, None, board.playerScore, board.computerScore, board.turn)
+                idleTimes.append(time.perf_counter() - startTime)
+
+            viewport.fit()
+            startTime = time.perf_counter()
+            renderer.draw(board, None, board.playerScore, board.computerScore, board.turn)
+            fullTimes.append(time.perf_counter() - startTime)
+            pygame.display.update()
+
+        addResult(results, "render.frame." + size, mean(frameTimes) * 1000, "ms", LOWER)
+        addResult(results, "render.idleFrame." + size, mean(idleTimes) * 1000, "ms", LOWER)
+        addResult(results, "render.fullRedraw." + size, min(fullTimes) * 1000, "ms", LOWER)
+
+    pygame.quit()
+
+def mean(values):
+    return sum(values) / float(len(values))
+
+def addResult(results, name, value, unit, better):
+    results[name] = {"value": value, "unit": unit, "better": better}
+    print("%-36s %14.3f %s" % (name, value, unit))
+
+def runBenchmarks(groups=GROUPS, repeats=REPEATS):
+    # Run the benchmark groups and return their results by name
+    results = {}
+    benchmarks = {"engine": benchmarkEngine, "search": benchmarkSearch,
+                  "render": benchmarkRender}
+    for group in groups:
+        benchmarks[group](results, repeats)
+    return results
+
+def compareResults(results, baseline, threshold=THRESHOLD):
+    # Return (name, change) for every result that got worse than its baseline by
+    # more than threshold. change is the fraction it got worse by.
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        old = baseline[name]["value"]
+        new = results[name]["value"]
+        if not old or not new:
+            continue
+        if results[name]["better"] == HIGHER:
+            change = old / new - 1
+        else:
+            change = new / old - 1
+        if change > threshold:
+            regressions.append((name, change))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the Dots and Boxes engine, search and drawing.")
+    parser.add_argument("groups", nargs="*", help="benchmark groups to run: " +
+                        ", ".join(GROUPS) + " (default: all)")
+    parser.add_argument("--repeats", type=int, default=REPEATS,
+                        help="runs per timing; the best is kept")
+    parser.add_argument("--output", help="write the results to this file as JSON")
+    parser.add_argument("--baseline", help="compare against results saved with --output")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="slowdown that counts as a regression, as a fraction")
+    args = parser.parse_args()
+    for group in args.groups:
+        if group not in GROUPS:
+            parser.error("unknown benchmark group %r" % (group,))
+
+    results = runBenchmarks(args.groups or GROUPS, args.repeats)
+    report = {"python": platform.python_version(), "platform": platform.platform(),
+              "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+    if args.output:
+        with open(args.output, "w") as outputFile:
+            json.dump(report, outputFile, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as baselineFile:
+            baseline = json.load(baselineFile)["results"]
+        regressions = compareResults(results, baseline, args.threshold)
+        for name, change in regressions:
+            print("REGRESSION %s: %.1f%% worse than the baseline" % (name, change * 100))
+        if regressions:
+            sys.exit(1)
+        print("No regressions over %.0f%%" % (args.threshold * 100))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+# Dots and Boxes board state
+#
+# A compact replacement for the dict-of-lists board. Each line's state is one
+# byte in lineClass, and box ownership is kept in two integers, one bit per box.
+# The filled lines as a single integer bitmask, one bit per line, are built from
+# lineClass when something asks for board.lines and kept until the next move.
+#
+# makeMove() and unmakeMove() only touch the line being played and the one or
+# two boxes next to it, so a move costs the same on any size of board, apart
+# from a move that completes a box, which also sets the box's bit in its
+# owner's mask. They also keep a Zobrist hash of the filled lines up to date
+# for the computer's search, and sort the open lines into three sets: lines
+# that complete a box, safe lines that don't put a third side on any box, and
+# unsafe lines that give boxes away.
+
+import random
+from itertools import compress
+
+from symmetry import linePermutations, inversePermutation, HASHBITS
+
+PLAYER = "player"
+COMPUTER = "computer"
+
+OTHERSIDE = {PLAYER: COMPUTER, COMPUTER: PLAYER}
+
+ZOBRISTSEED = 0x5eed
+
+SAFE = 0
+UNSAFE = 1
+CAPTURE = 2
+FILLED = 3
+
+# Class of an open line by the most sides drawn on a box next to it
+LINECLASSBYSIDES = (SAFE, SAFE, UNSAFE, CAPTURE)
+
+# bytes.translate() tables from line classes to binary digits and open flags
+FILLEDDIGITS = bytes(ord("1") if lineClass == FILLED else ord("0") for lineClass in range(256))
+OPENFLAGS = bytes(0 if lineClass == FILLED else 1 for lineClass in range(256))
+FILLEDFLAGS = bytes(1 if lineClass == FILLED else 0 for lineClass in range(256))
+
+class BoardGeometry(object):
+    # Lookup tables shared by every board of the same size.
+    #
+    # Lines are numbered with the horizontal lines first, row by row, followed by
+    # the vertical lines. Boxes are numbered row by row.
+    __slots__ = ("width", "height", "numHLines", "numLines", "numBoxes",
+                 "allLinesMask", "allBoxesMask", "boxLines", "boxLinesMask",
+                 "lineBoxes", "linePoints", "pointsLine", "zobristKeys",
+                 "symmetryLines", "symmetryInverses", "symmetryZobristKeys")
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.numHLines = width * (height + 1)
+        self.numLines = self.numHLines + (width + 1) * height
+        self.numBoxes = width * height
+        self.allLinesMask = (1 << self.numLines) - 1
+        self.allBoxesMask = (1 << self.numBoxes) - 1
+
+        self.linePoints = []
+        self.pointsLine = {}
+        for y in range(height + 1):
+            for x in range(width):
+                self.addLine((x, y), (x + 1, y))
+        for y in range(height):
+            for x in range(width + 1):
+                self.addLine((x, y), (x, y + 1))
+
+        self.boxLines = []
+        self.boxLinesMask = []
+        lineBoxes = [[] for line in range(self.numLines)]
+        for y in range(height):
+            for x in range(width):
+                box = y * width + x
+                lines = (self.hLine(x, y), self.hLine(x, y + 1),
+                         self.vLine(x, y), self.vLine(x + 1, y))
+                self.boxLines.append(lines)
+                self.boxLinesMask.append(sum(1 << line for line in lines))
+                for line in lines:
+                    lineBoxes[line].append(box)
+        self.lineBoxes = [tuple(boxes) for boxes in lineBoxes]
+
+        # Seeded so hashes of the same position agree between processes
+        rand = random.Random(ZOBRISTSEED)
+        self.zobristKeys = [rand.getrandbits(64) for line in range(self.numLines)]
+
+        # The board's symmetries as line permutations, and for each line the
+        # Zobrist keys of its images under every symmetry packed into one integer,
+        # identity first, so one XOR updates the hash of every symmetric image
+        self.symmetryLines = linePermutations(width, height)
+        self.symmetryInverses = [inversePermutation(lines) for lines in self.symmetryLines]
+        self.symmetryZobristKeys = []
+        for line in range(self.numLines):
+            packedKey = 0
+            for symmetry, lines in enumerate(self.symmetryLines):
+                packedKey |= self.zobristKeys[lines[line]] << (HASHBITS * symmetry)
+            self.symmetryZobristKeys.append(packedKey)
+
+    def addLine(self, point1, point2):
+        # Register a line under both orderings of its end points
+        line = len(self.linePoints)
+        self.linePoints.append((point1, point2))
+        self.pointsLine[(point1, point2)] = line
+        self.pointsLine[(point2, point1)] = line
+
+    def hLine(self, x, y):
+        # Index of the horizontal line from (x, y) to (x+1, y)
+        return y * self.width + x
+
+    def vLine(self, x, y):
+        # Index of the vertical line from (x, y) to (x, y+1)
+        return self.numHLines + y * (self.width + 1) + x
+
+    def lineBetween(self, point1, point2):
+        # Index of the line joining two adjacent dots, or None if they aren't adjacent
+        return self.pointsLine.get((tuple(point1), tuple(point2)))
+
+    def boxAt(self, x, y):
+        # Index of the box whose top-left dot is (x, y)
+        return y * self.width + x
+
+    def boxCoords(self, box):
+        # (x, y) of the top-left dot of a box
+        return box % self.width, box // self.width
+
+_GEOMETRIES = {}
+
+def getGeometry(width, height):
+    # Return the shared lookup tables for a board size, building them on first use
+    geometry = _GEOMETRIES.get((width, height))
+    if geometry is None:
+        geometry = _GEOMETRIES[(width, height)] = BoardGeometry(width, height)
+    return geometry
+
+class BoardState(object):
+    # A board position: which lines are filled, who owns each box and whose turn it is
+    __slots__ = ("geometry", "linesMask", "playerBoxes", "computerBoxes", "turn",
+                 "playerScore", "computerScore", "linesLeft", "sideCounts", "history",
+                 "hashKey", "symmetryKey", "lineClass", "safeLines", "unsafeLines",
+                 "captureLines", "lineSets")
+
+    def __init__(self, width, height, turn=PLAYER):
+        self.geometry = getGeometry(width, height)
+        self.linesMask = 0 # board.lines, or None until it is next asked for
+        self.playerBoxes = 0
+        self.computerBoxes = 0
+        self.turn = turn
+        self.playerScore = 0
+        self.computerScore = 0
+        self.linesLeft = self.geometry.numLines
+        self.sideCounts = bytearray(self.geometry.numBoxes)
+        self.history = []
+        self.hashKey = 0
+        self.symmetryKey = 0
+        self.lineClass = bytearray(self.geometry.numLines)
+        self.safeLines = set(range(self.geometry.numLines))
+        self.unsafeLines = set()
+        self.captureLines = set()
+        self.lineSets = (self.safeLines, self.unsafeLines, self.captureLines)
+
+    @property
+    def width(self):
+        return self.geometry.width
+
+    @property
+    def height(self):
+        return self.geometry.height
+
+    @property
+    def lines(self):
+        # The filled lines as a bitmask, bit n set if line n is filled
+        if self.linesMask is None:
+            self.linesMask = int(self.lineClass[::-1].translate(FILLEDDIGITS), 2)
+        return self.linesMask
+
+    def copy(self):
+        # Make an independent copy of the board, including its undo history
+        board = BoardState.__new__(BoardState)
+        board.geometry = self.geometry
+        board.linesMask = self.linesMask
+        board.playerBoxes = self.playerBoxes
+        board.computerBoxes = self.computerBoxes
+        board.turn = self.turn
+        board.playerScore = self.playerScore
+        board.computerScore = self.computerScore
+        board.linesLeft = self.linesLeft
+        board.sideCounts = self.sideCounts[:]
+        board.history = self.history[:]
+        board.hashKey = self.hashKey
+        board.symmetryKey = self.symmetryKey
+        board.lineClass = self.lineClass[:]
+        board.safeLines = set(self.safeLines)
+        board.unsafeLines = set(self.unsafeLines)
+        board.captureLines = set(self.captureLines)
+        board.lineSets = (board.safeLines, board.unsafeLines, board.captureLines)
+        return board
+
+    def key(self):
+        # A tuple that identifies the position
+        return (self.geometry.width, self.geometry.height, self.lines,
+                self.playerBoxes, self.computerBoxes, self.turn)
+
+    def __eq__(self, other):
+        if not isinstance(other, BoardState):
+            return NotImplemented
+        return self.key() == other.key()
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return "BoardState(%dx%d, lines=%#x, player=%#x, computer=%#x, turn=%s)" % self.key()
+
+    def makeMove(self, line):
+        # Fill in a line for the side to move and return how many boxes it completed.
+        # The turn passes to the other side unless a box was completed.
+        lineClass = self.lineClass[line]
+        if lineClass == FILLED:
+            raise ValueError("line %d is already filled" % line)
+        self.linesMask = None
+        self.linesLeft -= 1
+        self.hashKey ^= self.geometry.zobristKeys[line]
+        self.symmetryKey ^= self.geometry.symmetryZobristKeys[line]
+
+        sideCounts = self.sideCounts
+        completed = 0
+        boxesFilled = 0
+        for box in self.geometry.lineBoxes[line]:
+            sideCounts[box] += 1
+            if sideCounts[box] == 4:
+                completed |= 1 << box
+                boxesFilled += 1
+        self.lineSets[lineClass].discard(line)
+        self.lineClass[line] = FILLED
+        self.classifyAround(line)
+
+        turn = self.turn
+        self.history.append((line, completed, boxesFilled, turn))
+        if not boxesFilled:
+            self.turn = OTHERSIDE[turn]
+        elif turn == COMPUTER:
+            self.computerBoxes |= completed
+            self.computerScore += boxesFilled
+        else:
+            self.playerBoxes |= completed
+            self.playerScore += boxesFilled
+        return boxesFilled
+
+    def unmakeMove(self):
+        # Take back the last move made with makeMove() and return its line
+        line, completed, boxesFilled, turn = self.history.pop()
+        self.linesMask = None
+        self.linesLeft += 1
+        self.hashKey ^= self.geometry.zobristKeys[line]
+        self.symmetryKey ^= self.geometry.symmetryZobristKeys[line]
+        sideCounts = self.sideCounts
+        for box in self.geometry.lineBoxes[line]:
+            sideCounts[box] -= 1
+        self.classifyLine(line)
+        self.classifyAround(line)
+
+        self.turn = turn
+        if boxesFilled:
+            if turn == COMPUTER:
+                self.computerBoxes &= ~completed
+                self.computerScore -= boxesFilled
+            else:
+                self.playerBoxes &= ~completed
+                self.playerScore -= boxesFilled
+        return line
+
+    def classifyLine(self, line):
+        # Put an open line into the capture, safe or unsafe set it now belongs to
+        sideCounts = self.sideCounts
+        most = 0
+        for box in self.geometry.lineBoxes[line]:
+            if sideCounts[box] > most:
+                most = sideCounts[box]
+        lineClass = LINECLASSBYSIDES[most]
+        oldClass = self.lineClass[line]
+        if lineClass != oldClass:
+            if oldClass != FILLED:
+                self.lineSets[oldClass].discard(line)
+            self.lineSets[lineClass].add(line)
+            self.lineClass[line] = lineClass
+
+    def classifyAround(self, line):
+        # Re-classify the open lines of the boxes next to a line that just changed
+        geometry = self.geometry
+        lineClass = self.lineClass
+        for box in geometry.lineBoxes[line]:
+            for otherLine in geometry.boxLines[box]:
+                if otherLine != line and lineClass[otherLine] != FILLED:
+                    self.classifyLine(otherLine)
+
+    def openLines(self):
+        # Return an iterator over every line that has not been filled in yet, lowest first
+        return compress(range(self.geometry.numLines), self.lineClass.translate(OPENFLAGS))
+
+    def isLineAvailable(self, line):
+        # Check if a line can still be played
+        return self.lineClass[line] != FILLED
+
+    def fillLine(self, point1, point2):
+        # Fill in the line between two adjacent dots. This and fillBoxes() are the
+        # two-step form of makeMove(); they do not pass the turn or record an undo entry.
+        line = self.geometry.lineBetween(point1, point2)
+        if line is None:
+            raise ValueError("dots %r and %r are not adjacent" % (point1, point2))
+        if self.lineClass[line] != FILLED:
+            self.linesMask = None
+            self.linesLeft -= 1
+            self.hashKey ^= self.geometry.zobristKeys[line]
+            self.symmetryKey ^= self.geometry.symmetryZobristKeys[line]
+            for box in self.geometry.lineBoxes[line]:
+                self.sideCounts[box] += 1
+            self.lineSets[self.lineClass[line]].discard(line)
+            self.lineClass[line] = FILLED
+            self.classifyAround(line)
+
+    def fillBoxes(self, turn):
+        # Give every newly surrounded box to turn and return how many there were
+        sideCounts = self.sideCounts
+        owned = self.playerBoxes | self.computerBoxes
+        newBoxes = 0
+        boxesFilled = 0
+        for box in range(self.geometry.numBoxes):
+            if sideCounts[box] == 4 and not owned >> box & 1:
+                newBoxes |= 1 << box
+                boxesFilled += 1
+
+        if turn == COMPUTER:
+            self.computerBoxes |= newBoxes
+            self.computerScore += boxesFilled
+        else:
+            self.playerBoxes |= newBoxes
+            self.playerScore += boxesFilled
+        return boxesFilled
+
+    def isLineFilled(self, point1, point2):
+        # Check if the line between two dots is filled in
+        line = self.geometry.lineBetween(point1, point2)
+        return line is not None and self.lineClass[line] == FILLED
+
+    def isGameOver(self):
+        # Check if all the boxes on the board have been filled in
+        return self.playerScore + self.computerScore == self.geometry.numBoxes
+
+    def boxOwner(self, x, y):
+        # Return who owns the box at (x, y), or None if it is still open
+        boxBit = 1 << self.geometry.boxAt(x, y)
+        if self.playerBoxes & boxBit:
+            return PLAYER
+        elif self.computerBoxes & boxBit:
+            return COMPUTER
+        return None
+
+    def filledLines(self):
+        # Return an iterator over the end points of every filled line
+        return compress(self.geometry.linePoints, self.lineClass.translate(FILLEDFLAGS))
@@ -0,0 +1,272 @@
+# Dots and Boxes chain and loop analysis
+#
+# Once no safe lines are left, the open boxes usually fall apart into chains
+# (ending at the edge of the board) and loops. The value of such a position
+# follows directly from the lengths of those chains and loops, so the endgame
+# can be solved without a tree search. Positions where some box still joins
+# three or more others are searched until they break down into chains and loops.
+#
+# Values are from the point of view of the side to move: boxes it will take from
+# the rest of the game minus boxes the other side will take.
+
+from boardstate import COMPUTER, FILLED
+
+CHAIN = "chain"
+LOOP = "loop"
+OTHER = "other" # has a box with fewer than two sides joining three or more others
+
+class Component(object):
+    # A set of open boxes joined by undrawn lines
+    __slots__ = ("boxes", "groundLines", "kind")
+
+    def __init__(self, boxes, groundLines, kind):
+        self.boxes = boxes
+        self.groundLines = groundLines
+        self.kind = kind
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def __repr__(self):
+        return "Component(%s, %d boxes)" % (self.kind, len(self.boxes))
+
+class ChainAnalyzer(object):
+    # Keeps the board's open boxes split into components. Call update(line) after
+    # every makeMove() or unmakeMove(); only the components next to that line are
+    # traced again.
+    def __init__(self, board):
+        self.board = board
+        self.componentOf = [None] * board.geometry.numBoxes
+        self.components = {}
+        self.nextId = 0
+        for box in range(board.geometry.numBoxes):
+            if self.componentOf[box] is None and board.sideCounts[box] < 4:
+                self.trace(box)
+
+    def update(self, line):
+        # Re-trace the components touching a line that was just drawn or undrawn
+        affected = set()
+        for box in self.board.geometry.lineBoxes[line]:
+            componentId = self.componentOf[box]
+            if componentId in self.components:
+                affected.update(self.components.pop(componentId).boxes)
+            affected.add(box)
+
+        for box in affected:
+            self.componentOf[box] = None
+        for box in affected:
+            if self.componentOf[box] is None and self.board.sideCounts[box] < 4:
+                self.trace(box)
+
+    def trace(self, startBox):
+        # Collect every open box reachable from startBox through undrawn lines
+        geometry = self.board.geometry
+        lineClass = self.board.lineClass
+        sideCounts = self.board.sideCounts
+        componentId = self.nextId
+        self.nextId += 1
+
+        boxes = [startBox]
+        self.componentOf[startBox] = componentId
+        groundLines = 0
+        junction = False
+        allTwoSided = True
+        for box in boxes:
+            if sideCounts[box] < 2:
+                junction = True
+            if sideCounts[box] != 2:
+                allTwoSided = False
+            for line in geometry.boxLines[box]:
+                if lineClass[line] == FILLED:
+                    continue
+                neighbours = geometry.lineBoxes[line]
+                if len(neighbours) == 1:
+                    groundLines += 1
+                    continue
+                other = neighbours[0] if neighbours[1] == box else neighbours[1]
+                if self.componentOf[other] is None:
+                    self.componentOf[other] = componentId
+                    boxes.append(other)
+
+        if junction:
+            kind = OTHER
+        elif allTwoSided and not groundLines:
+            kind = LOOP
+        else:
+            kind = CHAIN
+        self.components[componentId] = Component(boxes, groundLines, kind)
+
+    def isSimple(self):
+        # Check if every component is a plain chain or loop
+        for component in self.components.values():
+            if component.kind == OTHER:
+                return False
+        return True
+
+    def signature(self):
+        # Sorted (kind, length) pairs of every component
+        return tuple(sorted((component.kind, len(component))
+                            for component in self.components.values()))
+
+def nimstringValue(signature):
+    # The Nimstring value of a position made only of chains and loops. Long chains
+    # and loops are loony and add nothing; each short chain counts as *1.
+    value = 0
+    for kind, length in signature:
+        if kind == CHAIN and length <= 2:
+            value ^= 1
+    return value
+
+_LOONYVALUES = {(): 0}
+
+def openingValue(kind, length, restValue):
+    # Value of opening one chain or loop when the others are worth restValue
+    if kind == LOOP:
+        return -length + min(-restValue, 8 + restValue)
+    elif length <= 2:
+        return -length - restValue
+    return -length + min(-restValue, 4 + restValue)
+
+def loonyValue(signature):
+    # Value for the side to move when it has to open one of these chains and loops.
+    #
+    # Opening a chain of n boxes lets the other side either take all n and move next,
+    # or take n-2 and hand back the last two so that the opener has to move again.
+    # Loops work the same way but the hand-back costs four boxes. Chains of one or two
+    # boxes can be opened so that no hand-back is possible.
+    value = _LOONYVALUES.get(signature)
+    if value is not None:
+        return value
+
+    best = None
+    for index in range(len(signature)):
+        if index and signature[index] == signature[index - 1]:
+            continue
+        kind, length = signature[index]
+        value = openingValue(kind, length, loonyValue(signature[:index] + signature[index + 1:]))
+        if best is None or value > best:
+            best = value
+
+    _LOONYVALUES[signature] = best
+    return best
+
+def hasSafeLine(board):
+    # Check if any open line can be drawn without giving a box away
+    return bool(board.safeLines)
+
+class EndgameSolver(object):
+    # Exact values and best lines for positions with no safe lines left
+    def __init__(self, board):
+        if hasSafeLine(board):
+            raise ValueError("the position still has safe lines to play")
+        self.board = board
+        self.analyzer = ChainAnalyzer(board)
+        self.values = {}
+
+    def offers(self):
+        # Lines worth considering while boxes are on offer. A box with more than two
+        # boxes behind it in its chain (four in a loop) is always worth taking, so
+        # if there is one only its line is returned. Otherwise every capture is
+        # returned along with every line that hands the last two boxes back.
+        board = self.board
+        geometry = board.geometry
+        sideCounts = board.sideCounts
+        lineClass = board.lineClass
+        analyzer = self.analyzer
+        candidates = []
+        for line in board.captureLines:
+            candidates.append(line)
+            for box in geometry.lineBoxes[line]:
+                if sideCounts[box] != 3:
+                    continue
+                component = analyzer.components[analyzer.componentOf[box]]
+                size = len(component)
+                if size > 4 or (size > 2 and component.groundLines):
+                    return [line]
+                if not (size == 2 and component.groundLines or size == 4):
+                    continue
+                neighbours = geometry.lineBoxes[line]
+                if len(neighbours) == 1:
+                    continue
+                other = neighbours[0] if neighbours[1] == box else neighbours[1]
+                for otherLine in geometry.boxLines[other]:
+                    if otherLine != line and lineClass[otherLine] != FILLED:
+                        candidates.append(otherLine)
+        return candidates
+
+    def openingLine(self, component):
+        # A line that opens a chain or loop in the way loonyValue() assumes
+        geometry = self.board.geometry
+        lineClass = self.board.lineClass
+        boxes = component.boxes
+        if component.kind == CHAIN and len(boxes) == 2:
+            # Open a two-box chain in the middle so it can't be handed back
+            for line in geometry.boxLines[boxes[0]]:
+                if lineClass[line] != FILLED and boxes[1] in geometry.lineBoxes[line]:
+                    return line
+        for box in boxes:
+            for line in geometry.boxLines[box]:
+                if lineClass[line] != FILLED and (component.kind == LOOP
+                                              or len(geometry.lineBoxes[line]) == 1):
+                    return line
+
+    def solve(self):
+        # Return (value, best line) for the side to move
+        board = self.board
+        if board.linesLeft == 0:
+            return 0, None
+        lines = board.lines
+        cached = self.values.get(lines)
+        if cached is not None:
+            return cached
+
+        if self.analyzer.isSimple():
+            if not board.captureLines:
+                best = self.bestOpening()
+                self.values[lines] = best
+                return best
+            candidates = self.offers()
+        else:
+            candidates = list(board.openLines())
+
+        best = None
+        for line in candidates:
+            boxesFilled = board.makeMove(line)
+            self.analyzer.update(line)
+            value = self.solve()[0]
+            board.unmakeMove()
+            self.analyzer.update(line)
+            value = boxesFilled + value if boxesFilled else -value
+            if best is None or value > best[0]:
+                best = (value, line)
+
+        self.values[lines] = best
+        return best
+
+    def bestOpening(self):
+        # Pick the chain or loop to open when no boxes are on offer
+        signature = self.analyzer.signature()
+        best = None
+        for component in self.analyzer.components.values():
+            key = (component.kind, len(component))
+            rest = list(signature)
+            rest.remove(key)
+            value = openingValue(component.kind, len(component), loonyValue(tuple(rest)))
+            if best is None or value > best[0]:
+                best = (value, self.openingLine(component))
+        return best
+
+def solveEndgame(board):
+    # Return the exact final score margin for the side to move, counting boxes it
+    # already owns. Raises ValueError while the position still has safe lines.
+    return EndgameSolver(board).solve()[0] + scoreMargin(board)
+
+def endgameMove(board):
+    # Return the best line for the side to move once no safe lines are left
+    return EndgameSolver(board).solve()[1]
+
+def scoreMargin(board):
+    # Boxes owned by the side to move minus boxes owned by the other side
+    if board.turn == COMPUTER:
+        return board.computerScore - board.playerScore
+    return board.playerScore - board.computerScore
@@ -0,0 +1,367 @@
+# Dots and Boxes computer player
+#
+# A negamax search with alpha-beta pruning over the lines left on the board.
+# Search values are the number of boxes the side to move will take from the
+# rest of the game minus the number the other side will take, so they depend
+# only on which lines are filled and can be shared through a transposition
+# table keyed by the board's Zobrist hash. By default the key is the hash of the
+# position's canonical symmetric image (see symmetry.py), so mirrored and
+# rotated copies of a position share one entry; best moves are stored as lines
+# of the canonical image and mapped back to the board when they are read.
+#
+# With a time limit the search deepens one ply at a time and returns the best
+# move found when time runs out. ComputerMoveThread runs it off the main thread
+# so the game window keeps drawing while the computer thinks.
+
+import random, threading, time
+
+from chains import EndgameSolver
+from solutiondb import loadSolutionDatabase
+from symmetry import canonicalKey
+from mcts import MCTSPlayer
+
+SEARCHDEPTH = 3
+ENDGAMELINES = 14 # search to the end of the game once this few lines are left
+
+TABLEBYTES = 32 * 1024 * 1024
+TABLEENTRYBYTES = 120 # rough size of one stored entry, including the list slot
+
+EXACT = 0
+LOWERBOUND = 1
+UPPERBOUND = 2
+
+INFINITY = float("inf")
+SOLVEDDEPTH = 1 << 16 # table depth for exact endgame values
+
+TIMECHECKNODES = 1023 # check the clock every this many nodes, plus one
+
+# Search depth and seconds per move for each difficulty. A depth of None only
+# stops at the end of the game or when time runs out.
+DIFFICULTYLEVELS = {
+    "easy": (1, 0.1),
+    "medium": (3, 0.5),
+    "hard": (None, 2.0),
+    "mcts": (None, 1.0),
+    "parallel": (None, 2.0),
+}
+SOLUTIONLEVELS = ("medium", "hard", "mcts", "parallel") # levels that look positions up in the solution database
+MCTSLEVELS = ("mcts",) # levels played by mcts.MCTSPlayer rather than the alpha-beta search
+PARALLELLEVELS = ("parallel",) # levels that search with every core (see parallelsearch.py)
+
+class SearchTimeout(Exception):
+    # Raised inside the search when the time limit passes or a stop is requested
+    pass
+
+class TranspositionTable(object):
+    # A fixed-size table of search results that never grows past maxBytes.
+    #
+    # Entries live in a list indexed by hash. With the "depth" replacement policy
+    # an entry is only overwritten by a search at least as deep or by any search
+    # from a later move; with "always" the newest entry wins.
+    __slots__ = ("size", "slots", "policy", "generation", "hits", "stores")
+
+    def __init__(self, maxBytes=TABLEBYTES, policy="depth"):
+        if policy not in ("depth", "always"):
+            raise ValueError("unknown replacement policy %r" % (policy,))
+        self.size = max(1, maxBytes // TABLEENTRYBYTES)
+        self.slots = [None] * self.size
+        self.policy = policy
+        self.generation = 0
+        self.hits = 0
+        self.stores = 0
+
+    def newSearch(self):
+        # Start a new generation so entries from earlier moves can be replaced
+        self.generation += 1
+
+    def clear(self):
+        self.slots = [None] * self.size
+        self.generation = 0
+
+    def probe(self, hashKey):
+        # Return (depth, flag, value, move) stored for a position, or None
+        entry = self.slots[hashKey % self.size]
+        if entry is not None and entry[0] == hashKey:
+            self.hits += 1
+            return entry[1:5]
+        return None
+
+    def store(self, hashKey, depth, flag, value, move):
+        # Save a search result, subject to the replacement policy
+        index = hashKey % self.size
+        entry = self.slots[index]
+        if (entry is None or self.policy == "always" or entry[0] == hashKey
+                or depth >= entry[1] or entry[5] != self.generation):
+            self.slots[index] = (hashKey, depth, flag, value, move, self.generation)
+            self.stores += 1
+
+def findCapture(board):
+    # Return a line that completes a box, or None if there isn't one
+    for line in board.captureLines:
+        return line
+    return None
+
+def orderMoves(board, firstMove=None):
+    # List the open lines with firstMove at the front, then lines that complete a box,
+    # then safe lines that don't give a box away, then everything else
+    moves = list(board.captureLines)
+    moves.extend(board.safeLines)
+    moves.extend(board.unsafeLines)
+    if firstMove is not None and board.isLineAvailable(firstMove):
+        moves.remove(firstMove)
+        moves.insert(0, firstMove)
+    return moves
+
+def greedyMove(board, rand=None):
+    # Take a box if one is on offer, otherwise play a safe line, otherwise give away
+    # as few boxes as possible. Picks at random between equal lines when given rand.
+    for lines in (board.captureLines, board.safeLines):
+        if lines:
+            if rand is None:
+                return next(iter(lines))
+            return rand.choice(sorted(lines))
+
+    return min(board.unsafeLines, key=lambda line: sacrificeSize(board, line))
+
+def sacrificeSize(board, line):
+    # How many boxes the other side can take straight away after line is played
+    historyLength = len(board.history)
+    board.makeMove(line)
+    taken = 0
+    while board.captureLines:
+        taken += board.makeMove(next(iter(board.captureLines)))
+    while len(board.history) > historyLength:
+        board.unmakeMove()
+    return taken
+
+class ComputerPlayer(object):
+    # Picks moves for one side with an alpha-beta search. Without a time limit it
+    # searches straight to depth; with one it deepens iteratively until time runs
+    # out. A depth of None means no limit other than the end of the game. Positions
+    # in the solutions database, if one is given, are looked up instead of searched.
+    # symmetric keys the table by canonical position rather than the board's own hash.
+    def __init__(self, depth=SEARCHDEPTH, timeLimit=None, tableBytes=TABLEBYTES,
+                 policy="depth", solutions=None, symmetric=True):
+        self.depth = depth
+        self.timeLimit = timeLimit
+        self.solutions = solutions
+        self.symmetric = symmetric
+        self.table = TranspositionTable(tableBytes, policy)
+        self.nodes = 0
+        self.completedDepth = 0
+        self.deadline = INFINITY
+        self.stopRequested = False
+        self.rootBest = None
+
+    def maxDepth(self, board):
+        # The deepest search worth doing in this position
+        if self.depth is None or board.linesLeft <= ENDGAMELINES:
+            return board.linesLeft
+        return min(self.depth, board.linesLeft)
+
+    def chooseMove(self, board):
+        # Return the line to play for the side to move. Endgames made of plain chains
+        # and loops are solved directly instead of searched.
+        if self.solutions is not None:
+            best = self.solutions.bestMove(board)
+            if best is not None:
+                return best[1]
+        if not board.safeLines:
+            solver = EndgameSolver(board)
+            if solver.analyzer.isSimple() or board.linesLeft <= ENDGAMELINES:
+                return solver.solve()[1]
+        return self.iterativeDeepening(board, self.timeLimit)[0]
+
+    def stop(self):
+        # Ask a running search to return its best move so far; safe from another thread
+        self.stopRequested = True
+
+    def close(self):
+        # Free anything the player holds outside this process; nothing here
+        pass
+
+    def iterativeDeepening(self, board, timeLimit):
+        # Search one ply deeper at a time until timeLimit seconds have passed, or
+        # to the full depth if timeLimit is None, and return (best line, value)
+        # from the deepest search that got far enough
+        if timeLimit is not None:
+            self.deadline = time.time() + timeLimit
+        self.completedDepth = 0
+        historyLength = len(board.history)
+        bestMove, bestValue = None, None
+
+        try:
+            for depth in range(1, self.maxDepth(board) + 1):
+                bestMove, bestValue = self.searchRoot(board, depth)
+                self.completedDepth = depth
+        except SearchTimeout:
+            # Unwind the moves the search was in the middle of
+            while len(board.history) > historyLength:
+                board.unmakeMove()
+            # The previous best move is searched first, so a better move found
+            # before time ran out can be trusted
+            if self.rootBest is not None:
+                bestMove, bestValue = self.rootBest
+        finally:
+            self.deadline = INFINITY
+            self.stopRequested = False
+
+        if bestMove is None:
+            bestMove = orderMoves(board)[0]
+        return bestMove, bestValue
+
+    def tableKey(self, board):
+        # (hash, symmetry) the table stores a position under; a symmetry of 0
+        # means moves are stored as they are
+        if self.symmetric:
+            return canonicalKey(board)
+        return board.hashKey, 0
+
+    def probeMove(self, board, hashKey, symmetry):
+        # (depth, flag, value, best line on this board) stored for a position, or None
+        entry = self.table.probe(hashKey)
+        if entry is None or not symmetry:
+            return entry
+        depth, flag, value, move = entry
+        if move is not None:
+            move = board.geometry.symmetryInverses[symmetry][move]
+        return depth, flag, value, move
+
+    def storeMove(self, board, hashKey, symmetry, depth, flag, value, move):
+        if symmetry and move is not None:
+            move = board.geometry.symmetryLines[symmetry][move]
+        self.table.store(hashKey, depth, flag, value, move)
+
+    def searchRoot(self, board, depth):
+        # Search the position to depth and return (best line, value)
+        self.table.newSearch()
+        self.rootBest = None
+        bestMove, bestValue = None, -INFINITY
+        alpha, beta = -INFINITY, INFINITY
+        hashKey, symmetry = self.tableKey(board)
+        entry = self.probeMove(board, hashKey, symmetry)
+        for line in orderMoves(board, entry and entry[3]):
+            value = self.searchMove(board, line, depth, alpha, beta)
+            if value > bestValue:
+                bestMove, bestValue = line, value
+                self.rootBest = (bestMove, bestValue)
+            if value > alpha:
+                alpha = value
+
+        if bestMove is not None:
+            self.storeMove(board, hashKey, symmetry, depth, EXACT, bestValue, bestMove)
+        return bestMove, bestValue
+
+    def searchMove(self, board, line, depth, alpha, beta):
+        # Play a line, search the result and return its value for the side that played it.
+        # Completing a box keeps the turn and doesn't use up depth.
+        boxesFilled = board.makeMove(line)
+        if boxesFilled:
+            value = boxesFilled + self.search(board, depth, alpha - boxesFilled,
+                                              beta - boxesFilled)
+        else:
+            value = -self.search(board, depth - 1, -beta, -alpha)
+        board.unmakeMove()
+        return value
+
+    def search(self, board, depth, alpha, beta):
+        # Negamax value of the position for the side to move
+        self.nodes += 1
+        if not self.nodes & TIMECHECKNODES and (self.stopRequested
+                                                or time.time() > self.deadline):
+            raise SearchTimeout()
+        if board.linesLeft == 0:
+            return 0
+        if self.solutions is not None:
+            value = self.solutions.lookup(board)
+            if value is not None:
+                return value
+        if depth > board.linesLeft:
+            # Deeper than the game goes; clamp so table entries can be shared
+            depth = board.linesLeft
+        if depth <= 0:
+            # Out of depth: take any boxes on offer before stopping so that
+            # a sacrifice on the last move isn't mistaken for a free move
+            line = findCapture(board)
+            if line is None:
+                return 0
+            return self.searchMove(board, line, 0, alpha, beta)
+
+        hashKey, symmetry = self.tableKey(board)
+        bestMove = None
+        entry = self.probeMove(board, hashKey, symmetry)
+        if entry is not None:
+            entryDepth, flag, value, bestMove = entry
+            if entryDepth >= depth:
+                if flag == EXACT:
+                    return value
+                elif flag == LOWERBOUND and value > alpha:
+                    alpha = value
+                elif flag == UPPERBOUND and value < beta:
+                    beta = value
+                if alpha >= beta:
+                    return value
+
+        if not board.safeLines:
+            # Chains and loops only: the value is known without searching
+            solver = EndgameSolver(board)
+            if solver.analyzer.isSimple():
+                value, line = solver.solve()
+                self.storeMove(board, hashKey, symmetry, SOLVEDDEPTH, EXACT, value, line)
+                return value
+
+        originalAlpha = alpha
+        bestValue = -INFINITY
+        for line in orderMoves(board, bestMove):
+            value = self.searchMove(board, line, depth, alpha, beta)
+            if value > bestValue:
+                bestValue, bestMove = value, line
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+
+        if bestValue <= originalAlpha:
+            flag = UPPERBOUND
+        elif bestValue >= beta:
+            flag = LOWERBOUND
+        else:
+            flag = EXACT
+        self.storeMove(board, hashKey, symmetry, depth, flag, bestValue, bestMove)
+        return bestValue
+
+def createComputerPlayer(difficulty, seed=None):
+    # Make a computer player for one of the DIFFICULTYLEVELS
+    depth, timeLimit = DIFFICULTYLEVELS[difficulty]
+    solutions = loadSolutionDatabase() if difficulty in SOLUTIONLEVELS else None
+    if difficulty in MCTSLEVELS:
+        # Once no safe lines are left the alpha-beta search and the chain solver
+        # play the endgame better than playouts can
+        endgamePlayer = ComputerPlayer(depth, timeLimit, solutions=solutions)
+        return MCTSPlayer(timeLimit, rand=random.Random(seed), solutions=solutions,
+                          endgamePlayer=endgamePlayer)
+    if difficulty in PARALLELLEVELS:
+        from parallelsearch import ParallelComputerPlayer # it imports this module
+        return ParallelComputerPlayer(depth, timeLimit, solutions=solutions)
+    return ComputerPlayer(depth, timeLimit, solutions=solutions)
+
+class ComputerMoveThread(threading.Thread):
+    # Works out the computer's move in the background. The search runs on its own
+    # copy of the board; move is None until the search is over. onDone, if given,
+    # is called from the thread once the move is ready.
+    def __init__(self, computerPlayer, board, onDone=None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.computerPlayer = computerPlayer
+        self.board = board.copy()
+        self.onDone = onDone
+        self.move = None
+
+    def run(self):
+        self.move = self.computerPlayer.chooseMove(self.board)
+        if self.onDone is not None:
+            self.onDone()
+
+    def cancel(self):
+        # Stop the search early; move will hold the best line found so far
+        self.computerPlayer.stop()
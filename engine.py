@@ -0,0 +1,80 @@
+# Dots and Boxes engine
+#
+# The rules of the game with no pygame or display dependency, so they can be
+# used from worker processes, servers and benchmarks as well as the game window.
+
+from boardstate import BoardState, PLAYER, COMPUTER
+
+BOARDWIDTH = 8
+BOARDHEIGHT = 7
+
+def createBoard(width=BOARDWIDTH, height=BOARDHEIGHT, turn=PLAYER):
+    # Create an empty board where turn moves first
+    return BoardState(width, height, turn)
+
+def boardFromLines(width, height, lines, turn=PLAYER):
+    # Create a board with the lines in a bitmask filled in. Scores and turn come
+    # from playing them in index order, so only use it where they don't matter.
+    board = BoardState(width, height, turn)
+    while lines:
+        lowBit = lines & -lines
+        board.makeMove(lowBit.bit_length() - 1)
+        lines ^= lowBit
+    return board
+
+def dotsAdjacent(dot1, dot2):
+    # Check if two dots are next to one another
+    dot1X, dot1Y = dot1[0], dot1[1]
+    dot2X, dot2Y = dot2[0], dot2[1]
+
+    if (dot1X == dot2X + 1 or dot1X == dot2X - 1) and dot1Y == dot2Y:
+        return True
+    elif (dot1Y == dot2Y + 1 or dot1Y == dot2Y - 1) and dot1X == dot2X:
+        return True
+
+    return False
+
+def getLine(board, point1, point2):
+    # Get the index of the line between two dots, or None if there is no such line
+    return board.geometry.lineBetween(point1, point2)
+
+def isLegalMove(board, point1, point2):
+    # Check if the line between two dots is on the board and not filled in yet
+    line = getLine(board, point1, point2)
+    return line is not None and board.isLineAvailable(line)
+
+def makeMove(board, point1, point2):
+    # Fill in the line between two points for whoever's turn it is, scoring any boxes
+    # it completes and passing the turn if it completed none
+    line = getLine(board, point1, point2)
+    if line is None:
+        raise ValueError("dots %r and %r are not adjacent" % (point1, point2))
+    return board.makeMove(line)
+
+def fillLine(board, point1, point2):
+    # After two points have been clicked on the board, fill in the line they make
+    board.fillLine(point1, point2)
+
+def fillBoxes(board, turn):
+    # Fill in boxes that are surrounded by filled lines
+    return board.fillBoxes(turn)
+
+def isLineFilled(board, point1, point2):
+    # Check if the given line on the board is filled in
+    return board.isLineFilled(point1, point2)
+
+def isGameOver(board):
+    # Check if all the boxes on the board have been filled in
+    return board.isGameOver()
+
+def getScores(board):
+    # Get the player's and the computer's score
+    return board.playerScore, board.computerScore
+
+def getWinner(board):
+    # Get the side with the most boxes, or None for a tie
+    if board.playerScore > board.computerScore:
+        return PLAYER
+    elif board.computerScore > board.playerScore:
+        return COMPUTER
+    return None
@@ -0,0 +1,172 @@
+# Dots and Boxes move evaluator
+#
+# Rates every open line on a board at once with NumPy. The board is turned into
+# arrays of filled lines and sides drawn per box, every line gets a row of
+# features worked out with array operations, and a line's score is its features
+# weighted and summed. evaluateBatch() does the same for many boards of one size
+# stacked together, such as the leaves of a search or a BatchSimulator's boards.
+#
+# The features, for the side about to play each line:
+#
+#   capture        boxes the line completes
+#   thirdSide      boxes it puts a third side on, offering them to the other side
+#   chainGiven     boxes in the chains of two-sided boxes it opens up
+#   safe           1 if it puts a third side on no box
+#   edge           1 if it is on the edge of the board
+#   evenSafeLeft   1 if it is safe and leaves an even number of safe lines, so
+#                  that this side would play the last of them
+#
+# Chains are found by labelling boxes with two sides drawn, joining boxes that
+# share an open line and taking each label's smallest neighbour, with pointer
+# jumping, until no label changes.
+#
+# Weights are a dict of feature name to weight and can be loaded from a JSON
+# file, so they can be tuned offline. Lines and boxes are numbered as in
+# boardstate.BoardGeometry. Needs NumPy, which the rest of the game does not.
+
+import json, os
+
+import numpy as np
+
+from boardstate import getGeometry, FILLED
+
+FEATURES = ("capture", "thirdSide", "chainGiven", "safe", "edge", "evenSafeLeft")
+DEFAULTWEIGHTS = {
+    "capture": 10.0,
+    "thirdSide": -4.0,
+    "chainGiven": -1.0,
+    "safe": 1.0,
+    "edge": 0.1,
+    "evenSafeLeft": 0.5,
+}
+
+WEIGHTSFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "weights.json")
+
+def loadWeights(path=WEIGHTSFILE):
+    # Read weights from a JSON object of feature names to numbers. Features it
+    # leaves out keep their default weights, and so does every feature if the
+    # default file doesn't exist.
+    if path == WEIGHTSFILE and not os.path.exists(path):
+        return dict(DEFAULTWEIGHTS)
+    with open(path) as weightsFile:
+        loaded = json.load(weightsFile)
+    unknown = set(loaded) - set(FEATURES)
+    if unknown:
+        raise ValueError("%s has weights for unknown features: %s"
+                         % (path, ", ".join(sorted(unknown))))
+    weights = dict(DEFAULTWEIGHTS)
+    weights.update((name, float(value)) for name, value in loaded.items())
+    return weights
+
+def saveWeights(path, weights):
+    with open(path, "w") as weightsFile:
+        json.dump(dict((name, weights[name]) for name in FEATURES), weightsFile, indent=2)
+
+class MoveEvaluator(object):
+    # Scores the lines of boards of one size
+    def __init__(self, width, height, weights=None):
+        self.geometry = geometry = getGeometry(width, height)
+        self.setWeights(weights or DEFAULTWEIGHTS)
+        numLines = geometry.numLines
+        numBoxes = geometry.numBoxes
+
+        # Boxes next to each line; edge lines point their missing box at an extra
+        # column that always has no sides drawn
+        self.dummyBox = numBoxes
+        lineBoxes = np.full((numLines, 2), numBoxes, dtype=np.intp)
+        for line, boxes in enumerate(geometry.lineBoxes):
+            lineBoxes[line, :len(boxes)] = boxes
+        self.firstBoxes = lineBoxes[:, 0].copy()
+        self.secondBoxes = lineBoxes[:, 1].copy()
+        self.isEdge = self.secondBoxes == numBoxes
+        self.boxLines = np.array(geometry.boxLines, dtype=np.intp).reshape(numBoxes, 4)
+
+        # Lines between two boxes, the ones that can join boxes into a chain
+        inner = np.flatnonzero(~self.isEdge)
+        self.innerLines = inner
+        self.innerFirst = self.firstBoxes[inner]
+        self.innerSecond = self.secondBoxes[inner]
+
+    def setWeights(self, weights):
+        self.weights = dict(weights)
+        self.weightVector = np.array([self.weights[name] for name in FEATURES])
+
+    def evaluate(self, board):
+        # Score of every line on a board, -inf for filled lines
+        filled = np.frombuffer(board.lineClass, dtype=np.uint8) == FILLED
+        sideCounts = np.frombuffer(board.sideCounts, dtype=np.uint8)
+        return self.score(filled[np.newaxis], sideCounts[np.newaxis])[0]
+
+    def evaluateBatch(self, filled):
+        # Scores for a batch of boards given as a (boards, lines) array of which
+        # lines are filled, such as BatchSimulator.lines
+        filled = np.asarray(filled, dtype=np.bool_)
+        sideCounts = filled[:, self.boxLines].sum(axis=2, dtype=np.uint8)
+        return self.score(filled, sideCounts)
+
+    def bestMove(self, board):
+        # The highest scoring open line on a board
+        return int(self.evaluate(board).argmax())
+
+    def score(self, filled, sideCounts):
+        features = self.features(filled, sideCounts)
+        scores = features @ self.weightVector
+        scores[filled] = -np.inf
+        return scores
+
+    def features(self, filled, sideCounts):
+        # A (boards, lines, len(FEATURES)) array of every line's features
+        numBoards = filled.shape[0]
+        numBoxes = self.geometry.numBoxes
+        counts = np.zeros((numBoards, numBoxes + 1), dtype=np.int8)
+        counts[:, :numBoxes] = sideCounts
+        first = counts[:, self.firstBoxes]
+        second = counts[:, self.secondBoxes]
+
+        features = np.empty((numBoards, filled.shape[1], len(FEATURES)))
+        features[:, :, 0] = (first == 3).astype(np.int8) + (second == 3)
+        features[:, :, 1] = (first == 2).astype(np.int8) + (second == 2)
+        features[:, :, 2] = self.chainGiven(filled, counts, first, second)
+        safe = (first < 2) & (second < 2)
+        features[:, :, 3] = safe
+        features[:, :, 4] = self.isEdge
+
+        # A safe line takes itself and the other safe lines of any box it gives a
+        # second side to out of the safe lines left
+        safeLines = ~filled & safe
+        safePerBox = np.zeros((numBoards, numBoxes + 1), dtype=np.int16)
+        safePerBox[:, :numBoxes] = safeLines[:, self.boxLines].sum(axis=2)
+        lost = (np.where(first == 1, safePerBox[:, self.firstBoxes] - 1, 0)
+                + np.where(second == 1, safePerBox[:, self.secondBoxes] - 1, 0))
+        safeLeft = safeLines.sum(axis=1, keepdims=True) - 1 - lost
+        features[:, :, 5] = safe & (safeLeft % 2 == 0)
+        return features
+
+    def chainGiven(self, filled, counts, first, second):
+        # Boxes in the chains of two-sided boxes next to each line, counting a
+        # chain once if the line touches it twice
+        numBoards, width = counts.shape
+        inChain = counts == 2
+        offsets = (np.arange(numBoards) * width)[:, np.newaxis]
+        labels = np.arange(numBoards * width)
+
+        joined = (~filled[:, self.innerLines] & inChain[:, self.innerFirst]
+                  & inChain[:, self.innerSecond])
+        ends1 = (offsets + self.innerFirst)[joined]
+        ends2 = (offsets + self.innerSecond)[joined]
+        while len(ends1):
+            lowest = np.minimum(labels[ends1], labels[ends2])
+            newLabels = labels.copy()
+            np.minimum.at(newLabels, labels[ends1], lowest)
+            np.minimum.at(newLabels, labels[ends2], lowest)
+            newLabels = newLabels[newLabels]
+            if np.array_equal(newLabels, labels):
+                break
+            labels = newLabels
+
+        sizes = np.bincount(labels, weights=inChain.reshape(-1), minlength=len(labels))
+        firstLabels = labels[offsets + self.firstBoxes]
+        secondLabels = labels[offsets + self.secondBoxes]
+        given = np.where(first == 2, sizes[firstLabels], 0)
+        given += np.where((second == 2) & (secondLabels != firstLabels), sizes[secondLabels], 0)
+        return given
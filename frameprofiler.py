@@ -0,0 +1,109 @@
+# Dots and Boxes frame profiler
+#
+# Times the phases of each pass through the game loop: waiting for events,
+# handling them, playing moves, drawing and updating the display. Keeps the
+# last few seconds of frames for percentiles and counts frames whose work took
+# longer than one frame at the target frame rate. Every frame can also be
+# written out as JSON or CSV.
+#
+# The game only creates a profiler when asked to, and checks for one with a
+# single "is not None" per phase, so it costs nothing when profiling is off.
+
+import csv, json, time
+from collections import deque
+
+PHASES = ["wait", "events", "moves", "draw", "update", "tick"]
+IDLEPHASES = ("wait", "tick") # time spent sleeping rather than working
+
+ROLLINGFRAMES = 300 # frames kept for the rolling percentiles
+MAXRECORDEDFRAMES = 100000 # frames kept for the file written at exit
+PERCENTILES = (50, 95, 99)
+
+def percentile(sortedValues, percent):
+    # Nearest-rank percentile of an already sorted list
+    if not sortedValues:
+        return 0.0
+    index = max(0, min(len(sortedValues) - 1,
+                       int(round(percent / 100.0 * len(sortedValues))) - 1))
+    return sortedValues[index]
+
+class FrameProfiler(object):
+    # Per-phase timings of every frame. Call beginFrame() at the top of the loop,
+    # mark(phase) at the end of each phase and endFrame() at the bottom.
+    def __init__(self, fps, phases=PHASES):
+        self.fps = fps
+        self.frameBudget = 1.0 / fps
+        self.phases = list(phases)
+        self.phaseIndex = dict((phase, index) for index, phase in enumerate(self.phases))
+        self.busyIndexes = [index for index, phase in enumerate(self.phases)
+                            if phase not in IDLEPHASES]
+        self.rolling = deque(maxlen=ROLLINGFRAMES)
+        self.recorded = []
+        self.frames = 0
+        self.droppedFrames = 0
+        self.startTime = time.time()
+        self.current = None
+        self.lastMark = None
+
+    def beginFrame(self):
+        self.current = [0.0] * len(self.phases)
+        self.lastMark = time.perf_counter()
+
+    def mark(self, phase):
+        # Add the time since the last mark to a phase of this frame
+        now = time.perf_counter()
+        self.current[self.phaseIndex[phase]] += now - self.lastMark
+        self.lastMark = now
+
+    def endFrame(self):
+        frame = self.current
+        self.frames += 1
+        if self.busyTime(frame) > self.frameBudget:
+            self.droppedFrames += 1
+        self.rolling.append(frame)
+        if len(self.recorded) < MAXRECORDEDFRAMES:
+            self.recorded.append(frame)
+        self.current = None
+
+    def busyTime(self, frame):
+        # Seconds of a frame spent working rather than waiting
+        return sum(frame[index] for index in self.busyIndexes)
+
+    def summary(self, frames=None):
+        # Percentiles, mean and worst time in milliseconds for every phase and for
+        # the busy part of the frame, over the rolling window by default
+        if frames is None:
+            frames = self.rolling
+        columns = [(phase, [frame[index] for frame in frames])
+                   for index, phase in enumerate(self.phases)]
+        columns.append(("busy", [self.busyTime(frame) for frame in frames]))
+
+        summary = {}
+        for name, values in columns:
+            values.sort()
+            stats = {"mean": 1000 * sum(values) / len(values) if values else 0.0,
+                     "max": 1000 * values[-1] if values else 0.0}
+            for percent in PERCENTILES:
+                stats["p%d" % percent] = 1000 * percentile(values, percent)
+            summary[name] = stats
+        return summary
+
+    def write(self, path):
+        # Write every recorded frame to a file, as CSV if the name ends in .csv and
+        # as JSON with a summary otherwise. Times are in milliseconds.
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as csvFile:
+                writer = csv.writer(csvFile)
+                writer.writerow(["frame"] + self.phases + ["busy", "dropped"])
+                for number, frame in enumerate(self.recorded):
+                    busy = self.busyTime(frame)
+                    writer.writerow([number] + ["%.4f" % (1000 * t) for t in frame]
+                                    + ["%.4f" % (1000 * busy), int(busy > self.frameBudget)])
+            return
+
+        report = {"fps": self.fps, "frames": self.frames, "droppedFrames": self.droppedFrames,
+                  "seconds": time.time() - self.startTime, "phases": self.phases,
+                  "summary": self.summary(self.recorded),
+                  "frameTimes": [[round(1000 * t, 4) for t in frame] for frame in self.recorded]}
+        with open(path, "w") as jsonFile:
+            json.dump(report, jsonFile, indent=1)
@@ -0,0 +1,277 @@
+# Dots and Boxes game records
+#
+# A compact binary archive of finished games. The file starts with ARCHIVEMAGIC
+# and is followed by one record per game:
+#
+#   header    RECORDHEADER: the record's length in bytes, board width and
+#             height, flags, who moved first, the lengths of the two player
+#             names, the start time and the number of moves
+#   names     the two player names in UTF-8, first side then second side
+#   moves     one line index per move, one byte each if the board has no more
+#             than 256 lines and two bytes otherwise
+#   times     if HASTIMES is set, the milliseconds taken over each move as
+#             4-byte integers
+#
+# Numbers are little-endian. Lines are numbered the same way as in
+# boardstate.BoardGeometry. Records are only ever appended, one whole game at a
+# time, so a file can be read while games are still being added to it.
+#
+# The reader memory-maps the archive and hands out moves as views into the
+# map, so scanning an archive doesn't load it into memory.
+#
+# Usage: python gamerecord.py games.dbx
+
+import mmap, os, struct, sys, time
+from array import array
+
+from boardstate import BoardState, getGeometry, PLAYER, COMPUTER
+
+ARCHIVEMAGIC = b"DBXGAME1"
+RECORDHEADER = struct.Struct("<IBBBBBBdI")
+
+HASTIMES = 1 # per-move times follow the moves
+FINISHED = 2 # the game was played to the end
+
+SIDECODES = {PLAYER: 0, COMPUTER: 1}
+SIDES = (PLAYER, COMPUTER)
+
+def lineTypeCode(numLines):
+    # array type code of the line indexes for a board with numLines lines
+    return "B" if numLines <= 0x100 else "H"
+
+class GameRecord(object):
+    # One game read from an archive. moves and times are sequences of ints that
+    # may be views into the archive's memory map.
+    __slots__ = ("width", "height", "playerNames", "firstTurn", "startTime", "finished",
+                 "moves", "times")
+
+    def __init__(self, width, height, playerNames, firstTurn, startTime, finished, moves,
+                 times=None):
+        self.width = width
+        self.height = height
+        self.playerNames = playerNames
+        self.firstTurn = firstTurn
+        self.startTime = startTime
+        self.finished = finished
+        self.moves = moves
+        self.times = times
+
+    def __len__(self):
+        return len(self.moves)
+
+    def __repr__(self):
+        return "GameRecord(%dx%d, %s vs %s, %d moves)" % (self.width, self.height,
+                                                            self.playerNames[0],
+                                                            self.playerNames[1],
+                                                            len(self.moves))
+
+    def boards(self):
+        # Play the game through and yield the board after every move. The same board
+        # is yielded each time, changed by one move.
+        board = BoardState(self.width, self.height, self.firstTurn)
+        makeMove = board.makeMove
+        for line in self.moves:
+            makeMove(line)
+            yield board
+
+    def replay(self):
+        # Play the game through and return the final board
+        board = BoardState(self.width, self.height, self.firstTurn)
+        makeMove = board.makeMove
+        for line in self.moves:
+            makeMove(line)
+        return board
+
+def packRecord(width, height, playerNames, firstTurn, lines, times=None, finished=True,
+               startTime=None):
+    # The bytes of one record. times are in seconds.
+    numLines = getGeometry(width, height).numLines
+    moves = array(lineTypeCode(numLines), lines)
+    names = [name.encode("utf-8")[:0xff] for name in playerNames]
+    flags = FINISHED if finished else 0
+    body = [names[0], names[1], toLittleEndian(moves)]
+    if times is not None:
+        if len(times) != len(moves):
+            raise ValueError("need one time for every move")
+        flags |= HASTIMES
+        body.append(toLittleEndian(array("I", [min(int(round(seconds * 1000)), 0xffffffff)
+                                               for seconds in times])))
+    if startTime is None:
+        startTime = time.time()
+
+    body = b"".join(body)
+    header = RECORDHEADER.pack(RECORDHEADER.size + len(body), width, height, flags,
+                               SIDECODES[firstTurn], len(names[0]), len(names[1]),
+                               startTime, len(moves))
+    return header + body
+
+def toLittleEndian(values):
+    # The bytes of an array in little-endian order
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def fromLittleEndian(view, typeCode):
+    # Ints from little-endian bytes, as a view when the machine is little-endian
+    if sys.byteorder == "little":
+        return view.cast(typeCode)
+    values = array(typeCode, view.tobytes())
+    values.byteswap()
+    return values
+
+class GameRecordWriter(object):
+    # Appends games to an archive, creating it if needed. The game window calls
+    # beginGame(), recordMove() after every move and endGame(); other code with a
+    # whole game at hand can call writeGame().
+    def __init__(self, path):
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(ARCHIVEMAGIC)
+            self.file.flush()
+        else:
+            with open(path, "rb") as archive:
+                if archive.read(len(ARCHIVEMAGIC)) != ARCHIVEMAGIC:
+                    self.file.close()
+                    raise ValueError("%s is not a game archive" % path)
+        self.game = None
+
+    def beginGame(self, width, height, playerNames, firstTurn):
+        # Start recording a game, dropping any game that wasn't ended
+        self.game = (width, height, playerNames, firstTurn, time.time(), [], [])
+        self.lastMoveTime = time.time()
+
+    def recordMove(self, line, seconds=None):
+        # Add a move to the game being recorded. seconds is how long it took and
+        # defaults to the time since the previous move.
+        now = time.time()
+        if seconds is None:
+            seconds = now - self.lastMoveTime
+        self.lastMoveTime = now
+        self.game[5].append(line)
+        self.game[6].append(seconds)
+
+    def endGame(self, finished=True):
+        # Append the game being recorded to the archive
+        if self.game is None:
+            return
+        width, height, playerNames, firstTurn, startTime, lines, times = self.game
+        self.game = None
+        self.writeGame(width, height, playerNames, firstTurn, lines, times, finished, startTime)
+
+    def writeGame(self, width, height, playerNames, firstTurn, lines, times=None, finished=True,
+                  startTime=None):
+        # Append a whole game to the archive
+        self.file.write(packRecord(width, height, playerNames, firstTurn, lines, times,
+                                   finished, startTime))
+        self.file.flush()
+
+    def close(self):
+        # Write any game still being recorded as unfinished and close the archive
+        if self.file.closed:
+            return
+        self.endGame(finished=False)
+        self.file.close()
+
+class GameArchive(object):
+    # Reads the records in an archive. Iterating over it yields GameRecords one
+    # at a time. The file is memory-mapped, or read into memory if it can't be.
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            self.data = self.file.read() # empty files can't be mapped
+        self.view = memoryview(self.data)
+        if bytes(self.view[:len(ARCHIVEMAGIC)]) != ARCHIVEMAGIC:
+            self.close()
+            raise ValueError("%s is not a game archive" % path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return self.records()
+
+    def close(self):
+        # Records still holding views into the map keep it open until they are
+        # garbage collected
+        self.view = None
+        if isinstance(self.data, mmap.mmap):
+            try:
+                self.data.close()
+            except BufferError:
+                pass
+        self.data = None
+        self.file.close()
+
+    def records(self, offset=len(ARCHIVEMAGIC)):
+        # Yield every record from offset on. A record cut short at the end of the file,
+        # such as one still being written, is left out.
+        view = self.view
+        size = len(view)
+        while offset + RECORDHEADER.size <= size:
+            record, nextOffset = self.readRecord(offset)
+            if record is None:
+                return
+            yield record
+            offset = nextOffset
+
+    def readRecord(self, offset):
+        # Return (record, offset of the next record), or (None, None) if the record
+        # at offset isn't all there
+        view = self.view
+        (recordBytes, width, height, flags, firstTurn, nameLengthA, nameLengthB, startTime,
+         numMoves) = RECORDHEADER.unpack_from(view, offset)
+        end = offset + recordBytes
+        if end > len(view):
+            return None, None
+
+        position = offset + RECORDHEADER.size
+        nameA = bytes(view[position:position + nameLengthA]).decode("utf-8", "replace")
+        position += nameLengthA
+        nameB = bytes(view[position:position + nameLengthB]).decode("utf-8", "replace")
+        position += nameLengthB
+
+        typeCode = lineTypeCode(getGeometry(width, height).numLines)
+        moveBytes = numMoves * array(typeCode).itemsize
+        moves = fromLittleEndian(view[position:position + moveBytes], typeCode)
+        position += moveBytes
+
+        times = None
+        if flags & HASTIMES:
+            times = fromLittleEndian(view[position:position + 4 * numMoves], "I")
+
+        record = GameRecord(width, height, (nameA, nameB), SIDES[firstTurn], startTime,
+                            bool(flags & FINISHED), moves, times)
+        return record, end
+
+def readGames(path):
+    # Yield every game in an archive
+    with GameArchive(path) as archive:
+        for record in archive:
+            yield record
+
+def main():
+    # Replay every game in an archive and report how fast that went
+    if len(sys.argv) != 2:
+        print("Usage: python gamerecord.py ARCHIVE")
+        sys.exit(2)
+    path = sys.argv[1]
+    games = moves = finished = 0
+    startTime = time.time()
+    for record in readGames(path):
+        board = record.replay()
+        games += 1
+        moves += len(record)
+        finished += board.isGameOver()
+    seconds = time.time() - startTime
+    print("%d games (%d finished), %d moves, %d bytes" % (games, finished, moves,
+                                                          os.path.getsize(path)))
+    print("Replayed at %.0f moves/second" % (moves / seconds if seconds else 0.0))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+# Dots and Boxes game server
+#
+# A headless asyncio server that hosts many matches at once, each one a
+# BoardState in memory. Clients connect over TCP or a Unix socket and talk in
+# lines of space separated words, one command per line:
+#
+#   NEW width height opponent [first]   start a match; opponent is one of the
+#                                       computer's DIFFICULTYLEVELS, or "none"
+#                                       for a client playing both sides; first
+#                                       is "player" (default) or "computer"
+#   MOVE id x1 y1 x2 y2                 fill in the line between two dots
+#   STATE id                            ask for the whole match
+#   QUIT id                             end a match
+#   STATS                               server counters
+#
+# and the server answers with:
+#
+#   GAME id width height turn
+#   MOVED id side x1 y1 x2 y2 turn playerScore computerScore [boxX,boxY ...]
+#   OVER id winner                      after the last move; winner may be "tie"
+#   STATE id width height turn playerScore computerScore lines
+#   CLOSED id
+#   STATS matches moves meanMoveMicroseconds
+#   ERROR id|- message
+#
+# A MOVED line is the change one move made: the line, who drew it, whose turn
+# is next, the scores and the top-left dot of every box it completed. The
+# client plays the "player" side, and the computer's moves arrive as MOVED lines
+# of their own once it has chosen them. STATE gives the filled lines as a hex
+# bitmask numbered as in boardstate.BoardGeometry. A match is closed as soon as
+# its OVER line is sent, so later commands for it get "no such match".
+#
+# Moves are checked the same way the game window checks clicks, with
+# dotsAdjacent() and isLineFilled(). The computer's moves are worked out in a
+# process pool so a long search never holds up the event loop; each worker
+# keeps one player per difficulty and replays the match's moves to get the board.
+# The players are closed when the server shuts down.
+#
+# Usage: python gameserver.py --port 8765
+#        python gameserver.py --unix /tmp/dotsandboxes.sock
+
+import argparse, asyncio, multiprocessing, multiprocessing.util, os, time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from engine import (createBoard, dotsAdjacent, isLineFilled, makeMove, isGameOver,
+                    getWinner, PLAYER, COMPUTER)
+from computerplayer import DIFFICULTYLEVELS, createComputerPlayer
+
+HOST = "127.0.0.1"
+PORT = 8765
+MAXBOARDSIZE = 100 # most boxes across or down, as in the game window
+NOOPPONENT = "none"
+SIDENAMES = {"player": PLAYER, "computer": COMPUTER}
+
+_PLAYERS = {} # computer players by difficulty, in executor processes
+
+def closeComputerPlayers():
+    # Close the players this process has made
+    for player in _PLAYERS.values():
+        player.close()
+    _PLAYERS.clear()
+
+def startExecutorProcess():
+    # ProcessPoolExecutor initializer: close the process's players when it exits
+    multiprocessing.util.Finalize(None, closeComputerPlayers, exitpriority=30)
+
+def chooseComputerMove(difficulty, width, height, firstTurn, lines):
+    # Run in the executor: replay a match's lines and pick the computer's move
+    player = _PLAYERS.get(difficulty)
+    if player is None:
+        player = _PLAYERS[difficulty] = createComputerPlayer(difficulty)
+    board = createBoard(width, height, firstTurn)
+    for line in lines:
+        board.makeMove(line)
+    return player.chooseMove(board)
+
+class Match(object):
+    # One game being played on the server
+    __slots__ = ("id", "board", "opponent", "connection", "thinking")
+
+    def __init__(self, matchId, board, opponent, connection):
+        self.id = matchId
+        self.board = board
+        self.opponent = opponent
+        self.connection = connection
+        self.thinking = False # a computer move is being worked out
+
+class Connection(object):
+    # A client and the matches it started
+    def __init__(self, writer):
+        self.writer = writer
+        self.matches = set()
+        self.closed = False
+
+    def send(self, lines):
+        if lines and not self.closed:
+            self.writer.write(("\n".join(lines) + "\n").encode("ascii"))
+
+class CommandError(Exception):
+    # A command that can't be carried out; sent back to the client as an ERROR
+    def __init__(self, matchId, message):
+        Exception.__init__(self, message)
+        self.matchId = matchId
+
+class GameServer(object):
+    # Hosts matches for any number of connections. executor runs the computer's
+    # moves; without one they are worked out on a single background thread, since
+    # the players chooseComputerMove() keeps can't be shared between threads.
+    def __init__(self, executor=None):
+        self.executor = executor or ThreadPoolExecutor(1)
+        self.matches = {}
+        self.nextId = 1
+        self.moves = 0
+        self.moveSeconds = 0.0
+        self.commands = {"NEW": self.newMatch, "MOVE": self.move, "STATE": self.state,
+                         "QUIT": self.quit, "STATS": self.stats}
+
+    def close(self):
+        # Stop working out computer moves and close the players doing it
+        self.executor.shutdown(cancel_futures=True)
+        closeComputerPlayers()
+
+    async def handleConnection(self, reader, writer):
+        connection = Connection(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                connection.send(self.handleLine(connection, line))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            connection.closed = True
+            for matchId in list(connection.matches):
+                self.closeMatch(self.matches[matchId])
+            writer.close()
+
+    def handleLine(self, connection, line):
+        # Carry out one command and return the lines to send back
+        words = line.decode("ascii", "replace").split()
+        if not words:
+            return []
+        command = self.commands.get(words[0].upper())
+        try:
+            if command is None:
+                raise CommandError(None, "unknown command %s" % words[0])
+            return command(connection, words[1:])
+        except CommandError as error:
+            return ["ERROR %s %s" % ("-" if error.matchId is None else error.matchId, error)]
+
+    def findMatch(self, connection, words):
+        try:
+            matchId = int(words[0])
+        except (IndexError, ValueError):
+            raise CommandError(None, "expected a match id")
+        match = self.matches.get(matchId)
+        if match is None or match.connection is not connection:
+            raise CommandError(matchId, "no such match")
+        return match
+
+    def newMatch(self, connection, words):
+        if len(words) not in (3, 4):
+            raise CommandError(None, "usage: NEW width height opponent [first]")
+        try:
+            width, height = int(words[0]), int(words[1])
+        except ValueError:
+            raise CommandError(None, "board size must be two numbers")
+        if not (1 <= width <= MAXBOARDSIZE and 1 <= height <= MAXBOARDSIZE):
+            raise CommandError(None, "board size must be 1 to %d" % MAXBOARDSIZE)
+        opponent = words[2]
+        if opponent != NOOPPONENT and opponent not in DIFFICULTYLEVELS:
+            raise CommandError(None, "unknown opponent %s" % opponent)
+        first = SIDENAMES.get(words[3] if len(words) == 4 else "player")
+        if first is None:
+            raise CommandError(None, "first must be player or computer")
+
+        match = Match(self.nextId, createBoard(width, height, first),
+                      None if opponent == NOOPPONENT else opponent, connection)
+        self.nextId += 1
+        self.matches[match.id] = match
+        connection.matches.add(match.id)
+        self.startComputerMove(match)
+        return ["GAME %d %d %d %s" % (match.id, width, height, first)]
+
+    def move(self, connection, words):
+        startTime = time.perf_counter()
+        match = self.findMatch(connection, words)
+        try:
+            x1, y1, x2, y2 = [int(word) for word in words[1:]]
+        except ValueError:
+            raise CommandError(match.id, "usage: MOVE id x1 y1 x2 y2")
+        board = match.board
+        if match.thinking or (match.opponent is not None and board.turn != PLAYER):
+            raise CommandError(match.id, "not your turn")
+        dot1, dot2 = (x1, y1), (x2, y2)
+        if not dotsAdjacent(dot1, dot2) or board.geometry.lineBetween(dot1, dot2) is None:
+            raise CommandError(match.id, "dots are not adjacent")
+        if isLineFilled(board, dot1, dot2):
+            raise CommandError(match.id, "line already filled")
+
+        makeMove(board, dot1, dot2)
+        response = self.moveDelta(match)
+        self.startComputerMove(match)
+        self.moves += 1
+        self.moveSeconds += time.perf_counter() - startTime
+        return response
+
+    def moveDelta(self, match):
+        # The MOVED line for the last move in a match, and OVER if it ended the game
+        board = match.board
+        geometry = board.geometry
+        line, completed, boxesFilled, turn = board.history[-1]
+        (x1, y1), (x2, y2) = geometry.linePoints[line]
+        words = ["MOVED", str(match.id), turn, str(x1), str(y1), str(x2), str(y2),
+                 board.turn, str(board.playerScore), str(board.computerScore)]
+        while completed:
+            lowBit = completed & -completed
+            words.append("%d,%d" % geometry.boxCoords(lowBit.bit_length() - 1))
+            completed ^= lowBit
+        lines = [" ".join(words)]
+        if isGameOver(board):
+            winner = getWinner(board)
+            lines.append("OVER %d %s" % (match.id, winner or "tie"))
+            self.closeMatch(match)
+        return lines
+
+    def state(self, connection, words):
+        match = self.findMatch(connection, words)
+        board = match.board
+        return ["STATE %d %d %d %s %d %d %x" % (match.id, board.width, board.height,
+                                                board.turn, board.playerScore,
+                                                board.computerScore, board.lines)]
+
+    def quit(self, connection, words):
+        match = self.findMatch(connection, words)
+        self.closeMatch(match)
+        return ["CLOSED %d" % match.id]
+
+    def closeMatch(self, match):
+        # Forget a match; a computer move still being worked out for it is dropped
+        del self.matches[match.id]
+        match.connection.matches.discard(match.id)
+
+    def stats(self, connection, words):
+        meanMove = 1e6 * self.moveSeconds / self.moves if self.moves else 0.0
+        return ["STATS %d %d %.1f" % (len(self.matches), self.moves, meanMove)]
+
+    def startComputerMove(self, match):
+        # Have the computer play its turn in the background if it is due one
+        board = match.board
+        if (match.opponent is not None and board.turn == COMPUTER and not match.thinking
+                and not isGameOver(board)):
+            match.thinking = True
+            asyncio.ensure_future(self.playComputer(match))
+
+    async def playComputer(self, match):
+        # Play the computer's moves until it is the client's turn or the game ends
+        loop = asyncio.get_event_loop()
+        board = match.board
+        try:
+            while board.turn == COMPUTER and not isGameOver(board):
+                firstTurn = board.history[0][3] if board.history else board.turn
+                lines = [entry[0] for entry in board.history]
+                line = await loop.run_in_executor(
+                    self.executor, chooseComputerMove, match.opponent, board.width,
+                    board.height, firstTurn, lines)
+                if self.matches.get(match.id) is not match:
+                    return # the match was closed while the computer was thinking
+                board.makeMove(line)
+                match.connection.send(self.moveDelta(match))
+        except Exception as error:
+            match.connection.send(["ERROR %d computer move failed: %s" % (match.id, error)])
+        finally:
+            match.thinking = False
+
+async def serve(server, host=HOST, port=PORT, unixPath=None):
+    # Accept connections until cancelled
+    if unixPath is not None:
+        listener = await asyncio.start_unix_server(server.handleConnection, unixPath)
+    else:
+        listener = await asyncio.start_server(server.handleConnection, host, port)
+    async with listener:
+        await listener.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Host Dots and Boxes matches over the network.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes for the computer's moves (default: one per core)")
+    args = parser.parse_args()
+
+    if args.unix is not None and os.path.exists(args.unix):
+        os.remove(args.unix)
+    executor = ProcessPoolExecutor(args.workers or multiprocessing.cpu_count(),
+                                   initializer=startExecutorProcess)
+    server = GameServer(executor)
+    try:
+        asyncio.run(serve(server, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    main()
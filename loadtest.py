@@ -0,0 +1,149 @@
+# Dots and Boxes game server load test
+#
+# Opens a number of connections to a running gameserver.py and plays many
+# matches at once over each of them, every move a random open line. Each client
+# keeps its own copy of every board and checks the server's MOVED lines
+# against it. At the end it prints how many matches and moves were played, the
+# round trip time of the client's moves and the server's own mean time spent
+# handling a move, and warns if the server still holds any of the finished
+# matches.
+#
+# Usage: python gameserver.py &
+#        python loadtest.py --connections 10 --matches 2000 --width 5 --height 5
+
+import argparse, asyncio, random, time
+
+from engine import createBoard, isGameOver, makeMove, PLAYER
+from gameserver import HOST, PORT, NOOPPONENT
+from frameprofiler import percentile
+
+class LoadTestClient(object):
+    # One connection playing several matches at once. Replies are passed to
+    # matches by id; GAME, STATS and errors without an id come back in the order
+    # their commands were sent.
+    def __init__(self, reader, writer, rand, stats):
+        self.reader = reader
+        self.writer = writer
+        self.rand = rand
+        self.stats = stats
+        self.newReplies = asyncio.Queue()
+        self.matchReplies = {}
+
+    async def readReplies(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            words = line.decode("ascii").split()
+            if words[0] == "GAME":
+                # The computer's first move can arrive before playMatch() runs again
+                self.matchReplies[int(words[1])] = asyncio.Queue()
+                self.newReplies.put_nowait(words)
+            elif words[0] == "STATS" or words[1] == "-":
+                self.newReplies.put_nowait(words)
+            else:
+                self.matchReplies[int(words[1])].put_nowait(words)
+
+    def send(self, line):
+        self.writer.write((line + "\n").encode("ascii"))
+
+    async def playMatch(self, width, height, opponent, first):
+        # Play one match to the end and check every move against a local board
+        self.send("NEW %d %d %s %s" % (width, height, opponent, first))
+        reply = await self.newReplies.get()
+        if reply[0] != "GAME":
+            raise RuntimeError(" ".join(reply))
+        matchId = int(reply[1])
+        replies = self.matchReplies[matchId]
+        board = createBoard(width, height, first)
+        stats = self.stats
+
+        while not isGameOver(board):
+            sentTime = None
+            if opponent == NOOPPONENT or board.turn == PLAYER:
+                line = self.rand.choice(list(board.openLines()))
+                (x1, y1), (x2, y2) = board.geometry.linePoints[line]
+                sentTime = time.perf_counter()
+                self.send("MOVE %d %d %d %d %d" % (matchId, x1, y1, x2, y2))
+            reply = await replies.get()
+            if sentTime is not None:
+                stats["roundTrips"].append(time.perf_counter() - sentTime)
+            if reply[0] != "MOVED":
+                raise RuntimeError(" ".join(reply))
+            x1, y1, x2, y2 = [int(word) for word in reply[3:7]]
+            makeMove(board, (x1, y1), (x2, y2))
+            if reply[7:10] != [board.turn, str(board.playerScore), str(board.computerScore)]:
+                stats["mismatches"] += 1
+            stats["moves"] += 1
+
+        reply = await replies.get()
+        if reply[0] != "OVER":
+            raise RuntimeError(" ".join(reply))
+        del self.matchReplies[matchId]
+        stats["matches"] += 1
+
+    async def serverStats(self):
+        self.send("STATS")
+        return await self.newReplies.get()
+
+async def runLoadTest(host, port, unixPath, connections, matches, width, height,
+                      opponent, seed):
+    # Play matches spread over connections and return the stats collected
+    stats = {"matches": 0, "moves": 0, "mismatches": 0, "roundTrips": []}
+    clients = []
+    for index in range(connections):
+        if unixPath is not None:
+            reader, writer = await asyncio.open_unix_connection(unixPath)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        clients.append(LoadTestClient(reader, writer, random.Random(seed + index), stats))
+    readers = [asyncio.ensure_future(client.readReplies()) for client in clients]
+
+    startTime = time.perf_counter()
+    games = []
+    for index in range(matches):
+        client = clients[index % connections]
+        games.append(client.playMatch(width, height, opponent,
+                                      "player" if index % 2 == 0 else "computer"))
+    await asyncio.gather(*games)
+    stats["seconds"] = time.perf_counter() - startTime
+    stats["server"] = await clients[0].serverStats()
+
+    for client in clients:
+        client.writer.close()
+    for task in readers:
+        task.cancel()
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test a Dots and Boxes game server.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--unix", metavar="PATH", help="connect to a Unix socket instead of TCP")
+    parser.add_argument("--connections", type=int, default=10)
+    parser.add_argument("--matches", type=int, default=1000, help="matches played at once")
+    parser.add_argument("--width", type=int, default=5)
+    parser.add_argument("--height", type=int, default=5)
+    parser.add_argument("--opponent", default=NOOPPONENT,
+                        help="computer difficulty, or none for the client to play both sides")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stats = asyncio.run(runLoadTest(args.host, args.port, args.unix, args.connections,
+                                    args.matches, args.width, args.height, args.opponent,
+                                    args.seed))
+    roundTrips = sorted(stats["roundTrips"])
+    seconds = stats["seconds"]
+    print("%d matches, %d moves in %.2f seconds (%.0f moves/second)" % (
+        stats["matches"], stats["moves"], seconds, stats["moves"] / seconds))
+    if roundTrips:
+        print("Round trip: median %.2f ms, 99th percentile %.2f ms" % (
+            1000 * percentile(roundTrips, 50), 1000 * percentile(roundTrips, 99)))
+    print("Server time per move: %s microseconds" % stats["server"][3])
+    if stats["server"][1] != "0":
+        print("The server still holds %s matches after every game ended" % stats["server"][1])
+    if stats["mismatches"]:
+        print("%d moves didn't match the local boards" % stats["mismatches"])
+
+if __name__ == "__main__":
+    main()
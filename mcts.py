@@ -0,0 +1,433 @@
+# Dots and Boxes Monte Carlo tree search player
+#
+# On big boards the alpha-beta search can't see far enough to reach the chains
+# and loops that decide the game. This player grows a UCT tree instead and
+# judges each leaf by playing it out: boxes on offer are taken, random safe
+# lines are drawn until there are none left, and the chains and loops that are
+# left are scored by opening them from the smallest up. Each leaf is played out
+# PLAYOUTBATCH times and the results are backed up together, which keeps the
+# cost of walking the tree down on boards with hundreds of lines.
+#
+# The tree only covers the part of the game with safe lines left. Once they
+# are gone the playouts' scoring of the chains is only an estimate, so the
+# endgame is handed to endgamePlayer (the alpha-beta search) when there is one.
+#
+# The tree lives in preallocated arrays, one entry per node, with the children
+# of a node in one contiguous block. Its size is capped by treeBytes; once the
+# arrays are full the tree stops growing and leaves are only played out. After
+# a move the part of the tree below the new position is kept and moved to the
+# front of the arrays, so the next search starts from what was learned.
+
+import math, random, time
+from array import array
+
+from boardstate import PLAYER, SAFE, FILLED
+from chains import EndgameSolver, CHAIN, LOOP, openingValue, scoreMargin
+
+TIMELIMIT = 1.0
+TREEBYTES = 32 * 1024 * 1024
+PLAYOUTBATCH = 4 # playouts run from each leaf reached
+EXPLORATION = 1.0 # UCT exploration constant
+PLAYOUTORDERS = 64 # random orders of the lines kept for the playouts to pick from
+NOCHILDREN = -1
+EDGE = -1 # no box on the other side of a line
+
+# Array type codes of the node fields: move into the node, first child, number
+# of children, children tried so far, visits and wins for the side that moved
+NODEFIELDS = (("moves", "i"), ("firstChild", "i"), ("childCount", "H"), ("tried", "H"),
+              ("visits", "I"), ("wins", "d"))
+NODEBYTES = sum(array(typeCode).itemsize for name, typeCode in NODEFIELDS) + 1 # + playerMoved
+
+def playOut(board, order):
+    # Estimated boxes the side to move will take from the rest of the game minus
+    # those the other side will take. Boxes on offer are taken, then safe lines
+    # are drawn by both sides in the order given until none are left, then the
+    # chains and loops are valued by openingChains(). The board isn't changed.
+    #
+    # If boxes were taken and no safe lines were left after them, the side that
+    # took them may do better handing the last two back so the other side has to
+    # open the next chain, and is scored whichever way is better for it.
+    geometry = board.geometry
+    boxLines = geometry.boxLines
+    lineBoxes = geometry.lineBoxes
+    sideCounts = bytearray(board.sideCounts)
+    lineClass = bytearray(board.lineClass) # drawn lines are marked FILLED as they go
+    net = 0
+    sign = 1 # 1 while the side to move at the start is to move
+    safeMoves = 0
+
+    # Take every box on offer; taking a box may offer the next one in its chain
+    offered = [box for line in board.captureLines for box in lineBoxes[line]
+               if sideCounts[box] == 3]
+    while offered:
+        box = offered.pop()
+        if sideCounts[box] != 3:
+            continue
+        for line in boxLines[box]:
+            if lineClass[line] != FILLED:
+                break
+        lineClass[line] = FILLED
+        for box in lineBoxes[line]:
+            sideCounts[box] += 1
+            if sideCounts[box] == 4:
+                net += 1
+            elif sideCounts[box] == 3:
+                offered.append(box)
+
+    # Safe lines. A line that isn't safe never becomes safe again, so one pass over
+    # the lines that were safe at the start plays until none are left.
+    for line in order:
+        if lineClass[line] != SAFE:
+            continue
+        boxes = lineBoxes[line]
+        if sideCounts[boxes[0]] >= 2 or len(boxes) == 2 and sideCounts[boxes[1]] >= 2:
+            continue
+        lineClass[line] = FILLED
+        for box in boxes:
+            sideCounts[box] += 1
+        sign = -sign
+        safeMoves += 1
+
+    value = openingChains(geometry, sideCounts, lineClass)
+    if net >= 3 and not safeMoves:
+        return max(net + value, net - 4 - value)
+    return net + sign * value
+
+_NEIGHBOURS = {}
+
+def getNeighbours(geometry):
+    # For every box, (line, box on the other side of it or EDGE) for each of its sides
+    neighbours = _NEIGHBOURS.get(geometry)
+    if neighbours is None:
+        neighbours = []
+        for box, lines in enumerate(geometry.boxLines):
+            sides = []
+            for line in lines:
+                boxes = geometry.lineBoxes[line]
+                if len(boxes) == 1:
+                    sides.append((line, EDGE))
+                else:
+                    sides.append((line, boxes[0] if boxes[1] == box else boxes[1]))
+            neighbours.append(tuple(sides))
+        _NEIGHBOURS[geometry] = neighbours
+    return neighbours
+
+def openingChains(geometry, sideCounts, lineClass):
+    # Value for the side to move of a position with no safe lines or boxes on offer.
+    # The open boxes with two sides drawn make up chains and loops, which meet at
+    # junction boxes with three or four sides open. Once all but two of a
+    # junction's arms have been taken it joins the last two into one chain, so
+    # each junction is merged with its two longest arms and the rest are left on
+    # their own. The pieces are then opened short chains first, then loops, then
+    # long chains, each by size.
+    neighbours = getNeighbours(geometry)
+    pieceOf = [-1] * geometry.numBoxes
+    sizes = []
+    isLoop = []
+    junctions = []
+    for start in range(geometry.numBoxes):
+        if sideCounts[start] == 4 or pieceOf[start] >= 0:
+            continue
+        if sideCounts[start] < 2:
+            junctions.append(start)
+            continue
+        piece = len(sizes)
+        pieceOf[start] = piece
+        stack = [start]
+        size = ends = 0
+        while stack:
+            box = stack.pop()
+            size += 1
+            for line, other in neighbours[box]:
+                if lineClass[line] == FILLED:
+                    continue
+                if other == EDGE or sideCounts[other] < 2:
+                    ends += 1
+                elif pieceOf[other] < 0:
+                    pieceOf[other] = piece
+                    stack.append(other)
+        sizes.append(size)
+        isLoop.append(not ends)
+
+    parents = list(range(len(sizes) + len(junctions)))
+    def find(piece):
+        while parents[piece] != piece:
+            parents[piece] = parents[parents[piece]]
+            piece = parents[piece]
+        return piece
+
+    for box in junctions:
+        piece = len(sizes)
+        sizes.append(1)
+        isLoop.append(False)
+        arms = []
+        for line, other in neighbours[box]:
+            if lineClass[line] != FILLED and other != EDGE and sideCounts[other] == 2:
+                arms.append((sizes[pieceOf[other]], pieceOf[other]))
+        arms.sort(reverse=True)
+        for size, arm in arms[:2]:
+            root = find(arm)
+            if root == piece:
+                isLoop[piece] = True # both arms are the same chain: a loop through the junction
+                continue
+            parents[root] = piece
+            sizes[piece] += sizes[root]
+
+    components = []
+    for piece, size in enumerate(sizes):
+        if find(piece) != piece:
+            continue
+        if isLoop[piece]:
+            components.append((1, size, LOOP))
+        else:
+            components.append((0 if size <= 2 else 2, size, CHAIN))
+
+    components.sort()
+    value = 0
+    for order, size, kind in reversed(components):
+        value = openingValue(kind, size, value)
+    return value
+
+def winValue(margin):
+    # 1 for a win by margin boxes, 0.5 for a draw and 0 for a loss
+    if margin > 0:
+        return 1.0
+    return 0.5 if margin == 0 else 0.0
+
+class MCTSPlayer(object):
+    # Picks moves with a UCT search for timeLimit seconds. Positions in the
+    # solutions database, if one is given, are looked up instead. Positions with
+    # no safe lines go to endgamePlayer if there is one; otherwise those made of
+    # plain chains and loops are solved directly. playoutsPerSecond holds the
+    # rate of the last search.
+    def __init__(self, timeLimit=TIMELIMIT, treeBytes=TREEBYTES, rand=None, solutions=None,
+                 playoutBatch=PLAYOUTBATCH, endgamePlayer=None):
+        self.timeLimit = timeLimit
+        self.rand = rand if rand is not None else random.Random()
+        self.solutions = solutions
+        self.endgamePlayer = endgamePlayer
+        self.playoutBatch = playoutBatch
+        self.capacity = max(2, treeBytes // NODEBYTES)
+        for name, typeCode in NODEFIELDS:
+            setattr(self, name, array(typeCode, [0]) * self.capacity)
+        self.playerMoved = bytearray(self.capacity)
+        self.numNodes = 0
+        self.rootGeometry = None
+        self.rootHistory = None
+        self.lineOrders = {}
+        self.stopRequested = False
+        self.playouts = 0
+        self.playoutsPerSecond = 0.0
+
+    def stop(self):
+        # Ask a running search to return its best move so far; safe from another thread
+        self.stopRequested = True
+        if self.endgamePlayer is not None:
+            self.endgamePlayer.stop()
+
+    def close(self):
+        if self.endgamePlayer is not None:
+            self.endgamePlayer.close()
+
+    def chooseMove(self, board):
+        # Return the line to play for the side to move
+        if self.solutions is not None:
+            best = self.solutions.bestMove(board)
+            if best is not None:
+                return best[1]
+        if not board.safeLines:
+            if self.endgamePlayer is not None:
+                return self.endgamePlayer.chooseMove(board)
+            solver = EndgameSolver(board)
+            if solver.analyzer.isSimple():
+                return solver.solve()[1]
+        return self.search(board, self.timeLimit)
+
+    def search(self, board, timeLimit):
+        # Grow the tree from board for timeLimit seconds and return the root's most
+        # visited move
+        self.moveRoot(board)
+        if self.firstChild[0] == NOCHILDREN and not self.expand(0, board):
+            self.clearTree()
+            if not self.expand(0, board):
+                raise ValueError("a tree of %d nodes is too small for this board" % self.capacity)
+        if self.childCount[0] == 1:
+            return self.moves[self.firstChild[0]]
+        deadline = time.time() + timeLimit
+        startTime = time.time()
+        self.playouts = 0
+        try:
+            while not self.stopRequested:
+                self.iterate(board)
+                if time.time() > deadline:
+                    break
+        finally:
+            self.stopRequested = False
+        seconds = time.time() - startTime
+        self.playoutsPerSecond = self.playouts / seconds if seconds else 0.0
+
+        first = self.firstChild[0]
+        best = max(range(first, first + self.childCount[0]), key=self.visits.__getitem__)
+        return self.moves[best]
+
+    def iterate(self, board):
+        # Walk down the tree to a leaf, expanding the last node passed through,
+        # play the leaf out and back the results up the path
+        firstChild = self.firstChild
+        childCount = self.childCount
+        tried = self.tried
+        visits = self.visits
+        wins = self.wins
+        moves = self.moves
+        node = 0
+        path = [0]
+        while board.linesLeft:
+            if firstChild[node] == NOCHILDREN and not self.expand(node, board):
+                break
+            first = firstChild[node]
+            count = childCount[node]
+            if tried[node] < count:
+                # Try every child once before comparing them
+                child = first + tried[node]
+                tried[node] += 1
+                board.makeMove(moves[child])
+                path.append(child)
+                break
+            scale = EXPLORATION * math.sqrt(math.log(visits[node]))
+            bestScore = -1.0
+            for child in range(first, first + count):
+                childVisits = visits[child]
+                score = wins[child] / childVisits + scale / math.sqrt(childVisits)
+                if score > bestScore:
+                    bestScore, node = score, child
+            board.makeMove(moves[node])
+            path.append(node)
+
+        # Wins for PLAYER over the batch of playouts
+        batch = self.playoutBatch
+        playerSign = 1 if board.turn == PLAYER else -1
+        margin = playerSign * scoreMargin(board)
+        if board.linesLeft:
+            playerWins = 0.0
+            orders = self.getLineOrders(board.geometry)
+            rand = self.rand
+            for playout in range(batch):
+                # One of the stored orders, started at a random line
+                order = orders[rand.randrange(PLAYOUTORDERS)]
+                start = rand.randrange(len(order))
+                order = order[start:] + order[:start]
+                playerWins += winValue(margin + playerSign * playOut(board, order))
+        else:
+            playerWins = batch * winValue(margin)
+        self.playouts += batch
+
+        playerMoved = self.playerMoved
+        for node in path:
+            visits[node] += batch
+            wins[node] += playerWins if playerMoved[node] else batch - playerWins
+        for node in range(len(path) - 1):
+            board.unmakeMove()
+
+    def getLineOrders(self, geometry):
+        # PLAYOUTORDERS shuffled lists of a board's lines, made on first use
+        orders = self.lineOrders.get(geometry)
+        if orders is None:
+            orders = []
+            for index in range(PLAYOUTORDERS):
+                order = list(range(geometry.numLines))
+                self.rand.shuffle(order)
+                orders.append(order)
+            self.lineOrders[geometry] = orders
+        return orders
+
+    def expand(self, node, board):
+        # Give a node one child per line worth trying: boxes on offer and safe lines.
+        # Once no safe lines are left the playouts value the chains and loops
+        # directly, so only the root gets children then, one per open line. Returns
+        # False if the node stays a leaf.
+        if board.safeLines:
+            lines = list(board.captureLines) + list(board.safeLines)
+        elif node == 0:
+            lines = list(board.openLines())
+        else:
+            return False
+        first = self.numNodes
+        if first + len(lines) > self.capacity:
+            return False
+        self.rand.shuffle(lines)
+        playerMoved = board.turn == PLAYER
+        for child, line in enumerate(lines, first):
+            self.initNode(child, line, playerMoved)
+        self.firstChild[node] = first
+        self.childCount[node] = len(lines)
+        self.numNodes = first + len(lines)
+        return True
+
+    def initNode(self, node, line, playerMoved):
+        self.moves[node] = line
+        self.firstChild[node] = NOCHILDREN
+        self.childCount[node] = 0
+        self.tried[node] = 0
+        self.visits[node] = 0
+        self.wins[node] = 0.0
+        self.playerMoved[node] = playerMoved
+
+    def moveRoot(self, board):
+        # Make the root of the tree the node for board: follow the moves played
+        # since the last search if the tree has them, otherwise start a new tree
+        history = [entry[0] for entry in board.history]
+        node = 0
+        if (self.rootGeometry is board.geometry
+                and history[:len(self.rootHistory)] == self.rootHistory):
+            for line in history[len(self.rootHistory):]:
+                node = self.findChild(node, line)
+                if node is None:
+                    break
+        else:
+            node = None
+        self.rootGeometry = board.geometry
+        self.rootHistory = history
+
+        if node is None:
+            self.clearTree()
+        elif node:
+            self.compact(node)
+
+    def clearTree(self):
+        self.numNodes = 1
+        self.initNode(0, -1, False)
+
+    def findChild(self, node, line):
+        first = self.firstChild[node]
+        if first == NOCHILDREN:
+            return None
+        for child in range(first, first + self.childCount[node]):
+            if self.moves[child] == line:
+                return child
+        return None
+
+    def compact(self, root):
+        # Move the subtree under root to the front of the arrays, in breadth-first
+        # order so every block of children stays together, and drop everything else
+        firstChild = self.firstChild
+        childCount = self.childCount
+        order = [root]
+        newFirstChild = []
+        index = 0
+        while index < len(order):
+            node = order[index]
+            first = firstChild[node]
+            if first == NOCHILDREN:
+                newFirstChild.append(NOCHILDREN)
+            else:
+                newFirstChild.append(len(order))
+                order.extend(range(first, first + childCount[node]))
+            index += 1
+
+        size = len(order)
+        for name, typeCode in NODEFIELDS:
+            values = getattr(self, name)
+            values[:size] = array(typeCode, [values[node] for node in order])
+        self.playerMoved[:size] = bytes(self.playerMoved[node] for node in order)
+        firstChild[:size] = array("i", newFirstChild)
+        self.numNodes = size
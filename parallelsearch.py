@@ -0,0 +1,259 @@
+# Dots and Boxes parallel search
+#
+# Lazy SMP: every core searches the same position at once, and they share one
+# transposition table, so each process mostly finds positions another has
+# already searched and the deepest search finishes sooner than one process could
+# manage alone. The main process runs the usual iterative deepening; helper
+# processes in a pool search alongside it, half of them starting a ply deeper so
+# they don't all follow the same path, until the main search finishes and raises
+# the table's stop flag. The move comes from whichever process completed the
+# deepest search, the main one winning ties.
+#
+# The table lives in a multiprocessing.shared_memory block as 16 byte entries:
+# the position's hash XORed with a packed word of depth, flag, value, move and
+# generation, then the packed word itself. Entries are written without locks; a
+# read that sees half of one process's write and half of another's fails the
+# XOR check and is treated as a miss.
+#
+# With one core, or inside a process that can't start its own workers (such as
+# a tournament worker), the player searches on its own like ComputerPlayer.
+#
+# The helpers are started with the "forkserver" method ("spawn" where there is
+# none), never by forking, since the first search usually runs on the game
+# window's ComputerMoveThread while pygame is running. Like any script using
+# those methods, one that makes a player must keep its own code under
+# if __name__ == "__main__", as the helpers import it. Whoever makes the player
+# should close() it when done with it; helpers still running when the process
+# exits are stopped then, and their table freed.
+
+import multiprocessing, multiprocessing.util, struct, time
+
+try:
+    from multiprocessing import shared_memory
+except ImportError: # before Python 3.8
+    shared_memory = None
+
+from engine import boardFromLines
+from computerplayer import (ComputerPlayer, SearchTimeout, SEARCHDEPTH, TABLEBYTES,
+                            INFINITY)
+from solutiondb import loadSolutionDatabase
+
+HEADER = struct.Struct("<IB") # generation, stop flag
+HEADERBYTES = 16
+STOPOFFSET = 4 # byte offset of the stop flag
+ENTRY = struct.Struct("<QQ") # hash ^ data, data
+ENTRYBYTES = ENTRY.size
+
+# Fields of an entry's data word, lowest bits first
+DEPTHBITS = 20
+FLAGSHIFT = DEPTHBITS
+VALUESHIFT = FLAGSHIFT + 2
+VALUEOFFSET = 1 << 15 # values are stored as 16 bit unsigned numbers
+MOVESHIFT = VALUESHIFT + 16
+NOMOVE = 0xffff
+GENERATIONSHIFT = MOVESHIFT + 16
+GENERATIONMASK = (1 << 9) - 1
+VALIDBIT = 1 << 63 # an empty slot is all zeros, which would otherwise match hash 0
+
+class SharedTranspositionTable(object):
+    # A TranspositionTable kept in shared memory so several processes can use it.
+    # The process that creates it owns it: only the owner starts new generations,
+    # and it unlinks the memory on close(). Others attach to it by name.
+    def __init__(self, maxBytes=TABLEBYTES, policy="depth", name=None):
+        if policy not in ("depth", "always"):
+            raise ValueError("unknown replacement policy %r" % (policy,))
+        self.owner = name is None
+        if self.owner:
+            size = max(1, (maxBytes - HEADERBYTES) // ENTRYBYTES)
+            self.memory = shared_memory.SharedMemory(
+                create=True, size=HEADERBYTES + size * ENTRYBYTES)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.buffer = self.memory.buf
+        self.size = (self.memory.size - HEADERBYTES) // ENTRYBYTES
+        self.policy = policy
+        self.generation = 0
+        self.hits = 0
+        self.stores = 0
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def close(self):
+        self.buffer = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    def newSearch(self):
+        # Start a new generation so entries from earlier searches can be replaced.
+        # Helpers pick up the owner's generation rather than starting their own.
+        generation, stop = HEADER.unpack_from(self.buffer, 0)
+        if self.owner:
+            generation += 1
+            HEADER.pack_into(self.buffer, 0, generation, stop)
+        self.generation = generation & GENERATIONMASK
+
+    def clear(self):
+        self.buffer[:] = bytes(len(self.buffer))
+        self.generation = 0
+
+    def setStopped(self, stopped):
+        self.buffer[STOPOFFSET] = 1 if stopped else 0
+
+    def isStopped(self):
+        return self.buffer[STOPOFFSET] != 0
+
+    def probe(self, hashKey):
+        # Return (depth, flag, value, move) stored for a position, or None
+        check, data = ENTRY.unpack_from(self.buffer, HEADERBYTES + hashKey % self.size * ENTRYBYTES)
+        if check ^ data != hashKey or not data & VALIDBIT:
+            return None
+        self.hits += 1
+        move = data >> MOVESHIFT & 0xffff
+        return (data & ((1 << DEPTHBITS) - 1), data >> FLAGSHIFT & 3,
+                (data >> VALUESHIFT & 0xffff) - VALUEOFFSET, None if move == NOMOVE else move)
+
+    def store(self, hashKey, depth, flag, value, move):
+        # Save a search result, subject to the replacement policy
+        offset = HEADERBYTES + hashKey % self.size * ENTRYBYTES
+        if self.policy == "depth":
+            check, data = ENTRY.unpack_from(self.buffer, offset)
+            if (data & VALIDBIT and check ^ data != hashKey
+                    and depth < data & ((1 << DEPTHBITS) - 1)
+                    and data >> GENERATIONSHIFT & GENERATIONMASK == self.generation):
+                return
+        data = (VALIDBIT | depth | flag << FLAGSHIFT | (value + VALUEOFFSET) << VALUESHIFT
+                | (NOMOVE if move is None else move) << MOVESHIFT
+                | self.generation << GENERATIONSHIFT)
+        ENTRY.pack_into(self.buffer, offset, hashKey ^ data, data)
+        self.stores += 1
+
+class HelperPlayer(ComputerPlayer):
+    # The search run by each helper process. It stops when the main process
+    # raises the shared table's stop flag rather than when asked directly.
+    @property
+    def stopRequested(self):
+        return self.table.isStopped()
+
+    @stopRequested.setter
+    def stopRequested(self, value):
+        pass # only the main process stops the helpers
+
+_HELPER = None # this process's HelperPlayer, in pool workers
+
+def startHelper(tableName, policy, symmetric, useSolutions):
+    # Pool initializer: attach to the main process's table
+    global _HELPER
+    solutions = loadSolutionDatabase() if useSolutions else None
+    _HELPER = HelperPlayer(solutions=solutions, symmetric=symmetric, tableBytes=0)
+    _HELPER.table = SharedTranspositionTable(policy=policy, name=tableName)
+
+def helperSearch(task):
+    # Search a position alongside the main process and return (completed depth,
+    # best line, value) from the deepest search this helper finished, and the
+    # number of nodes it searched
+    width, height, lines, depth, timeLimit, helperIndex = task
+    board = boardFromLines(width, height, lines)
+
+    helper = _HELPER
+    helper.depth = depth
+    helper.nodes = 0
+    if timeLimit is not None:
+        helper.deadline = time.time() + timeLimit
+    completedDepth, bestMove, bestValue = 0, None, None
+    try:
+        for searchDepth in range(1 + helperIndex % 2, helper.maxDepth(board) + 1):
+            bestMove, bestValue = helper.searchRoot(board, searchDepth)
+            completedDepth = searchDepth
+    except SearchTimeout:
+        pass
+    finally:
+        helper.deadline = INFINITY
+    return completedDepth, bestMove, bestValue, helper.nodes
+
+def closeHelpers(pool, table):
+    # Stop a player's helper processes and free its shared table
+    pool.terminate()
+    pool.join()
+    table.close()
+
+def helperContext():
+    # The multiprocessing context helpers are started in
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+def usableWorkers(workers):
+    # How many processes a parallel search can actually use
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if shared_memory is None or multiprocessing.current_process().daemon:
+        return 1 # daemonic pool workers can't start processes of their own
+    return max(1, workers)
+
+class ParallelComputerPlayer(ComputerPlayer):
+    # A ComputerPlayer that searches with workers processes, one per core by
+    # default. The helpers are started by the first search; close() stops them
+    # and frees the shared table, and the player can be used as a context manager
+    # that closes it on the way out.
+    def __init__(self, depth=SEARCHDEPTH, timeLimit=None, tableBytes=TABLEBYTES,
+                 policy="depth", solutions=None, symmetric=True, workers=None):
+        self.workers = usableWorkers(workers)
+        self.pool = None
+        self.closer = None
+        ComputerPlayer.__init__(self, depth, timeLimit,
+                                tableBytes if self.workers == 1 else 0, policy,
+                                solutions, symmetric)
+        self.tableBytes = tableBytes
+        self.helperNodes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        self.close()
+
+    def startHelpers(self):
+        self.table = SharedTranspositionTable(self.tableBytes, self.table.policy)
+        self.pool = helperContext().Pool(
+            self.workers - 1, startHelper,
+            (self.table.name, self.table.policy, self.symmetric, self.solutions is not None))
+        # Runs on close(), when the player is garbage collected or at exit,
+        # whichever comes first; before the pool's own exit handler
+        self.closer = multiprocessing.util.Finalize(
+            self, closeHelpers, (self.pool, self.table), exitpriority=20)
+
+    def close(self):
+        if self.closer is not None:
+            self.closer()
+            self.closer = None
+            self.pool = None
+
+    def iterativeDeepening(self, board, timeLimit):
+        # Search with the helpers and return (best line, value) from the deepest
+        # search any process finished
+        if self.workers == 1:
+            return ComputerPlayer.iterativeDeepening(self, board, timeLimit)
+        if self.pool is None:
+            self.startHelpers()
+
+        task = (board.geometry.width, board.geometry.height, board.lines, self.depth, timeLimit)
+        self.table.setStopped(False)
+        results = [self.pool.apply_async(helperSearch, (task + (helperIndex,),))
+                   for helperIndex in range(1, self.workers)]
+        try:
+            bestMove, bestValue = ComputerPlayer.iterativeDeepening(self, board, timeLimit)
+        finally:
+            self.table.setStopped(True)
+            helperResults = [result.get() for result in results]
+
+        bestDepth = self.completedDepth
+        self.helperNodes = 0
+        for completedDepth, move, value, nodes in helperResults:
+            self.helperNodes += nodes
+            if completedDepth > bestDepth and move is not None:
+                bestDepth, bestMove, bestValue = completedDepth, move, value
+        self.completedDepth = bestDepth
+        return bestMove, bestValue
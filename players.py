@@ -0,0 +1,80 @@
+# Dots and Boxes players
+#
+# Every kind of player the game can be played by, other than a person clicking.
+# A player is any object with a chooseMove(board) method that returns the index
+# of an open line for the side to move, and a close() method to call once it
+# has finished playing.
+
+import random
+
+from computerplayer import ComputerPlayer, DIFFICULTYLEVELS, createComputerPlayer, greedyMove
+
+class RandomPlayer(object):
+    # Plays any open line
+    def __init__(self, rand):
+        self.rand = rand
+
+    def chooseMove(self, board):
+        return self.rand.choice(sorted(board.openLines()))
+
+    def close(self):
+        pass
+
+class GreedyPlayer(object):
+    # Takes boxes when it can and otherwise avoids giving them away
+    def __init__(self, rand):
+        self.rand = rand
+
+    def chooseMove(self, board):
+        return greedyMove(board, self.rand)
+
+    def close(self):
+        pass
+
+class HeuristicPlayer(object):
+    # Plays the line evaluator.MoveEvaluator scores highest, picking at random
+    # between equal lines. Needs NumPy.
+    def __init__(self, rand, weights=None):
+        from evaluator import loadWeights
+        self.rand = rand
+        self.weights = weights or loadWeights()
+        self.evaluators = {}
+
+    def chooseMove(self, board):
+        from evaluator import MoveEvaluator
+        size = (board.width, board.height)
+        evaluator = self.evaluators.get(size)
+        if evaluator is None:
+            evaluator = self.evaluators[size] = MoveEvaluator(board.width, board.height,
+                                                              self.weights)
+        scores = evaluator.evaluate(board)
+        best = scores == scores.max()
+        return self.rand.choice([line for line in board.openLines() if best[line]])
+
+    def close(self):
+        pass
+
+def createPlayer(name, seed=None):
+    # Make a player from its name. Names are "random", "greedy", "heuristic", one of the
+    # DIFFICULTYLEVELS, or "depthN" for a search to a fixed depth N with no time
+    # limit. Only the time-limited difficulty levels can play differently when
+    # given the same seed.
+    rand = random.Random(seed)
+    if name == "random":
+        return RandomPlayer(rand)
+    elif name == "greedy":
+        return GreedyPlayer(rand)
+    elif name == "heuristic":
+        return HeuristicPlayer(rand)
+    elif name in DIFFICULTYLEVELS:
+        return createComputerPlayer(name, seed)
+    elif name.startswith("depth") and name[5:].isdigit():
+        return ComputerPlayer(int(name[5:]), None)
+    raise ValueError("unknown player %r" % (name,))
+
+PLAYERNAMES = ["random", "greedy", "heuristic"] + sorted(DIFFICULTYLEVELS) + ["depthN"]
+
+def isPlayerName(name):
+    # Whether createPlayer() knows a name, without making the player
+    return (name in ("random", "greedy", "heuristic") or name in DIFFICULTYLEVELS
+            or name.startswith("depth") and name[5:].isdigit())
@@ -0,0 +1,182 @@
+# Dots and Boxes solution database
+#
+# Exact values of every position on boards small enough to enumerate. A
+# position's value (boxes the side to move will take from the rest of the game
+# minus boxes the other side will take, with perfect play) depends only on
+# which lines are filled, so each board size gets one signed byte per set of
+# filled lines, indexed directly by the board's line bitmask.
+#
+# Only whole boards of up to MAXLINES lines are covered: 3x3, 4x2 and smaller.
+# The late endgames of bigger boards are not. The value of a few open lines
+# depends on how they join up the boxes around them, so a table of them would
+# have to be keyed by that graph rather than by a bitmask, and the search and
+# the chain solver in chains.py already finish those positions exactly (see
+# ENDGAMELINES in computerplayer.py).
+#
+# The tables are dense rather than sorted or hashed, and keyed by the raw
+# bitmask rather than the canonical one from symmetry.py. That costs up to 8
+# times the space of a canonical table (16 MB for 3x3 rather than about 2), but
+# a lookup is a single read with no probing and no canonicalLines() call.
+#
+# The file is a small directory of tables followed by the tables themselves:
+#
+#   DBHEADER    magic and number of tables
+#   DBENTRY     width, height, number of lines and byte offset of each table
+#   tables      2 ** numLines signed bytes each
+#
+# Opening the database memory-maps the file and reads the directory; a lookup
+# is one byte read from the map. Generating it needs NumPy and takes a while
+# for 3x3, so it is done offline:
+#
+# Usage: python solutiondb.py --max-lines 24 --output solutions.db
+
+import argparse, mmap, os, struct, time
+
+from boardstate import getGeometry
+
+DBMAGIC = b"DBXSOLV1"
+DBHEADER = struct.Struct("<8sI")
+DBENTRY = struct.Struct("<BBxxIQ")
+MAXLINES = 24 # 3x3 boards; each extra line doubles the table
+
+SOLUTIONFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "solutions.db")
+
+class SolutionDatabase(object):
+    # Looks positions up in a solution file
+    def __init__(self, path=SOLUTIONFILE):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, numTables = DBHEADER.unpack_from(self.data, 0)
+        if magic != DBMAGIC:
+            raise ValueError("%s is not a solution database" % path)
+        self.offsets = {}
+        for index in range(numTables):
+            width, height, numLines, offset = DBENTRY.unpack_from(
+                self.data, DBHEADER.size + index * DBENTRY.size)
+            self.offsets[(width, height)] = offset
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def hasBoard(self, width, height):
+        return (width, height) in self.offsets
+
+    def lookup(self, board):
+        # The exact value of a position for the side to move, or None if boards of
+        # its size aren't in the database
+        offset = self.offsets.get((board.geometry.width, board.geometry.height))
+        if offset is None:
+            return None
+        value = self.data[offset + board.lines]
+        return value - 256 if value > 127 else value
+
+    def bestMove(self, board):
+        # (value, line) of the best open line, or None if the board isn't covered
+        offset = self.offsets.get((board.geometry.width, board.geometry.height))
+        if offset is None or not board.linesLeft:
+            return None
+        data = self.data
+        best = None
+        for line in sorted(board.openLines()):
+            boxesFilled = board.makeMove(line)
+            value = data[offset + board.lines]
+            board.unmakeMove()
+            if value > 127:
+                value -= 256
+            value = boxesFilled + value if boxesFilled else -value
+            if best is None or value > best[0]:
+                best = (value, line)
+        return best
+
+_DATABASES = {}
+
+def loadSolutionDatabase(path=SOLUTIONFILE):
+    # The database in a file, opened once per process, or None if there's no file
+    if path not in _DATABASES:
+        _DATABASES[path] = SolutionDatabase(path) if os.path.exists(path) else None
+    return _DATABASES[path]
+
+def solveBoard(width, height):
+    # Values of every set of filled lines on a board, as a NumPy array of int8
+    # indexed by line bitmask. Sets of lines are solved from the most filled to the
+    # least, one popcount at a time, and every line is tried on a whole layer at once.
+    import numpy as np
+
+    geometry = getGeometry(width, height)
+    numLines = geometry.numLines
+    if numLines > MAXLINES:
+        raise ValueError("%dx%d has too many lines to enumerate" % (width, height))
+
+    masks = np.arange(1 << numLines, dtype=np.int32)
+    popcounts = np.zeros(masks.shape, dtype=np.int8)
+    for line in range(numLines):
+        popcounts += (masks >> line & 1).astype(np.int8)
+    del masks
+
+    # For each line, the masks of the other three sides of the boxes next to it
+    otherSides = []
+    for line in range(numLines):
+        otherSides.append([geometry.boxLinesMask[box] & ~(1 << line)
+                           for box in geometry.lineBoxes[line]])
+
+    values = np.zeros(1 << numLines, dtype=np.int8)
+    for popcount in range(numLines - 1, -1, -1):
+        layer = np.flatnonzero(popcounts == popcount)
+        best = np.full(layer.shape, -128, dtype=np.int8)
+        for line in range(numLines):
+            bit = 1 << line
+            isOpen = (layer & bit) == 0
+            positions = layer[isOpen]
+            completed = np.zeros(positions.shape, dtype=np.int8)
+            for sides in otherSides[line]:
+                completed += ((positions & sides) == sides).astype(np.int8)
+            childValues = values[positions | bit]
+            lineValues = np.where(completed > 0, completed + childValues, -childValues)
+            best[isOpen] = np.maximum(best[isOpen], lineValues)
+        values[layer] = best
+    return values
+
+def writeDatabase(path, sizes, log=None):
+    # Solve every board size in sizes and write them to a new solution file
+    tables = []
+    offset = DBHEADER.size + len(sizes) * DBENTRY.size
+    for width, height in sizes:
+        numLines = getGeometry(width, height).numLines
+        tables.append((width, height, numLines, offset))
+        offset += 1 << numLines
+
+    temporaryPath = path + ".tmp"
+    with open(temporaryPath, "wb") as dbFile:
+        dbFile.write(DBHEADER.pack(DBMAGIC, len(tables)))
+        for table in tables:
+            dbFile.write(DBENTRY.pack(*table))
+        for width, height, numLines, offset in tables:
+            startTime = time.time()
+            dbFile.write(solveBoard(width, height).tobytes())
+            if log is not None:
+                log("%dx%d: %d positions in %.1f seconds" % (width, height, 1 << numLines,
+                                                            time.time() - startTime))
+    os.replace(temporaryPath, path) # readers never see a half written file
+
+def boardSizes(maxLines):
+    # Every board size with at most maxLines lines
+    sizes = []
+    for width in range(1, maxLines):
+        for height in range(1, maxLines):
+            if width * (height + 1) + (width + 1) * height <= maxLines:
+                sizes.append((width, height))
+    return sizes
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the Dots and Boxes solution database.")
+    parser.add_argument("--max-lines", type=int, default=MAXLINES,
+                        help="solve every board size with at most this many lines")
+    parser.add_argument("--output", default=SOLUTIONFILE)
+    args = parser.parse_args()
+    if args.max_lines > MAXLINES:
+        parser.error("boards with more than %d lines are too big to enumerate" % MAXLINES)
+    writeDatabase(args.output, boardSizes(args.max_lines), print)
+
+if __name__ == "__main__":
+    main()
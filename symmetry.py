@@ -0,0 +1,135 @@
+# Dots and Boxes board symmetries
+#
+# Mirroring a board left to right or top to bottom, or turning it half way
+# round, gives a position with the same value, and square boards can also be
+# turned a quarter way round and reflected along their diagonals. Each symmetry
+# is kept as a permutation of the line indexes, so any position can be mapped
+# to one canonical member of its group of symmetric positions, and a move found
+# for the canonical position can be mapped back to the board it came from.
+#
+# BoardState keeps a Zobrist hash of every symmetric image of the position
+# packed into one integer (symmetryKey), so canonicalKey() only has to pick the
+# smallest of them. canonicalLines() does the same for a bare line bitmask by
+# permuting it eight lines at a time through lookup tables.
+#
+# Lines are numbered the same way as in boardstate.BoardGeometry; this module
+# doesn't import it so that BoardGeometry can build its tables from here.
+
+HASHBITS = 64
+HASHMASK = (1 << HASHBITS) - 1
+CHUNKBITS = 8 # lines permuted per table lookup in canonicalLines()
+
+def dotTransforms(width, height):
+    # (name, function) for every symmetry of a board's dots. The identity is first.
+    transforms = [
+        ("identity", lambda x, y: (x, y)),
+        ("mirror left to right", lambda x, y: (width - x, y)),
+        ("mirror top to bottom", lambda x, y: (x, height - y)),
+        ("rotate 180", lambda x, y: (width - x, height - y)),
+    ]
+    if width == height:
+        transforms += [
+            ("reflect in the main diagonal", lambda x, y: (y, x)),
+            ("reflect in the other diagonal", lambda x, y: (height - y, width - x)),
+            ("rotate 90", lambda x, y: (height - y, x)),
+            ("rotate 270", lambda x, y: (y, width - x)),
+        ]
+    return transforms
+
+def lineIndex(width, height, point1, point2):
+    # Index of the line between two adjacent dots
+    (x1, y1), (x2, y2) = point1, point2
+    if y1 == y2:
+        return y1 * width + min(x1, x2)
+    return width * (height + 1) + min(y1, y2) * (width + 1) + x1
+
+def linePermutations(width, height):
+    # For every symmetry, a list giving the line each line is mapped to
+    linePoints = []
+    for y in range(height + 1):
+        for x in range(width):
+            linePoints.append(((x, y), (x + 1, y)))
+    for y in range(height):
+        for x in range(width + 1):
+            linePoints.append(((x, y), (x, y + 1)))
+
+    permutations = []
+    for name, transform in dotTransforms(width, height):
+        permutations.append([lineIndex(width, height, transform(*point1), transform(*point2))
+                             for point1, point2 in linePoints])
+    return permutations
+
+def inversePermutation(permutation):
+    inverse = [0] * len(permutation)
+    for line, image in enumerate(permutation):
+        inverse[image] = line
+    return inverse
+
+def canonicalKey(board):
+    # (hash, symmetry) of the canonical image of a position: the smallest of the
+    # Zobrist hashes of its symmetric images, and the symmetry that gives it
+    key = board.symmetryKey
+    best = key & HASHMASK
+    bestSymmetry = 0
+    for symmetry in range(1, len(board.geometry.symmetryLines)):
+        key >>= HASHBITS
+        hashKey = key & HASHMASK
+        if hashKey < best:
+            best = hashKey
+            bestSymmetry = symmetry
+    return best, bestSymmetry
+
+def toCanonicalLine(geometry, symmetry, line):
+    # The line a line on the board becomes in the canonical image
+    return geometry.symmetryLines[symmetry][line]
+
+def fromCanonicalLine(geometry, symmetry, line):
+    # The line on the board that a line in the canonical image came from
+    return geometry.symmetryInverses[symmetry][line]
+
+_CHUNKTABLES = {}
+
+def chunkTables(geometry):
+    # For every symmetry and every CHUNKBITS lines, a table giving the permuted
+    # bitmask of each pattern of those lines. Built the first time a size is used.
+    size = (geometry.width, geometry.height)
+    tables = _CHUNKTABLES.get(size)
+    if tables is not None:
+        return tables
+
+    tables = []
+    numLines = geometry.numLines
+    for permutation in geometry.symmetryLines:
+        symmetryTables = []
+        for start in range(0, numLines, CHUNKBITS):
+            images = [1 << permutation[line]
+                      for line in range(start, min(start + CHUNKBITS, numLines))]
+            table = [0] * (1 << len(images))
+            for pattern in range(1, len(table)):
+                lowBit = pattern & -pattern
+                table[pattern] = table[pattern ^ lowBit] | images[lowBit.bit_length() - 1]
+            symmetryTables.append(table)
+        tables.append(symmetryTables)
+    _CHUNKTABLES[size] = tables
+    return tables
+
+def transformLines(geometry, symmetry, lines):
+    # A line bitmask mapped through one symmetry
+    chunkMask = (1 << CHUNKBITS) - 1
+    image = 0
+    for table in chunkTables(geometry)[symmetry]:
+        image |= table[lines & chunkMask]
+        lines >>= CHUNKBITS
+    return image
+
+def canonicalLines(geometry, lines):
+    # (bitmask, symmetry) of the smallest symmetric image of a line bitmask, for
+    # caches keyed by the lines themselves rather than a hash
+    best = lines
+    bestSymmetry = 0
+    for symmetry in range(1, len(geometry.symmetryLines)):
+        image = transformLines(geometry, symmetry, lines)
+        if image < best:
+            best = image
+            bestSymmetry = symmetry
+    return best, bestSymmetry
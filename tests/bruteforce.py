@@ -0,0 +1,31 @@
+# Plain negamax over BoardState, used by the tests as the known right answer
+
+from boardstate import BoardState
+
+def negamax(board, values=None):
+    # Boxes the side to move takes from the rest of the game minus the other
+    # side's, memoised in values by the filled lines
+    if values is None:
+        values = {}
+    if board.linesLeft == 0:
+        return 0
+    lines = board.lines
+    if lines in values:
+        return values[lines]
+    best = None
+    for line in list(board.openLines()):
+        boxesFilled = board.makeMove(line)
+        value = negamax(board, values)
+        board.unmakeMove()
+        value = boxesFilled + value if boxesFilled else -value
+        if best is None or value > best:
+            best = value
+    values[lines] = best
+    return best
+
+def randomPosition(rand, width, height, linesLeft, turn=None):
+    # A board with random lines played until linesLeft are open
+    board = BoardState(width, height, turn or rand.choice(("player", "computer")))
+    while board.linesLeft > linesLeft:
+        board.makeMove(rand.choice(list(board.openLines())))
+    return board
@@ -0,0 +1,89 @@
+# Tests for analysis.py: reading move lists, exact values on small boards, and
+# the same reports however the work is split up or resumed
+
+import json, random
+
+import pytest
+
+from analysis import readMoveLists, analyseGames, SIDES
+from boardstate import getGeometry
+from bruteforce import negamax
+from engine import boardFromLines
+
+def writeMoveLists(path, games):
+    # Write (width, height, first, lines) games as a file of JSON move lists
+    with open(path, "w") as moveFile:
+        for width, height, first, lines in games:
+            geometry = getGeometry(width, height)
+            moves = [[list(point) for point in geometry.linePoints[line]] for line in lines]
+            moveFile.write(json.dumps({"width": width, "height": height, "first": first,
+                                       "moves": moves}) + "\n")
+
+def randomGames(rand, count, width=2, height=2):
+    games = []
+    for game in range(count):
+        lines = list(range(getGeometry(width, height).numLines))
+        rand.shuffle(lines)
+        games.append((width, height, rand.choice(("player", "computer")), lines))
+    return games
+
+def readReports(path):
+    with open(path) as reportFile:
+        return [json.loads(text) for text in reportFile]
+
+def test_move_lists_are_read_and_checked(tmp_path):
+    path = str(tmp_path / "games.jsonl")
+    writeMoveLists(path, [(2, 1, "computer", [0, 3, 6])])
+    game, = readMoveLists(path)
+    assert (game.width, game.height, game.firstTurn, game.lines) == (2, 1, SIDES["computer"],
+                                                                     [0, 3, 6])
+
+    for moves in ([[[0, 0], [1, 0]], [[1, 0], [0, 0]]], [[[0, 0], [1, 1]]]):
+        with open(path, "w") as moveFile:
+            moveFile.write(json.dumps({"width": 2, "height": 1, "moves": moves}) + "\n")
+        with pytest.raises(ValueError):
+            list(readMoveLists(path))
+
+def test_full_depth_values_are_exact(tmp_path):
+    inputPath, outputPath = str(tmp_path / "games.jsonl"), str(tmp_path / "out.jsonl")
+    games = randomGames(random.Random(3), 3)
+    writeMoveLists(inputPath, games)
+    summary = analyseGames(inputPath, outputPath, depth=None, processes=1, useSolutions=False)
+    assert summary["games"] == 3 and summary["positions"] == 3 * 12
+
+    for (width, height, first, lines), report in zip(games, readReports(outputPath)):
+        geometry = getGeometry(width, height)
+        for moveIndex, entry in enumerate(report["moves"]):
+            board = boardFromLines(width, height, sum(1 << line for line in lines[:moveIndex]))
+            assert entry["bestValue"] == negamax(board)
+            assert geometry.lineBetween(*entry["best"]) is not None
+            assert entry["loss"] == entry["bestValue"] - entry["playedValue"] >= 0
+            assert (moveIndex in report["blunders"]) == (entry["loss"] >= 2)
+
+def test_reports_do_not_depend_on_processes_or_restarts(tmp_path):
+    inputPath = str(tmp_path / "games.jsonl")
+    games = randomGames(random.Random(5), 4)
+    writeMoveLists(inputPath, games + games[:2]) # repeats come from the cache
+    single, pooled, resumed = (str(tmp_path / name) for name in ("1.jsonl", "2.jsonl",
+                                                                 "3.jsonl"))
+    summary = analyseGames(inputPath, single, depth=2, processes=1, useSolutions=False)
+    assert summary["cacheHits"] >= 2 * 12 and summary["searched"] < summary["positions"]
+    analyseGames(inputPath, pooled, depth=2, processes=2, useSolutions=False)
+
+    class Crash(Exception):
+        pass
+    def crashAfterThree(summary):
+        if summary["games"] == 3:
+            raise Crash()
+    with pytest.raises(Crash):
+        analyseGames(inputPath, resumed, depth=2, processes=1, useSolutions=False,
+                     onProgress=crashAfterThree)
+    with open(resumed, "a") as output:
+        output.write('{"half a report') # written after the checkpoint
+    summary = analyseGames(inputPath, resumed, depth=2, processes=1, useSolutions=False)
+    assert summary["games"] == 6
+
+    reports = readReports(single)
+    assert [report["game"] for report in reports] == list(range(6))
+    assert readReports(pooled) == reports
+    assert readReports(resumed) == reports
@@ -0,0 +1,86 @@
+# Tests for batchsim.py: every board in a batch must play out exactly as the
+# engine's fillLine() and fillBoxes() would play the same moves
+
+import numpy as np
+import pytest
+
+from batchsim import BatchSimulator, PLAYERSIDE, COMPUTERSIDE, SIDENAMES
+from engine import createBoard, fillLine, fillBoxes, PLAYER, COMPUTER
+
+SIZES = [(1, 1), (2, 1), (3, 2), (4, 2), (3, 3), (5, 5)]
+BOARDS = 64
+
+def referenceGame(width, height, lines):
+    # Play a game's lines with the engine and return the board
+    board = createBoard(width, height)
+    turn = PLAYER
+    for line in lines:
+        point1, point2 = board.geometry.linePoints[line]
+        fillLine(board, point1, point2)
+        if not fillBoxes(board, turn):
+            turn = COMPUTER if turn == PLAYER else PLAYER
+    return board, turn
+
+def checkAgainstEngine(simulator, games):
+    geometry = simulator.geometry
+    for index, lines in enumerate(games):
+        board, turn = referenceGame(geometry.width, geometry.height, lines)
+        assert simulator.scores[index, PLAYERSIDE] == board.playerScore
+        assert simulator.scores[index, COMPUTERSIDE] == board.computerScore
+        assert SIDENAMES[simulator.turn[index]] == turn
+        assert simulator.done[index] == board.isGameOver()
+        for box in range(geometry.numBoxes):
+            x, y = geometry.boxCoords(box)
+            assert simulator.boxOwner(index, x, y) == board.boxOwner(x, y)
+
+def stepGames(simulator, chooseMoves, steps=None):
+    # Step the batch, returning the lines each board played
+    games = [[] for index in range(simulator.batchSize)]
+    while not simulator.done.all() and steps != 0:
+        moves = chooseMoves()
+        for index in np.flatnonzero(~simulator.done):
+            games[index].append(int(moves[index]))
+        simulator.step(moves)
+        if steps is not None:
+            steps -= 1
+    return games
+
+@pytest.mark.parametrize("width,height", SIZES)
+@pytest.mark.parametrize("policy", ["random", "greedy"])
+def test_stepped_games_match_the_engine(width, height, policy):
+    simulator = BatchSimulator(BOARDS, width, height, seed=width + height)
+    chooseMoves = {"random": simulator.randomMoves, "greedy": simulator.greedyMoves}[policy]
+    games = stepGames(simulator, chooseMoves)
+    assert simulator.done.all()
+    checkAgainstEngine(simulator, games)
+
+@pytest.mark.parametrize("width,height", SIZES)
+@pytest.mark.parametrize("stepsFirst", [0, 1, 4])
+def test_one_pass_playout_matches_stepping(width, height, stepsFirst):
+    stepped = BatchSimulator(BOARDS, width, height, seed=7)
+    onePass = BatchSimulator(BOARDS, width, height, seed=7)
+    games = stepGames(stepped, stepped.randomMoves, stepsFirst)
+    stepGames(onePass, onePass.randomMoves, stepsFirst)
+    numMoves = int((stepped.geometry.numLines - stepped.moveCount[~stepped.done]).sum())
+    games = [game + more for game, more in zip(games, stepGames(stepped, stepped.randomMoves))]
+
+    assert onePass.playOut("random") == numMoves
+    for name in ("lines", "sideCounts", "owners", "scores", "turn", "boxesLeft", "done",
+                 "moveCount"):
+        assert np.array_equal(getattr(onePass, name), getattr(stepped, name)), name
+    checkAgainstEngine(onePass, games)
+
+def test_playout_after_other_moves_steps():
+    simulator = BatchSimulator(BOARDS, 3, 3, seed=2)
+    stepGames(simulator, simulator.greedyMoves, 5)
+    assert not simulator.onlyRandomMoves()
+    moveCount = simulator.moveCount.copy()
+    totalMoves = simulator.playOut("random")
+    assert totalMoves == int((simulator.geometry.numLines - moveCount).sum())
+    assert simulator.done.all() and simulator.lines.all()
+
+def test_filled_line_is_rejected():
+    simulator = BatchSimulator(2, 2, 2, seed=0)
+    simulator.step([0, 1])
+    with pytest.raises(ValueError):
+        simulator.step([0, 2])
@@ -0,0 +1,92 @@
+# Tests for boardstate.py, checking the incrementally kept state against the
+# same thing worked out from scratch over random games on small boards
+
+import random
+
+import pytest
+
+from boardstate import (BoardState, PLAYER, COMPUTER, SAFE, UNSAFE, CAPTURE, FILLED)
+
+SIZES = [(1, 1), (2, 1), (2, 2), (3, 2), (4, 2), (3, 3)]
+
+def snapshot(board):
+    return (board.key(), board.lines, board.playerScore, board.computerScore,
+            board.linesLeft, bytes(board.sideCounts), bytes(board.lineClass),
+            board.hashKey, board.symmetryKey, set(board.safeLines),
+            set(board.unsafeLines), set(board.captureLines))
+
+def checkFromScratch(board):
+    geometry = board.geometry
+    filled = [line for line in range(geometry.numLines) if not board.isLineAvailable(line)]
+    assert board.lines == sum(1 << line for line in filled)
+    assert list(board.openLines()) == sorted(set(range(geometry.numLines)) - set(filled))
+    assert board.linesLeft == geometry.numLines - len(filled)
+
+    hashKey = 0
+    for line in filled:
+        hashKey ^= geometry.zobristKeys[line]
+    assert board.hashKey == hashKey
+
+    sideCounts = [sum(1 for line in lines if line in filled) for lines in geometry.boxLines]
+    assert list(board.sideCounts) == sideCounts
+    for line in range(geometry.numLines):
+        if line in filled:
+            expected = FILLED
+        else:
+            most = max(sideCounts[box] for box in geometry.lineBoxes[line])
+            expected = CAPTURE if most == 3 else UNSAFE if most == 2 else SAFE
+        assert board.lineClass[line] == expected
+        assert (line in board.safeLines) == (expected == SAFE)
+        assert (line in board.unsafeLines) == (expected == UNSAFE)
+        assert (line in board.captureLines) == (expected == CAPTURE)
+
+    owned = board.playerBoxes | board.computerBoxes
+    assert owned == sum(1 << box for box, count in enumerate(sideCounts) if count == 4)
+    assert bin(board.playerBoxes).count("1") == board.playerScore
+    assert bin(board.computerBoxes).count("1") == board.computerScore
+    assert board.isGameOver() == (owned == geometry.allBoxesMask)
+
+@pytest.mark.parametrize("width,height", SIZES)
+def test_make_and_unmake_match_a_fresh_count(width, height):
+    rand = random.Random(width * 10 + height)
+    for game in range(20):
+        board = BoardState(width, height, rand.choice((PLAYER, COMPUTER)))
+        snapshots = []
+        while not board.isGameOver():
+            snapshots.append(snapshot(board))
+            turn = board.turn
+            boxesFilled = board.makeMove(rand.choice(list(board.openLines())))
+            assert board.turn == (turn if boxesFilled else
+                                  COMPUTER if turn == PLAYER else PLAYER)
+            checkFromScratch(board)
+        assert board.linesLeft == 0
+        while snapshots:
+            board.unmakeMove()
+            assert snapshot(board) == snapshots.pop()
+
+def test_filled_line_is_rejected():
+    board = BoardState(2, 2)
+    board.makeMove(3)
+    with pytest.raises(ValueError):
+        board.makeMove(3)
+
+def test_copy_is_independent():
+    board = BoardState(3, 2)
+    board.makeMove(0)
+    copy = board.copy()
+    copy.makeMove(5)
+    assert board.lines == 1 and copy.lines == 1 | 1 << 5
+    copy.unmakeMove()
+    assert copy == board and hash(copy) == hash(board)
+
+def test_fill_line_and_boxes():
+    board = BoardState(1, 1)
+    for point1, point2 in (((0, 0), (1, 0)), ((0, 1), (1, 1)), ((0, 0), (0, 1))):
+        board.fillLine(point1, point2)
+    assert board.fillBoxes(PLAYER) == 0
+    board.fillLine((1, 1), (1, 0))
+    assert board.isLineFilled((1, 0), (1, 1))
+    assert board.fillBoxes(COMPUTER) == 1
+    assert board.boxOwner(0, 0) == COMPUTER and board.isGameOver()
+    assert sorted(board.filledLines()) == sorted(board.geometry.linePoints)
+    checkFromScratch(board)
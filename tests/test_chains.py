@@ -0,0 +1,60 @@
+# Tests for chains.py: endgame values against a plain negamax, and the
+# incrementally kept components against freshly traced ones
+
+import random
+
+import pytest
+
+from boardstate import BoardState
+from chains import (ChainAnalyzer, EndgameSolver, solveEndgame, endgameMove, scoreMargin,
+                    loonyValue, CHAIN, LOOP)
+from bruteforce import negamax, randomPosition
+
+def endgamePosition(rand, width, height):
+    # Play random safe lines until there are none left
+    board = BoardState(width, height, rand.choice(("player", "computer")))
+    while board.safeLines:
+        board.makeMove(rand.choice(sorted(board.safeLines)))
+    return board
+
+@pytest.mark.parametrize("width,height", [(2, 2), (3, 2), (4, 2), (3, 3)])
+def test_endgame_values_match_brute_force(width, height):
+    rand = random.Random(width * 5 + height)
+    for game in range(15):
+        board = endgamePosition(rand, width, height)
+        values = {}
+        value, line = EndgameSolver(board).solve()
+        assert value == negamax(board, values)
+        assert solveEndgame(board) == value + scoreMargin(board)
+
+        boxesFilled = board.makeMove(endgameMove(board))
+        childValue = negamax(board, values)
+        assert (boxesFilled + childValue if boxesFilled else -childValue) == value
+
+def test_safe_lines_are_refused():
+    with pytest.raises(ValueError):
+        EndgameSolver(BoardState(2, 2))
+
+def test_loony_values():
+    # Opening the only long chain gives it all away; with two of them the
+    # opener keeps control by losing two boxes of the first
+    assert loonyValue(((CHAIN, 3),)) == -3
+    assert loonyValue(((CHAIN, 3), (CHAIN, 3))) == -2
+    assert loonyValue(((LOOP, 4),)) == -4
+
+@pytest.mark.parametrize("width,height", [(3, 3), (4, 2)])
+def test_incremental_components_match_fresh_ones(width, height):
+    rand = random.Random(width + height)
+    for game in range(10):
+        board = randomPosition(rand, width, height, rand.randrange(6, 16))
+        analyzer = ChainAnalyzer(board)
+        for move in range(6):
+            if board.history and rand.random() < 0.4:
+                line = board.unmakeMove()
+            else:
+                line = rand.choice(list(board.openLines()))
+                board.makeMove(line)
+            analyzer.update(line)
+            fresh = ChainAnalyzer(board)
+            assert analyzer.signature() == fresh.signature()
+            assert analyzer.isSimple() == fresh.isSimple()
@@ -0,0 +1,104 @@
+# Tests for computerplayer.py: the alpha-beta search and its transposition
+# table against a plain negamax on small boards, and searching against the
+# clock and on a background thread
+
+import random, threading, time
+
+import pytest
+
+from boardstate import BoardState
+from computerplayer import (ComputerPlayer, ComputerMoveThread, TranspositionTable, EXACT,
+                            LOWERBOUND, greedyMove, orderMoves)
+from bruteforce import negamax, randomPosition
+
+def test_table_keeps_entries_by_policy():
+    table = TranspositionTable(maxBytes=1, policy="depth") # a single slot
+    table.newSearch()
+    table.store(5, 4, EXACT, 2, 7)
+    assert table.probe(5) == (4, EXACT, 2, 7)
+    assert table.probe(6) is None
+    table.store(6, 2, LOWERBOUND, 1, 3) # shallower, same search: kept out
+    assert table.probe(5) == (4, EXACT, 2, 7) and table.probe(6) is None
+    table.newSearch()
+    table.store(6, 2, LOWERBOUND, 1, 3) # a later search replaces it
+    assert table.probe(6) == (2, LOWERBOUND, 1, 3)
+
+    table = TranspositionTable(maxBytes=1, policy="always")
+    table.store(5, 4, EXACT, 2, 7)
+    table.store(6, 1, EXACT, 0, None)
+    assert table.probe(5) is None and table.probe(6) == (1, EXACT, 0, None)
+    with pytest.raises(ValueError):
+        TranspositionTable(policy="sometimes")
+
+@pytest.mark.parametrize("policy,tableBytes", [("depth", 1 << 20), ("always", 1 << 20),
+                                               ("depth", 20000)])
+def test_full_depth_search_is_exact(policy, tableBytes):
+    # A table small enough to collide all the time must still give exact values
+    rand = random.Random(len(policy) + tableBytes)
+    player = ComputerPlayer(None, None, tableBytes, policy, symmetric=False)
+    for width, height, linesLeft in [(2, 2, 12), (3, 2, 11), (4, 2, 10), (3, 3, 10)]:
+        for game in range(4):
+            board = randomPosition(rand, width, height, linesLeft)
+            before = board.key()
+            line, value = player.iterativeDeepening(board, None)
+            assert board.key() == before
+            assert value == negamax(board)
+
+def test_chosen_moves_are_optimal():
+    rand = random.Random(8)
+    player = ComputerPlayer(None, None)
+    for game in range(10):
+        board = randomPosition(rand, 3, 3, 10)
+        value = negamax(board)
+        line = player.chooseMove(board)
+        boxesFilled = board.makeMove(line)
+        childValue = negamax(board)
+        assert (boxesFilled + childValue if boxesFilled else -childValue) == value
+
+def test_shallow_search_takes_free_boxes():
+    # 1x1 with three sides drawn: the last line is a free box at any depth
+    board = BoardState(1, 1)
+    for line in (0, 1, 2):
+        board.makeMove(line)
+    assert ComputerPlayer(1, None).chooseMove(board) == 3
+
+def test_move_helpers():
+    rand = random.Random(1)
+    board = randomPosition(rand, 3, 3, 14)
+    moves = orderMoves(board, 23 if board.isLineAvailable(23) else None)
+    assert sorted(moves) == list(board.openLines())
+    line = greedyMove(board, rand)
+    if board.captureLines:
+        assert line in board.captureLines
+    elif board.safeLines:
+        assert line in board.safeLines
+
+def test_time_limit_is_kept():
+    board = BoardState(6, 6)
+    player = ComputerPlayer(None, 0.2)
+    startTime = time.time()
+    line = player.chooseMove(board)
+    assert time.time() - startTime < 2.0
+    assert board.isLineAvailable(line) and board.linesLeft == board.geometry.numLines
+    assert player.completedDepth >= 1
+
+def test_move_thread_works_on_a_copy():
+    board = randomPosition(random.Random(5), 3, 3, 12)
+    before = board.key()
+    done = threading.Event()
+    thread = ComputerMoveThread(ComputerPlayer(None, None), board, done.set)
+    thread.start()
+    thread.join(30)
+    assert not thread.is_alive() and done.is_set()
+    assert board.key() == before
+    assert board.isLineAvailable(thread.move)
+
+def test_cancelled_thread_returns_a_move():
+    board = BoardState(6, 6)
+    thread = ComputerMoveThread(ComputerPlayer(None, None), board)
+    thread.start()
+    time.sleep(0.2)
+    thread.cancel()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert board.isLineAvailable(thread.move)
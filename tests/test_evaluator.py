@@ -0,0 +1,170 @@
+# Tests for evaluator.py and players.HeuristicPlayer: every feature on boards
+# built by hand, and the array code against a plain BoardState version of it
+
+import json, random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from boardstate import BoardState
+from evaluator import MoveEvaluator, FEATURES, DEFAULTWEIGHTS, loadWeights, saveWeights
+from players import HeuristicPlayer
+from bruteforce import randomPosition
+
+def drawLines(board, lines):
+    for line in lines:
+        board.makeMove(line)
+    return board
+
+def chainSizes(board):
+    # Box -> size of its chain, for boxes with two sides drawn, by flood fill
+    geometry = board.geometry
+    sizes = {}
+    for start in range(geometry.numBoxes):
+        if board.sideCounts[start] != 2 or start in sizes:
+            continue
+        chain = [start]
+        for box in chain:
+            for line in geometry.boxLines[box]:
+                if not board.isLineAvailable(line):
+                    continue
+                for other in geometry.lineBoxes[line]:
+                    if board.sideCounts[other] == 2 and other not in chain:
+                        chain.append(other)
+        for box in chain:
+            sizes[box] = (len(chain), start)
+    return sizes
+
+def referenceFeatures(board, line):
+    # The features of one open line worked out from the board itself
+    boxes = board.geometry.lineBoxes[line]
+    counts = [board.sideCounts[box] for box in boxes]
+    sizes = chainSizes(board)
+    chains = set(sizes[box] for box in boxes if box in sizes)
+    safe = max(counts) < 2
+    evenSafeLeft = False
+    if safe:
+        board.makeMove(line)
+        evenSafeLeft = len(board.safeLines) % 2 == 0
+        board.unmakeMove()
+    return {"capture": counts.count(3), "thirdSide": counts.count(2),
+            "chainGiven": sum(size for size, start in chains), "safe": int(safe),
+            "edge": int(len(boxes) == 1), "evenSafeLeft": int(evenSafeLeft)}
+
+def lineFeatures(evaluator, board, line):
+    # The evaluator's features of one line as a dict
+    filled = np.array([[not board.isLineAvailable(other)
+                        for other in range(board.geometry.numLines)]])
+    sideCounts = np.array([list(board.sideCounts)], dtype=np.uint8)
+    row = evaluator.features(filled, sideCounts)[0, line]
+    return dict((name, row[index]) for index, name in enumerate(FEATURES))
+
+def test_features_of_an_empty_board():
+    board = BoardState(2, 1)
+    evaluator = MoveEvaluator(2, 1)
+    geometry = board.geometry
+    left, middle = geometry.vLine(0, 0), geometry.vLine(1, 0)
+    # Any line leaves six safe lines
+    assert lineFeatures(evaluator, board, left) == {"capture": 0, "thirdSide": 0,
+                                                    "chainGiven": 0, "safe": 1, "edge": 1,
+                                                    "evenSafeLeft": 1}
+    assert lineFeatures(evaluator, board, middle)["edge"] == 0
+    # On one box, three safe lines are left after any of them
+    assert lineFeatures(MoveEvaluator(1, 1), BoardState(1, 1), 0)["evenSafeLeft"] == 0
+
+def test_safe_lines_lost_to_a_second_side():
+    # 3x1 with the left edge drawn: the first box's top gives it a second side,
+    # so its bottom and right lines stop being safe too and six are left
+    board = BoardState(3, 1)
+    geometry = board.geometry
+    drawLines(board, [geometry.vLine(0, 0)])
+    evaluator = MoveEvaluator(3, 1)
+    features = lineFeatures(evaluator, board, geometry.hLine(0, 0))
+    assert features["safe"] == 1 and features["evenSafeLeft"] == 1
+    # With the second box's top drawn as well, the middle line between them
+    # takes the four lines around both boxes and leaves three
+    drawLines(board, [geometry.hLine(1, 0)])
+    features = lineFeatures(evaluator, board, geometry.vLine(1, 0))
+    assert features["safe"] == 1 and features["evenSafeLeft"] == 0
+
+def test_chains_are_counted_once():
+    # 5x1 with the tops and bottoms of boxes 0, 1, 3 and 4 drawn and the top of
+    # box 2: two chains of two either side of a box with one side
+    board = BoardState(5, 1)
+    geometry = board.geometry
+    drawLines(board, [geometry.hLine(x, y) for x in (0, 1, 3, 4) for y in (0, 1)]
+              + [geometry.hLine(2, 0)])
+    evaluator = MoveEvaluator(5, 1)
+    left = lineFeatures(evaluator, board, geometry.vLine(0, 0))
+    assert (left["thirdSide"], left["chainGiven"], left["safe"]) == (1, 2, 0)
+    inside = lineFeatures(evaluator, board, geometry.vLine(1, 0))
+    assert (inside["thirdSide"], inside["chainGiven"]) == (2, 2) # one chain, not two
+    between = lineFeatures(evaluator, board, geometry.vLine(2, 0))
+    assert (between["thirdSide"], between["chainGiven"], between["capture"]) == (1, 2, 0)
+    bottom = lineFeatures(evaluator, board, geometry.hLine(2, 1))
+    assert (bottom["thirdSide"], bottom["chainGiven"], bottom["capture"]) == (0, 0, 0)
+
+def test_loops_and_captures():
+    # 2x2 with the outside drawn: the four boxes make one loop
+    board = BoardState(2, 2)
+    geometry = board.geometry
+    drawLines(board, [geometry.hLine(x, y) for x in (0, 1) for y in (0, 2)]
+              + [geometry.vLine(x, y) for x in (0, 2) for y in (0, 1)])
+    evaluator = MoveEvaluator(2, 2)
+    inner = lineFeatures(evaluator, board, geometry.hLine(0, 1))
+    assert (inner["thirdSide"], inner["chainGiven"], inner["safe"]) == (2, 4, 0)
+    # Once one inner line is drawn, the line next to it completes one box and
+    # offers the next
+    board.makeMove(geometry.hLine(0, 1))
+    capture = lineFeatures(evaluator, board, geometry.vLine(1, 0))
+    assert (capture["capture"], capture["thirdSide"], capture["chainGiven"]) == (1, 1, 2)
+    assert evaluator.bestMove(board) in board.captureLines
+
+@pytest.mark.parametrize("width,height", [(1, 1), (3, 2), (4, 4), (5, 3)])
+def test_batches_match_the_reference(width, height):
+    rand = random.Random(width * 10 + height)
+    evaluator = MoveEvaluator(width, height)
+    boards = [randomPosition(rand, width, height, rand.randrange(1, 2 * width * height + 3))
+              for game in range(20)]
+    numLines = boards[0].geometry.numLines
+    filled = np.array([[not board.isLineAvailable(line) for line in range(numLines)]
+                       for board in boards])
+    scores = evaluator.evaluateBatch(filled)
+    weights = evaluator.weightVector
+    for board, boardScores in zip(boards, scores):
+        assert np.array_equal(boardScores, evaluator.evaluate(board))
+        for line in range(numLines):
+            if not board.isLineAvailable(line):
+                assert boardScores[line] == -np.inf
+                continue
+            features = referenceFeatures(board, line)
+            assert lineFeatures(evaluator, board, line) == features, line
+            expected = sum(features[name] * weight for name, weight in zip(FEATURES, weights))
+            assert boardScores[line] == pytest.approx(expected)
+
+def test_weights_round_trip(tmp_path):
+    path = str(tmp_path / "weights.json")
+    weights = dict((name, index + 0.5) for index, name in enumerate(FEATURES))
+    saveWeights(path, weights)
+    assert loadWeights(path) == weights
+
+    with open(path, "w") as weightsFile:
+        json.dump({"capture": 3}, weightsFile)
+    assert loadWeights(path) == dict(DEFAULTWEIGHTS, capture=3.0)
+
+    with open(path, "w") as weightsFile:
+        json.dump({"capture": 3, "sacrifice": 1}, weightsFile)
+    with pytest.raises(ValueError):
+        loadWeights(path)
+
+def test_heuristic_player_takes_free_boxes():
+    rand = random.Random(4)
+    player = HeuristicPlayer(rand, DEFAULTWEIGHTS)
+    for game in range(20):
+        board = randomPosition(rand, 4, 3, rand.randrange(1, 25))
+        line = player.chooseMove(board)
+        assert board.isLineAvailable(line)
+        if board.captureLines:
+            assert line in board.captureLines
+    player.close()
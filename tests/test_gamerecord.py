@@ -0,0 +1,86 @@
+# Tests for gamerecord.py: games written to an archive must read back as the
+# same moves, times and final boards
+
+import random
+
+import pytest
+
+from boardstate import getGeometry, PLAYER, COMPUTER
+from gamerecord import GameRecordWriter, GameArchive, readGames, packRecord, lineTypeCode
+
+def randomGame(rand, width, height, moves=None):
+    # Lines for a random game on a width by height board, all of it or its first moves
+    lines = list(range(getGeometry(width, height).numLines))
+    rand.shuffle(lines)
+    return lines if moves is None else lines[:moves]
+
+def test_games_read_back_as_written(tmp_path):
+    path = str(tmp_path / "games.dbx")
+    rand = random.Random(4)
+    games = []
+    writer = GameRecordWriter(path)
+    for width, height, moves in [(1, 1, None), (3, 3, None), (4, 2, 5), (12, 12, None)]:
+        lines = randomGame(rand, width, height, moves)
+        times = [rand.random() for line in lines]
+        firstTurn = rand.choice((PLAYER, COMPUTER))
+        writer.writeGame(width, height, ("Ada", "Babbage é"), firstTurn, lines, times,
+                         finished=moves is None, startTime=1000.5)
+        games.append((width, height, firstTurn, lines, times, moves is None))
+    writer.writeGame(2, 2, ("x", "y"), PLAYER, [0, 5, 3]) # no times
+    writer.close()
+
+    records = list(readGames(path))
+    assert len(records) == len(games) + 1
+    for record, (width, height, firstTurn, lines, times, finished) in zip(records, games):
+        assert (record.width, record.height, record.firstTurn) == (width, height, firstTurn)
+        assert record.playerNames == ("Ada", "Babbage é")
+        assert record.startTime == 1000.5 and record.finished == finished
+        assert list(record.moves) == lines
+        assert list(record.times) == [int(round(seconds * 1000)) for seconds in times]
+        board = record.replay()
+        assert board.linesLeft == board.geometry.numLines - len(lines)
+        assert board.isGameOver() == finished
+    assert list(records[-1].moves) == [0, 5, 3] and records[-1].times is None
+
+def test_large_boards_use_two_byte_lines():
+    assert lineTypeCode(getGeometry(10, 10).numLines) == "B"
+    assert lineTypeCode(getGeometry(12, 12).numLines) == "H"
+    lines = randomGame(random.Random(1), 12, 12)
+    assert max(lines) > 0xff
+    shorter = packRecord(12, 12, ("a", "b"), PLAYER, lines[:10], startTime=0)
+    longer = packRecord(12, 12, ("a", "b"), PLAYER, lines[:11], startTime=0)
+    assert len(longer) == len(shorter) + 2
+
+def test_games_are_appended_and_partial_records_skipped(tmp_path):
+    path = str(tmp_path / "games.dbx")
+    writer = GameRecordWriter(path)
+    writer.beginGame(2, 2, ("a", "b"), PLAYER)
+    for line in (0, 1, 2):
+        writer.recordMove(line, 0.25)
+    writer.endGame()
+    writer.beginGame(2, 2, ("a", "b"), COMPUTER)
+    writer.recordMove(4)
+    writer.close() # the game still going is kept as unfinished
+
+    writer = GameRecordWriter(path)
+    writer.writeGame(1, 1, ("c", "d"), PLAYER, [0, 1, 2, 3])
+    writer.close()
+    with open(path, "ab") as archive:
+        archive.write(packRecord(1, 1, ("e", "f"), PLAYER, [0, 1])[:-1]) # cut short
+
+    with GameArchive(path) as archive:
+        records = list(archive)
+        assert [list(record.moves) for record in records] == [[0, 1, 2], [4], [0, 1, 2, 3]]
+        assert [record.finished for record in records] == [True, False, True]
+        assert list(records[0].times) == [250, 250, 250]
+        assert records[2].replay().isGameOver()
+        del records
+
+def test_other_files_are_refused(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not an archive")
+    with pytest.raises(ValueError):
+        GameArchive(str(path))
+    with pytest.raises(ValueError):
+        GameRecordWriter(str(path))
+    assert path.read_bytes() == b"not an archive"
@@ -0,0 +1,56 @@
+# Tests for gameserver.py, driving GameServer.handleLine() without a socket
+
+from gameserver import GameServer, Connection
+
+def command(server, connection, text):
+    return server.handleLine(connection, text.encode("ascii"))
+
+def playOneByOne(server, connection):
+    # Play a 1x1 match with nobody as the opponent and return every reply
+    matchId = command(server, connection, "NEW 1 1 none")[0].split()[1]
+    replies = []
+    for move in ("0 0 1 0", "0 1 1 1", "0 0 0 1", "1 0 1 1"):
+        replies += command(server, connection, "MOVE %s %s" % (matchId, move))
+    return matchId, replies
+
+def test_move_deltas_and_game_over():
+    server = GameServer()
+    connection = Connection(None)
+    matchId, replies = playOneByOne(server, connection)
+    assert replies[0] == "MOVED %s player 0 0 1 0 computer 0 0" % matchId
+    assert replies[-2] == "MOVED %s computer 1 0 1 1 computer 0 1 0,0" % matchId
+    assert replies[-1] == "OVER %s computer" % matchId
+
+def test_bad_moves_are_rejected():
+    server = GameServer()
+    connection = Connection(None)
+    matchId = command(server, connection, "NEW 2 2 none")[0].split()[1]
+    command(server, connection, "MOVE %s 0 0 1 0" % matchId)
+    assert command(server, connection, "MOVE %s 1 0 0 0" % matchId) == [
+        "ERROR %s line already filled" % matchId]
+    assert command(server, connection, "MOVE %s 0 0 1 1" % matchId) == [
+        "ERROR %s dots are not adjacent" % matchId]
+    assert command(server, connection, "MOVE %s 2 0 3 0" % matchId) == [
+        "ERROR %s dots are not adjacent" % matchId]
+    assert command(server, connection, "NEW 0 2 none") == ["ERROR - board size must be 1 to 100"]
+    assert command(server, connection, "FOO") == ["ERROR - unknown command FOO"]
+
+def test_finished_matches_are_dropped():
+    server = GameServer()
+    connection = Connection(None)
+    for game in range(3):
+        matchId, replies = playOneByOne(server, connection)
+        assert replies[-1].startswith("OVER")
+        assert command(server, connection, "STATE %s" % matchId) == [
+            "ERROR %s no such match" % matchId]
+    assert not connection.matches
+    assert command(server, connection, "STATS")[0].split()[1] == "0"
+
+def test_matches_are_only_visible_to_their_connection():
+    server = GameServer()
+    owner, other = Connection(None), Connection(None)
+    matchId = command(server, owner, "NEW 3 3 none")[0].split()[1]
+    assert command(server, other, "MOVE %s 0 0 1 0" % matchId) == [
+        "ERROR %s no such match" % matchId]
+    assert command(server, owner, "QUIT %s" % matchId) == ["CLOSED %s" % matchId]
+    assert not server.matches
@@ -0,0 +1,101 @@
+# Tests for mcts.py: the playouts' chain scoring against the exact endgame
+# solver, and the tree kept between searches. The scoring is only exact when
+# there are no loops, since opening the loops before the long chains isn't
+# always best.
+
+import random, threading, time
+
+import pytest
+
+from boardstate import BoardState
+from chains import EndgameSolver, LOOP
+from mcts import MCTSPlayer, playOut, openingChains, NOCHILDREN
+from bruteforce import randomPosition
+
+def endgamePosition(rand, width, height):
+    # Play random safe lines until there are none left
+    board = BoardState(width, height, rand.choice(("player", "computer")))
+    while board.safeLines:
+        board.makeMove(rand.choice(sorted(board.safeLines)))
+    return board
+
+def test_endgames_without_loops_are_scored_exactly():
+    rand = random.Random(1)
+    checked = 0
+    for game in range(150):
+        board = endgamePosition(rand, *rand.choice([(3, 3), (4, 2), (4, 4), (5, 3)]))
+        if board.captureLines:
+            continue
+        value = openingChains(board.geometry, board.sideCounts, board.lineClass)
+        before = board.key()
+        assert playOut(board, list(range(board.geometry.numLines))) == value
+        assert board.key() == before
+        analyzer = EndgameSolver(board).analyzer
+        hasLoops = any(kind == LOOP for kind, size in analyzer.signature())
+        if analyzer.isSimple() and not hasLoops:
+            assert value == EndgameSolver(board).solve()[0]
+            checked += 1
+    assert checked >= 20
+
+def test_playouts_stay_within_the_boxes_left():
+    rand = random.Random(2)
+    for game in range(50):
+        board = randomPosition(rand, 4, 4, rand.randrange(1, 40))
+        order = list(range(board.geometry.numLines))
+        rand.shuffle(order)
+        boxesLeft = board.geometry.numBoxes - board.playerScore - board.computerScore
+        before = board.key()
+        assert abs(playOut(board, order)) <= boxesLeft
+        assert board.key() == before
+
+def checkTree(player, board, node=0):
+    # Every child in the tree is an open line of the position it is played from
+    first = player.firstChild[node]
+    if first == NOCHILDREN:
+        return
+    assert first < player.numNodes
+    for child in range(first, first + player.childCount[node]):
+        line = player.moves[child]
+        assert board.isLineAvailable(line)
+        assert player.visits[child] <= player.visits[node]
+        board.makeMove(line)
+        checkTree(player, board, child)
+        board.unmakeMove()
+
+def test_tree_is_kept_between_moves():
+    board = BoardState(3, 3)
+    player = MCTSPlayer(0.2, rand=random.Random(3))
+    line = player.chooseMove(board)
+    assert board.isLineAvailable(line)
+    checkTree(player, board)
+    board.makeMove(line)
+    board.makeMove(sorted(board.safeLines)[0])
+
+    nodes = player.numNodes
+    player.moveRoot(board)
+    assert 1 <= player.numNodes < nodes
+    checkTree(player, board)
+    line = player.chooseMove(board)
+    assert board.isLineAvailable(line)
+    checkTree(player, board)
+
+def test_free_boxes_and_small_trees():
+    board = BoardState(1, 1)
+    for line in (0, 1, 2):
+        board.makeMove(line)
+    assert MCTSPlayer(0.05).chooseMove(board) == 3
+    with pytest.raises(ValueError):
+        MCTSPlayer(0.05, treeBytes=1).search(BoardState(3, 3), 0.05)
+
+def test_stop_ends_the_search():
+    player = MCTSPlayer(30.0)
+    board = BoardState(5, 5)
+    result = []
+    thread = threading.Thread(target=lambda: result.append(player.chooseMove(board)))
+    startTime = time.time()
+    thread.start()
+    time.sleep(0.2)
+    player.stop()
+    thread.join(10)
+    assert not thread.is_alive() and time.time() - startTime < 10
+    assert board.isLineAvailable(result[0])
@@ -0,0 +1,89 @@
+# Tests for parallelsearch.py: the shared table on its own and the parallel
+# player's search against a plain negamax
+
+import random
+
+import pytest
+
+from computerplayer import EXACT, LOWERBOUND, UPPERBOUND
+from parallelsearch import SharedTranspositionTable, ParallelComputerPlayer, shared_memory
+from bruteforce import negamax, randomPosition
+
+if shared_memory is None:
+    pytest.skip("needs multiprocessing.shared_memory", allow_module_level=True)
+
+def sharedMemoryExists(name):
+    # Whether a shared memory block can still be attached to
+    try:
+        memory = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return False
+    memory.close()
+    return True
+
+def test_shared_table_entries_round_trip():
+    table = SharedTranspositionTable(1 << 16)
+    try:
+        table.newSearch()
+        assert table.probe(12345) is None
+        table.store(12345, 7, EXACT, -3, 21)
+        table.store(99, 0, UPPERBOUND, 40, None)
+        assert table.probe(12345) == (7, EXACT, -3, 21)
+        assert table.probe(99) == (0, UPPERBOUND, 40, None)
+        assert table.probe(12345 + table.size) is None # same slot, other position
+
+        other = SharedTranspositionTable(policy="depth", name=table.name)
+        try:
+            other.newSearch()
+            assert other.generation == table.generation
+            assert other.probe(12345) == (7, EXACT, -3, 21)
+            other.store(5, 2, LOWERBOUND, 1, 3)
+            assert table.probe(5) == (2, LOWERBOUND, 1, 3)
+            assert not other.isStopped()
+            table.setStopped(True)
+            assert other.isStopped()
+        finally:
+            other.close()
+        assert table.probe(5) == (2, LOWERBOUND, 1, 3) # attaching didn't unlink it
+    finally:
+        table.close()
+
+def test_shared_table_keeps_deeper_entries():
+    table = SharedTranspositionTable(16 + 16) # a single slot
+    try:
+        assert table.size == 1
+        table.newSearch()
+        table.store(5, 4, EXACT, 2, 7)
+        table.store(6, 2, EXACT, 1, 3)
+        assert table.probe(5) == (4, EXACT, 2, 7) and table.probe(6) is None
+        table.newSearch()
+        table.store(6, 2, EXACT, 1, 3)
+        assert table.probe(6) == (2, EXACT, 1, 3)
+    finally:
+        table.close()
+    with pytest.raises(ValueError):
+        SharedTranspositionTable(policy="sometimes")
+
+def test_parallel_search_is_exact():
+    rand = random.Random(6)
+    with ParallelComputerPlayer(None, None, 1 << 20, workers=2) as player:
+        assert player.workers == 2
+        for width, height, linesLeft in [(2, 2, 12), (3, 2, 11), (3, 3, 10)]:
+            board = randomPosition(rand, width, height, linesLeft)
+            before = board.key()
+            line, value = player.iterativeDeepening(board, None)
+            assert board.key() == before
+            assert board.isLineAvailable(line)
+            assert value == negamax(board)
+        tableName = player.table.name
+        assert sharedMemoryExists(tableName)
+    assert player.pool is None
+    assert not sharedMemoryExists(tableName)
+    player.close() # closing twice is fine
+
+def test_one_worker_searches_alone():
+    player = ParallelComputerPlayer(None, None, workers=1)
+    board = randomPosition(random.Random(2), 2, 2, 10)
+    line, value = player.iterativeDeepening(board, None)
+    assert value == negamax(board) and player.pool is None
+    player.close()
@@ -0,0 +1,58 @@
+# Tests for solutiondb.py: the generated tables against a plain negamax over
+# BoardState, and the file written and read back through SolutionDatabase
+
+import random
+
+import pytest
+
+from boardstate import BoardState
+from engine import boardFromLines
+from bruteforce import negamax, randomPosition
+from solutiondb import SolutionDatabase, solveBoard, writeDatabase, boardSizes, MAXLINES
+
+np = pytest.importorskip("numpy")
+
+@pytest.mark.parametrize("width,height", [(1, 1), (2, 1), (1, 3), (2, 2)])
+def test_every_position_matches_brute_force(width, height):
+    table = solveBoard(width, height)
+    values = {}
+    numLines = BoardState(width, height).geometry.numLines
+    for lines in range(1 << numLines):
+        assert table[lines] == negamax(boardFromLines(width, height, lines), values)
+
+@pytest.fixture(scope="module")
+def database(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("solutions") / "solutions.db")
+    writeDatabase(path, [(2, 2), (4, 2)])
+    database = SolutionDatabase(path)
+    yield database
+    database.close()
+
+def test_late_positions_match_brute_force(database):
+    rand = random.Random(4)
+    for game in range(30):
+        board = randomPosition(rand, 4, 2, 10)
+        assert database.lookup(board) == negamax(board)
+
+def test_best_move_keeps_the_value(database):
+    rand = random.Random(2)
+    for game in range(20):
+        board = BoardState(2, 2)
+        for move in range(rand.randrange(12)):
+            board.makeMove(rand.choice(list(board.openLines())))
+        before = board.lines
+        value, line = database.bestMove(board)
+        assert board.lines == before
+        assert value == database.lookup(board)
+        assert board.isLineAvailable(line)
+
+def test_uncovered_boards():
+    assert all(w * (h + 1) + (w + 1) * h <= MAXLINES for w, h in boardSizes(MAXLINES))
+    assert (3, 3) in boardSizes(MAXLINES) and (4, 3) not in boardSizes(MAXLINES)
+    with pytest.raises(ValueError):
+        solveBoard(4, 3)
+
+def test_missing_sizes_are_not_looked_up(database):
+    board = BoardState(3, 3)
+    assert not database.hasBoard(3, 3)
+    assert database.lookup(board) is None and database.bestMove(board) is None
@@ -0,0 +1,77 @@
+# Tests for symmetry.py and the symmetric keys BoardState keeps
+
+import random
+
+import pytest
+
+from boardstate import BoardState, getGeometry
+from computerplayer import ComputerPlayer
+from symmetry import (canonicalKey, canonicalLines, transformLines, toCanonicalLine,
+                      fromCanonicalLine, HASHBITS, HASHMASK)
+from bruteforce import negamax, randomPosition
+
+SIZES = [(1, 1), (2, 1), (2, 2), (3, 2), (4, 2), (3, 3)]
+
+def imageBoard(board, symmetry):
+    # The same game as board played on its image under one symmetry
+    permutation = board.geometry.symmetryLines[symmetry]
+    image = BoardState(board.width, board.height, board.history[0][3] if board.history
+                       else board.turn)
+    for line, completed, boxesFilled, turn in board.history:
+        image.makeMove(permutation[line])
+    return image
+
+@pytest.mark.parametrize("width,height", SIZES)
+def test_symmetries_map_lines_to_lines(width, height):
+    geometry = getGeometry(width, height)
+    assert len(geometry.symmetryLines) == (8 if width == height else 4)
+    for symmetry, permutation in enumerate(geometry.symmetryLines):
+        assert sorted(permutation) == list(range(geometry.numLines))
+        for line in range(geometry.numLines):
+            assert fromCanonicalLine(geometry, symmetry,
+                                     toCanonicalLine(geometry, symmetry, line)) == line
+        # Lines that share a box still share one afterwards
+        for lines in geometry.boxLines:
+            images = [permutation[line] for line in lines]
+            assert sorted(images) in [sorted(other) for other in geometry.boxLines]
+
+@pytest.mark.parametrize("width,height", SIZES)
+def test_symmetric_positions_share_keys(width, height):
+    rand = random.Random(width * 7 + height)
+    geometry = getGeometry(width, height)
+    for game in range(10):
+        board = randomPosition(rand, width, height, rand.randrange(geometry.numLines + 1))
+        key = canonicalKey(board)
+        for symmetry in range(len(geometry.symmetryLines)):
+            image = imageBoard(board, symmetry)
+            assert board.symmetryKey >> (HASHBITS * symmetry) & HASHMASK == image.hashKey
+            assert canonicalKey(image)[0] == key[0]
+            assert transformLines(geometry, symmetry, board.lines) == image.lines
+            assert canonicalLines(geometry, image.lines)[0] == canonicalLines(geometry,
+                                                                              board.lines)[0]
+            assert image.playerScore == board.playerScore
+            assert image.turn == board.turn
+
+def test_symmetric_positions_have_equal_values():
+    rand = random.Random(3)
+    for width, height in [(2, 2), (3, 2)]:
+        for game in range(5):
+            board = randomPosition(rand, width, height, 9)
+            value = negamax(board)
+            for symmetry in range(1, len(board.geometry.symmetryLines)):
+                assert negamax(imageBoard(board, symmetry)) == value
+
+@pytest.mark.parametrize("symmetric", [True, False])
+def test_search_with_symmetric_table_is_exact(symmetric):
+    # Moves stored for the canonical image must map back to open lines on
+    # every board that shares the entry
+    rand = random.Random(11)
+    player = ComputerPlayer(None, None, symmetric=symmetric)
+    for game in range(12):
+        board = randomPosition(rand, 3, 3, 11)
+        line, value = player.iterativeDeepening(board, None)
+        assert board.isLineAvailable(line)
+        assert value == negamax(board)
+        boxesFilled = board.makeMove(line)
+        childValue = negamax(board)
+        assert (boxesFilled + childValue if boxesFilled else -childValue) == value
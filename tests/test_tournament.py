@@ -0,0 +1,82 @@
+# Tests for tournament.py: repeatable results however the games are spread
+# over processes, players taking turns to move first, and the statistics
+
+import math
+
+import pytest
+
+from engine import createBoard
+from gamerecord import readGames
+from players import createPlayer, isPlayerName
+from tournament import runTournament, gameSeed, TournamentStats, Z95
+
+def collectResults(nameA, nameB, games, processes, recordPath=None):
+    # The summary and the results in game order of a 3x3 tournament, less timings
+    results = []
+    summary = runTournament(nameA, nameB, games, 3, 3, seed=12, processes=processes,
+                            onResult=results.append, recordPath=recordPath)
+    results.sort(key=lambda result: result["game"])
+    for result in results:
+        del result["seconds"]
+    del summary["seconds"], summary["gamesPerSecond"]
+    return summary, results
+
+def test_same_seed_same_results_in_any_number_of_processes():
+    single = collectResults("greedy", "random", 12, 1)
+    assert collectResults("greedy", "random", 12, 2) == single
+    summary, results = single
+    assert [result["game"] for result in results] == list(range(12))
+    assert summary["wins"] + summary["losses"] + summary["ties"] == 12
+
+def test_players_take_turns_to_move_first(tmp_path):
+    path = str(tmp_path / "games.dbx")
+    summary, results = collectResults("greedy", "random", 6, 1, path)
+    assert [result["aMovedFirst"] for result in results] == [True, False] * 3
+    for gameIndex, record in enumerate(readGames(path)):
+        # The archive's first side is whoever moved first, and its first move is
+        # the one that player makes on an empty board with that game's seed
+        seed = gameSeed(12, gameIndex)
+        if gameIndex % 2:
+            first, playerSeed = "random", seed + 1
+        else:
+            first, playerSeed = "greedy", seed
+        assert record.playerNames[0] == first
+        assert record.moves[0] == createPlayer(first, playerSeed).chooseMove(createBoard(3, 3))
+        assert len(record) == results[gameIndex]["moves"]
+
+def test_unknown_players_are_refused_up_front():
+    for name in ("random", "greedy", "heuristic", "easy", "parallel", "depth3"):
+        assert isPlayerName(name)
+    for name in ("depth", "depthx", "nobody"):
+        assert not isPlayerName(name)
+    with pytest.raises(ValueError):
+        runTournament("greedy", "nobody", 4, processes=2)
+
+def test_stats_count_results():
+    stats = TournamentStats()
+    assert stats.winRate() == (0.0, 0.0, 1.0)
+    for margin in (3, -1, 0, 2, 0):
+        stats.add({"margin": margin})
+    summary = stats.summary(2.0)
+    assert (summary["games"], summary["wins"], summary["losses"],
+            summary["ties"]) == (5, 2, 1, 2)
+    assert summary["winRate"] == pytest.approx(0.6)
+    assert summary["winRateLow"] < 0.6 < summary["winRateHigh"]
+    assert summary["meanMargin"] == pytest.approx(0.8)
+    assert summary["meanMarginError"] == pytest.approx(Z95 * math.sqrt(2.7 / 5))
+    assert summary["gamesPerSecond"] == 2.5
+
+def test_win_rate_interval_at_the_extremes():
+    # Ten wins out of ten: the Wilson interval is about 0.722 to 1, where a
+    # normal approximation would claim exactly 1
+    stats = TournamentStats()
+    for game in range(10):
+        stats.add({"margin": 1})
+    rate, low, high = stats.winRate()
+    assert rate == 1.0 and high == 1.0
+    assert low == pytest.approx(0.7225, abs=1e-3)
+
+    stats = TournamentStats()
+    stats.add({"margin": -2})
+    rate, low, high = stats.winRate()
+    assert rate == 0.0 and low == 0.0 and high == pytest.approx(0.7935, abs=1e-3)
@@ -0,0 +1,206 @@
+# Dots and Boxes tournament runner
+#
+# Plays many headless games between two players across a pool of worker
+# processes and reports how the first player did against the second. Players
+# swap who moves first every game, and every game gets its own seed derived
+# from the tournament seed, so a run can be repeated exactly.
+#
+# Usage: python tournament.py greedy medium --games 200 --width 5 --height 5
+
+import argparse, json, math, multiprocessing, time
+
+from engine import BOARDWIDTH, BOARDHEIGHT, PLAYER, COMPUTER, createBoard
+from players import createPlayer, isPlayerName, PLAYERNAMES
+from gamerecord import GameRecordWriter
+
+Z95 = 1.96 # normal quantile for a 95% confidence interval
+
+def gameSeed(seed, gameIndex):
+    # A seed for one game that doesn't depend on which process plays it
+    return (seed * 1000003 + gameIndex) & 0xffffffff
+
+def playGame(task):
+    # Play one game and return its result from the first player's point of view. With
+    # record set the result also has the game's lines and the seconds each took.
+    gameIndex, nameA, nameB, width, height, seed, record = task
+    seed = gameSeed(seed, gameIndex)
+    playerA = createPlayer(nameA, seed)
+    playerB = createPlayer(nameB, seed + 1)
+
+    # Player A moves first in even games and second in odd ones
+    sides = {PLAYER: playerA, COMPUTER: playerB}
+    if gameIndex % 2:
+        sides = {PLAYER: playerB, COMPUTER: playerA}
+    sideA = PLAYER if sides[PLAYER] is playerA else COMPUTER
+
+    board = createBoard(width, height)
+    startTime = time.time()
+    moveTimes = []
+    try:
+        while not board.isGameOver():
+            moveStart = time.time()
+            line = sides[board.turn].chooseMove(board)
+            moveTimes.append(time.time() - moveStart)
+            board.makeMove(line)
+    finally:
+        playerA.close()
+        playerB.close()
+
+    if sideA == PLAYER:
+        margin = board.playerScore - board.computerScore
+    else:
+        margin = board.computerScore - board.playerScore
+    result = {"game": gameIndex, "seed": seed, "aMovedFirst": sideA == PLAYER,
+              "margin": margin, "moves": len(board.history),
+              "seconds": time.time() - startTime}
+    if record:
+        result["lines"] = [move[0] for move in board.history]
+        result["moveTimes"] = moveTimes
+    return result
+
+class TournamentStats(object):
+    # Running totals for the first player's results
+    def __init__(self):
+        self.games = 0
+        self.wins = 0
+        self.losses = 0
+        self.ties = 0
+        self.marginSum = 0
+        self.marginSquares = 0
+
+    def add(self, result):
+        margin = result["margin"]
+        self.games += 1
+        self.marginSum += margin
+        self.marginSquares += margin * margin
+        if margin > 0:
+            self.wins += 1
+        elif margin < 0:
+            self.losses += 1
+        else:
+            self.ties += 1
+
+    def winRate(self):
+        # Share of games won, counting ties as half a win, and the low and high ends
+        # of its 95% Wilson score interval. Unlike rate +/- a normal error, the
+        # interval doesn't shrink to nothing when every game is won or lost, and
+        # stays inside 0 to 1 for short matches.
+        if not self.games:
+            return 0.0, 0.0, 1.0
+        games = float(self.games)
+        rate = (self.wins + 0.5 * self.ties) / games
+        zSquared = Z95 * Z95
+        centre = (rate + zSquared / (2 * games)) / (1 + zSquared / games)
+        halfWidth = (Z95 * math.sqrt(rate * (1 - rate) / games + zSquared / (4 * games * games))
+                     / (1 + zSquared / games))
+        return rate, max(0.0, centre - halfWidth), min(1.0, centre + halfWidth)
+
+    def meanMargin(self):
+        # Average score margin and its 95% interval
+        if not self.games:
+            return 0.0, 0.0
+        mean = self.marginSum / float(self.games)
+        if self.games < 2:
+            return mean, 0.0
+        variance = (self.marginSquares - self.games * mean * mean) / (self.games - 1)
+        return mean, Z95 * math.sqrt(max(variance, 0.0) / self.games)
+
+    def summary(self, seconds):
+        rate, rateLow, rateHigh = self.winRate()
+        margin, marginError = self.meanMargin()
+        return {"games": self.games, "wins": self.wins, "losses": self.losses,
+                "ties": self.ties, "winRate": rate, "winRateLow": rateLow,
+                "winRateHigh": rateHigh,
+                "meanMargin": margin, "meanMarginError": marginError,
+                "seconds": seconds,
+                "gamesPerSecond": self.games / seconds if seconds else 0.0}
+
+def runTournament(nameA, nameB, games, width=BOARDWIDTH, height=BOARDHEIGHT, seed=0,
+                  processes=None, onResult=None, recordPath=None):
+    # Play games between two players and return the summary. onResult is called with
+    # each game's result as it comes in. processes=1 plays every game in this process.
+    # With recordPath every game is appended to that game archive.
+    for name in (nameA, nameB): # fail on a bad name before starting any workers
+        if not isPlayerName(name):
+            raise ValueError("unknown player %r" % (name,))
+    record = recordPath is not None
+    tasks = [(gameIndex, nameA, nameB, width, height, seed, record)
+             for gameIndex in range(games)]
+    writer = GameRecordWriter(recordPath) if record else None
+    stats = TournamentStats()
+    startTime = time.time()
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes <= 1:
+        results = map(playGame, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes)
+        chunkSize = max(1, games // (processes * 8))
+        results = pool.imap_unordered(playGame, tasks, chunkSize)
+
+    try:
+        for result in results:
+            stats.add(result)
+            if writer is not None:
+                names = (nameA, nameB) if result["aMovedFirst"] else (nameB, nameA)
+                writer.writeGame(width, height, names, PLAYER, result.pop("lines"),
+                                 result.pop("moveTimes"))
+            if onResult is not None:
+                onResult(result)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        if writer is not None:
+            writer.close()
+
+    return stats.summary(time.time() - startTime)
+
+def main():
+    parser = argparse.ArgumentParser(description="Play Dots and Boxes players against each other.")
+    parser.add_argument("playerA", help="first player: " + ", ".join(PLAYERNAMES))
+    parser.add_argument("playerB", help="second player")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--width", type=int, default=BOARDWIDTH)
+    parser.add_argument("--height", type=int, default=BOARDHEIGHT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=None,
+                        help="worker processes (default: one per core)")
+    parser.add_argument("--results", help="write every game's result to this file as JSON lines")
+    parser.add_argument("--record", metavar="ARCHIVE",
+                        help="append every game to this game archive (see gamerecord.py)")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    resultsFile = open(args.results, "w") if args.results else None
+    def onResult(result):
+        if resultsFile is not None:
+            resultsFile.write(json.dumps(result) + "\n")
+            resultsFile.flush()
+
+    try:
+        summary = runTournament(args.playerA, args.playerB, args.games, args.width,
+                                args.height, args.seed, args.processes, onResult,
+                                args.record)
+    finally:
+        if resultsFile is not None:
+            resultsFile.close()
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print("%s vs %s, %d games on %dx%d" % (args.playerA, args.playerB, summary["games"],
+                                          args.width, args.height))
+    print("%s won %d, lost %d, tied %d" % (args.playerA, summary["wins"],
+                                           summary["losses"], summary["ties"]))
+    print("Win rate: %.3f (95%% interval %.3f to %.3f)" % (summary["winRate"],
+                                                          summary["winRateLow"],
+                                                          summary["winRateHigh"]))
+    print("Mean margin: %.2f +/- %.2f" % (summary["meanMargin"], summary["meanMarginError"]))
+    print("%.1f games/second" % summary["gamesPerSecond"])
+
+if __name__ == "__main__":
+    main()